@@ -0,0 +1,41 @@
+# benchmarks/comparar.py
+# Compara dos resultados de benchmarks/harness.py (por ejemplo, antes y después de un commit).
+#
+#   python -m benchmarks.comparar benchmarks/resultados/A.json benchmarks/resultados/B.json
+import argparse
+import json
+
+METRICAS = ("p50_ms", "p95_ms", "peticiones_por_segundo", "cpu_ms_por_peticion", "bytes_por_peticion", "memoria_pico_mb")
+
+
+def _variacion(antes, despues) -> str:
+    if antes is None or despues is None:
+        return "-"
+    if not antes:
+        return f"{despues}"
+    return f"{antes} → {despues} ({(despues - antes) / antes * 100:+.0f}%)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dos ejecuciones del benchmark.")
+    parser.add_argument("antes")
+    parser.add_argument("despues")
+    args = parser.parse_args()
+
+    with open(args.antes) as f:
+        antes = json.load(f)
+    with open(args.despues) as f:
+        despues = json.load(f)
+
+    print(f"{(antes['commit'] or '?')[:8]} → {(despues['commit'] or '?')[:8]}  "
+          f"({antes['datos']['respuestas_por_test']} → {despues['datos']['respuestas_por_test']} respuestas por test)")
+    for nombre in despues["escenarios"]:
+        if nombre not in antes["escenarios"]:
+            continue
+        a, d = antes["escenarios"][nombre], despues["escenarios"][nombre]
+        columnas = "  ".join(f"{m}: {_variacion(a.get(m), d.get(m))}" for m in METRICAS)
+        print(f"{nombre:<22} {columnas}")
+
+
+if __name__ == "__main__":
+    main()
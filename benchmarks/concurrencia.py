@@ -0,0 +1,58 @@
+# benchmarks/concurrencia.py
+# Mide el throughput de la API bajo concurrencia contra un servidor en marcha.
+# Sirve para comparar el stack síncrono y el asíncrono ejecutándolo antes y después del cambio:
+#
+#   uvicorn main:app --port 8000 &
+#   python -m benchmarks.concurrencia --url http://localhost:8000 --test-id <uuid> --concurrencia 100
+#
+# Con los límites de admisión activos, parte de los envíos vuelve con 429 ("rechazadas");
+# para medir solo el throughput se arranca el servidor con LIMITE_IP_CAPACIDAD y
+# ENVIOS_CONCURRENTES_MAX altos.
+import argparse
+import asyncio
+import uuid
+from datetime import date
+
+import httpx
+
+from benchmarks.medicion import ejecutar
+
+
+def _escenarios(test_id: str) -> dict:
+    async def promedios(cliente, i):
+        return await cliente.get(f"/estadisticas/{test_id}/dimensiones/promedios")
+
+    async def cuestionario(cliente, i):
+        return await cliente.get(f"/cuestionarios/{test_id}")
+
+    async def envio(cliente, i):
+        return await cliente.post("/Respuestas/", json={
+            "test_id": test_id,
+            "respuestas": [{"dimension": "bench", "respuestas": [1 + i % 5, 1 + (i * 7) % 5]}],
+            "caracterizacion_datos": {"tipo_participante": "habitante"},
+            "fecha": date.today().isoformat(),
+            "fingerprint": f"bench-{uuid.uuid4()}",
+        })
+
+    return {"promedios": promedios, "cuestionario": cuestionario, "envio": envio}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Throughput de la API bajo concurrencia.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--test-id", required=True, help="Test existente sobre el que se hacen las peticiones")
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=100)
+    parser.add_argument("--escenario", action="append", help="promedios, cuestionario o envio (por defecto todos)")
+    args = parser.parse_args()
+
+    escenarios = _escenarios(args.test_id)
+    limites = httpx.Limits(max_connections=args.concurrencia, max_keepalive_connections=args.concurrencia)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=60) as cliente:
+        for nombre in args.escenario or escenarios:
+            resultado = await ejecutar(cliente, escenarios[nombre], args.peticiones, args.concurrencia)
+            print(nombre, resultado)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+# benchmarks/generador.py
+# Genera cuestionarios y respuestas sintéticas con una caracterización variada
+# (tipo de participante, edad, pronombre, comuna, carrera, campos ausentes) para
+# medir la API con 10k, 100k o 1M respuestas. Con la misma semilla los datos son
+# idénticos entre ejecuciones, así los resultados de distintos commits son comparables.
+import random
+import uuid
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from models.Respuestas import Respuesta
+from models.Test import Test
+from utils.agregados import reconstruir_agregados, reconstruir_tendencias
+
+DIMENSIONES = (
+    "Identidad", "Corporalidad", "Vínculos", "Consentimiento", "Diversidad",
+    "Autocuidado", "Comunicación", "Derechos", "Violencia", "Placer",
+)
+EDADES = ("18-25", "26-35", "36-45", "46-60", "60+")
+PRONOMBRES = ("él", "ella", "elle", "prefiero no decir")
+COMUNAS = (
+    "Santiago", "Providencia", "Ñuñoa", "Maipú", "La Florida", "Puente Alto",
+    "Recoleta", "Independencia", "Estación Central", "Peñalolén", "La Pintana", "Quilicura",
+)
+CARRERAS = ("Psicología", "Enfermería", "Derecho", "Ingeniería", "Trabajo Social", "Pedagogía")
+
+# Distribuciones sesgadas de la escala 1-5 para que cada dimensión tenga un promedio distinto
+PESOS_ESCALA = ((5, 4, 3, 2, 1), (1, 2, 3, 4, 5), (1, 3, 5, 3, 1), (2, 2, 2, 2, 2), (1, 1, 2, 4, 6))
+
+
+def generar_test(rng: random.Random, n_dimensiones: int = 6) -> dict:
+    """Definición de un cuestionario con entre 3 y 8 preguntas por dimensión."""
+    dimensiones = rng.sample(DIMENSIONES, min(n_dimensiones, len(DIMENSIONES)))
+    return {
+        "id": uuid.UUID(int=rng.getrandbits(128)),
+        "titulo": f"Cuestionario sintético {rng.randint(1, 10**6)}",
+        "dimensiones": [
+            {"nombre": d, "preguntas": [f"{d} {i + 1}" for i in range(rng.randint(3, 8))]}
+            for d in dimensiones
+        ],
+        "caracterizacion_template": {
+            "tipo_participante": "mixto",
+            "campos_requeridos": ["tipo_participante", "edad", "pronombre"],
+        },
+        "categoria": {"porcentaje": 0, "categoria": "Sin datos"},
+    }
+
+
+def generar_caracterizacion(rng: random.Random) -> dict:
+    datos = {"tipo_participante": "universitario" if rng.random() < 0.55 else "habitante"}
+    # Algunos campos faltan, como en los formularios reales
+    if rng.random() < 0.95:
+        datos["edad"] = rng.choices(EDADES, weights=(35, 30, 15, 12, 8))[0]
+    if rng.random() < 0.9:
+        datos["pronombre"] = rng.choices(PRONOMBRES, weights=(40, 45, 8, 7))[0]
+    if datos["tipo_participante"] == "habitante":
+        datos["comuna"] = rng.choice(COMUNAS)
+    else:
+        datos["carrera"] = rng.choice(CARRERAS)
+    return datos
+
+
+def generar_respuesta(rng: random.Random, test: dict, indice: int, hoy: date) -> dict:
+    respuestas = []
+    for j, dimension in enumerate(test["dimensiones"]):
+        pesos = PESOS_ESCALA[j % len(PESOS_ESCALA)]
+        respuestas.append({
+            "dimension": dimension["nombre"],
+            "respuestas": rng.choices((1, 2, 3, 4, 5), weights=pesos, k=len(dimension["preguntas"])),
+        })
+    fecha = hoy - timedelta(days=rng.randint(0, 364))
+    return {
+        "id": uuid.UUID(int=rng.getrandbits(128)),
+        "test_id": test["id"],
+        "respuestas": respuestas,
+        "caracterizacion_datos": generar_caracterizacion(rng),
+        "fecha": fecha,
+        "fingerprint": f"sintetico-{indice}",
+        "creado_en": datetime.combine(fecha, datetime.min.time()) + timedelta(seconds=rng.randint(0, 86399)),
+    }
+
+
+async def poblar(db, n_tests: int, respuestas_por_test: int, semilla: int = 42, lote: int = 5000) -> list[dict]:
+    """
+    Inserta n_tests cuestionarios con sus respuestas por lotes y reconstruye los
+    agregados. Devuelve las definiciones de los tests creados.
+    """
+    rng = random.Random(semilla)
+    hoy = date.today()
+    tests = [generar_test(rng) for _ in range(n_tests)]
+    await db.execute(insert(Test), tests)
+
+    for test in tests:
+        for inicio in range(0, respuestas_por_test, lote):
+            filas = [
+                generar_respuesta(rng, test, i, hoy)
+                for i in range(inicio, min(inicio + lote, respuestas_por_test))
+            ]
+            await db.execute(insert(Respuesta), filas)
+        await db.commit()
+
+    await reconstruir_agregados(db)
+    await reconstruir_tendencias(db)
+    return tests
@@ -0,0 +1,59 @@
+# benchmarks/medicion.py
+# Medición común a los benchmarks: lanza peticiones con concurrencia limitada y
+# resume latencias (percentiles), throughput, errores, rechazos (429), CPU y bytes recibidos.
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+async def ejecutar(cliente: httpx.AsyncClient, peticion, total: int, concurrencia: int) -> dict:
+    latencias = []
+    errores = 0
+    rechazadas = 0
+    recibidos = 0
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una(i: int):
+        nonlocal errores, rechazadas, recibidos
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                r = await peticion(cliente, i)
+                # Bytes del cuerpo tal como llegan (comprimidos, si el servidor comprimió)
+                recibidos += r.num_bytes_downloaded
+                if r.status_code >= 500:
+                    errores += 1
+                elif r.status_code == 429:
+                    # Control de admisión (utils/limites.py): rechazo rápido, no error
+                    rechazadas += 1
+            except httpx.HTTPError:
+                errores += 1
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    inicio_cpu = time.process_time()
+    await asyncio.gather(*(una(i) for i in range(total)))
+    duracion = time.perf_counter() - inicio
+    # CPU del proceso: con ASGITransport incluye al cliente, comparable entre ejecuciones
+    cpu = time.process_time() - inicio_cpu
+
+    return {
+        "peticiones": total,
+        "errores": errores,
+        "rechazadas": rechazadas,
+        "segundos": round(duracion, 3),
+        "peticiones_por_segundo": round(total / duracion, 1),
+        "p50_ms": round(statistics.median(latencias), 2),
+        "p95_ms": round(percentil(latencias, 95), 2),
+        "p99_ms": round(percentil(latencias, 99), 2),
+        "max_ms": round(max(latencias), 2),
+        "cpu_ms_por_peticion": round(cpu / total * 1000, 3),
+        "bytes_por_peticion": round(recibidos / total),
+    }
@@ -0,0 +1,87 @@
+# benchmarks/serializacion.py
+# Microbenchmark del pipeline de respuesta con cuerpos grandes: CPU por petición
+# al serializar (camino anterior de FastAPI frente a RespuestaJSON) y bytes a
+# enviar sin comprimir, con gzip y con brotli. No necesita base de datos.
+#
+#   python -m benchmarks.serializacion
+#   python -m benchmarks.serializacion --filas 5000 --repeticiones 50
+import argparse
+import json
+import random
+import time
+from datetime import date
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from benchmarks.generador import generar_respuesta, generar_test
+from schemas.Respuestas import RespuestaListado
+from utils import compresion
+from utils.respuesta_json import a_json
+
+_PAGINA = TypeAdapter(list[RespuestaListado])
+
+
+def _pagina(rng, filas: int) -> dict:
+    test = generar_test(rng)
+    hoy = date.today()
+    items = []
+    for i in range(filas):
+        r = generar_respuesta(rng, test, i, hoy)
+        del r["creado_en"]
+        items.append(r)
+    return items
+
+
+def _tendencia(rng, semanas: int = 52) -> dict:
+    dimensiones = [f"Dimensión {i}" for i in range(8)]
+    return {"granularidad": "semana", "periodos": [
+        {"periodo": date(2025, 1, 6).isoformat(), "dimensiones": {
+            d: {"promedio": round(rng.uniform(1, 5), 2), "conteo": rng.randint(100, 5000),
+                "distribucion": {str(v): rng.randint(0, 1000) for v in range(1, 6)}}
+            for d in dimensiones
+        }} for _ in range(semanas)
+    ]}
+
+
+def _cpu_ms(funcion, repeticiones: int) -> float:
+    inicio = time.process_time()
+    for _ in range(repeticiones):
+        funcion()
+    return round((time.process_time() - inicio) / repeticiones * 1000, 3)
+
+
+def medir(nombre: str, datos, adaptador: TypeAdapter | None, repeticiones: int) -> dict:
+    # Antes: con response_model, validación + dump_json; sin él, jsonable_encoder + json.dumps
+    if adaptador is not None:
+        antes = lambda: adaptador.dump_json(adaptador.validate_python(datos))
+    else:
+        antes = lambda: json.dumps(jsonable_encoder(datos), ensure_ascii=False).encode()
+    cuerpo = a_json(datos)
+
+    resultado = {
+        "cpu_ms_antes": _cpu_ms(antes, repeticiones),
+        "cpu_ms_despues": _cpu_ms(lambda: a_json(datos), repeticiones),
+        "bytes": len(cuerpo),
+    }
+    for codificacion, comprimir in compresion.CODIFICACIONES.items():
+        resultado[f"bytes_{codificacion}"] = len(comprimir(cuerpo))
+        resultado[f"cpu_ms_{codificacion}"] = _cpu_ms(lambda: comprimir(cuerpo), repeticiones)
+    print(nombre, resultado)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU de serialización y bytes con y sin compresión.")
+    parser.add_argument("--filas", type=int, default=1000, help="Filas de la página de listar_respuestas")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semilla)
+    medir("listar_respuestas", _pagina(rng, args.filas), _PAGINA, args.repeticiones)
+    medir("tendencia", _tendencia(rng), None, args.repeticiones)
+
+
+if __name__ == "__main__":
+    main()
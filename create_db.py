@@ -1,21 +1,19 @@
-from database import Base, engine, get_db
-import os
-import importlib
-import sys
+import asyncio
 
-# Directorio de modelos
-models_dir = "models"
+from database import async_engine
+from migraciones import migrar
+
+# El esquema se gestiona con las migraciones versionadas (migraciones/)
+
+async def _migrar():
+    try:
+        await migrar()
+    finally:
+        await async_engine.dispose()
 
 def create_tables():
     try:
-        # Importar todos los modelos del directorio 'models'
-        for file in os.listdir(models_dir):
-            if file.endswith(".py") and file != "__init__.py":
-                module_name = file[:-3]  # Quitar la extensión .py
-                importlib.import_module(f"models.{module_name}")
-        
-        # Crear las tablas
-        Base.metadata.create_all(bind=engine)
+        asyncio.run(_migrar())
         print("✅ Base de datos y tablas creadas correctamente")
         return True
     except Exception as e:
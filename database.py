@@ -1,8 +1,13 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 import os
 import logging
+import uuid
+
+from utils.metricas import PoolMedido, instrumentar_motor
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -14,35 +19,244 @@ DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
 DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME", "db")
 
-# Crear la URL de la base de datos PostgreSQL
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Crear la URL de la base de datos PostgreSQL.
+# DATABASE_URL, si existe, tiene prioridad (por ejemplo sqlite:///./local.db para pruebas locales)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-logger.info("Usando PostgreSQL con la URL: %s", SQLALCHEMY_DATABASE_URL)
+# El driver instalado es psycopg2 (ver requirements.txt)
+def _normalizar_url(url: str) -> str:
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    if url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+psycopg2://", 1)
+    return url
 
-try:
+# Misma base de datos con drivers asíncronos (asyncpg / aiosqlite) para los routers
+def _url_asincrona(url: str) -> str:
+    return (
+        url
+        .replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+        .replace("sqlite://", "sqlite+aiosqlite://", 1)
+    )
+
+SQLALCHEMY_DATABASE_URL = _normalizar_url(SQLALCHEMY_DATABASE_URL)
+ES_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+ASYNC_DATABASE_URL = _url_asincrona(SQLALCHEMY_DATABASE_URL)
+
+# Réplica de lectura opcional para las consultas analíticas; sin ella se usa la base principal
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+ASYNC_DATABASE_READ_URL = _url_asincrona(_normalizar_url(DATABASE_READ_URL)) if DATABASE_READ_URL else ASYNC_DATABASE_URL
+
+logger.info("Usando la base de datos con la URL: %s", SQLALCHEMY_DATABASE_URL)
+
+# Dimensionamiento de los pools por worker. Con DB_CONEXIONES_MAX (conexiones que
+# el despliegue completo puede abrir contra PostgreSQL) cada worker toma su parte
+# según WEB_CONCURRENCY, que fija serve.py; DB_POOL_SIZE / DB_MAX_OVERFLOW y sus
+# variantes _LECTURA permiten fijar los tamaños a mano. Con presupuesto, el arranque
+# falla si los pools de todos los workers y migrate.py no caben en él.
+WORKERS_WEB = max(1, int(os.getenv("WEB_CONCURRENCY") or "1"))
+
+# Workers de trabajos posteriores al envío (utils/trabajos.py) más el barrido:
+# corren dentro de cada worker web y toman sus conexiones del pool de escritura
+WORKERS_TRABAJOS = int(os.getenv("TRABAJOS_WORKERS", "2"))
+CONEXIONES_TRABAJOS = WORKERS_TRABAJOS + 1
+# Conexión de migrate.py, que también cuenta en el presupuesto: un despliegue
+# puede migrar mientras los workers anteriores siguen conectados
+CONEXIONES_MIGRACION = 1
+
+# Detrás de PgBouncer en modo transacción (o un proxy equivalente) el pool es el
+# del proxy: cada sesión abre y cierra su conexión y no se cachean sentencias
+# preparadas en el servidor, porque cada transacción puede ir a otro backend
+MODO_PGBOUNCER = os.getenv("DB_PGBOUNCER", "").lower() in ("1", "true", "si", "sí") and not ES_SQLITE
+
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def dimensionar_pools() -> dict:
+    """{"escritura": (pool_size, max_overflow), "lectura": (pool_size, max_overflow)} de cada worker."""
+    presupuesto = os.getenv("DB_CONEXIONES_MAX")
+    if presupuesto:
+        # Todo el presupuesto en el pool fijo (se abre a demanda) y sin desborde:
+        # así ningún worker pasa de su parte
+        por_worker = (int(presupuesto) - CONEXIONES_MIGRACION) // WORKERS_WEB
+        if DATABASE_READ_URL:
+            # La réplica es otro servidor con su propio límite de conexiones
+            escritura = por_worker
+            lectura = max(1, int(os.getenv("DB_LECTURA_CONEXIONES_MAX", presupuesto)) // WORKERS_WEB)
+        else:
+            # Misma base: un tercio para las estadísticas, el resto para envíos y trabajos
+            lectura = max(1, por_worker // 3)
+            escritura = por_worker - lectura
+        tamanos = {"escritura": (escritura, 0), "lectura": (lectura, 0)}
+    else:
+        tamanos = {"escritura": (10, 20), "lectura": (5, 5)}
+
+    for pool, sufijo in (("escritura", ""), ("lectura", "_LECTURA")):
+        fijo, desborde = tamanos[pool]
+        tamanos[pool] = (
+            int(os.getenv(f"DB_POOL_SIZE{sufijo}", fijo)),
+            int(os.getenv(f"DB_MAX_OVERFLOW{sufijo}", desborde)),
+        )
+    return tamanos
+
+
+def comprobar_presupuesto(tamanos: dict):
+    """
+    Con DB_CONEXIONES_MAX, falla al arrancar si los pools de todos los workers más
+    la conexión de migrate.py no caben en el presupuesto. Avisa si el pool de
+    escritura no deja sitio a los envíos además de los workers de trabajos.
+    """
+    presupuesto = os.getenv("DB_CONEXIONES_MAX")
+    if not presupuesto or ES_SQLITE or MODO_PGBOUNCER:
+        return
+    maximo = {pool: sum(tamanos[pool]) for pool in tamanos}
+    if maximo["escritura"] <= CONEXIONES_TRABAJOS:
+        # Los envíos esperarían conexión mientras los trabajos ocupan el pool
+        logger.warning(
+            f"El pool de escritura ({maximo['escritura']} por worker) no supera las "
+            f"{CONEXIONES_TRABAJOS} conexiones de los trabajos ({WORKERS_TRABAJOS} workers y el barrido)"
+        )
+    errores = [
+        # pool_size=0 sería un pool sin límite
+        f"el pool de {pool} se queda sin conexiones" for pool, n in maximo.items() if n < 1
+    ]
+    if DATABASE_READ_URL:
+        pools_principal = maximo["escritura"]
+        presupuesto_lectura = int(os.getenv("DB_LECTURA_CONEXIONES_MAX", presupuesto))
+        if maximo["lectura"] * WORKERS_WEB > presupuesto_lectura:
+            errores.append(
+                f"{WORKERS_WEB} workers × {maximo['lectura']} conexiones de lectura superan "
+                f"DB_LECTURA_CONEXIONES_MAX={presupuesto_lectura}"
+            )
+    else:
+        pools_principal = maximo["escritura"] + maximo["lectura"]
+    total = pools_principal * WORKERS_WEB + CONEXIONES_MIGRACION
+    if total > int(presupuesto):
+        errores.append(
+            f"{WORKERS_WEB} workers × {pools_principal} conexiones + {CONEXIONES_MIGRACION} de migrate.py "
+            f"= {total} superan DB_CONEXIONES_MAX={presupuesto}"
+        )
+    if errores:
+        raise RuntimeError(
+            "Presupuesto de conexiones insuficiente: " + "; ".join(errores)
+            + ". Sube DB_CONEXIONES_MAX o reduce WEB_CONCURRENCY o DB_POOL_SIZE / DB_MAX_OVERFLOW"
+        )
+
+
+def describir_pools() -> str:
+    """Resumen de la configuración de conexiones para los logs de arranque."""
+    if ES_SQLITE:
+        return "SQLite (sin pool de conexiones)"
+    if MODO_PGBOUNCER:
+        return f"modo PgBouncer: sin pool propio, {WORKERS_WEB} workers"
+    partes = []
+    total = 0
+    for pool in ("escritura", "lectura"):
+        fijo, desborde = TAMANOS_POOL[pool]
+        total += fijo + desborde
+        partes.append(f"{pool} {fijo}+{desborde}")
+    # Con réplica el pool de lectura va contra otro servidor
+    principal = sum(TAMANOS_POOL["escritura"]) if DATABASE_READ_URL else total
+    presupuesto = os.getenv("DB_CONEXIONES_MAX")
+    return (
+        f"por worker: {', '.join(partes)} (máx. {total}, de ellas hasta {CONEXIONES_TRABAJOS} "
+        f"para trabajos); {WORKERS_WEB} workers (máx. {principal * WORKERS_WEB} conexiones a la base principal"
+        f"{f' + {CONEXIONES_MIGRACION} de migrate.py, presupuesto {presupuesto}' if presupuesto else ''}); "
+        f"recycle {POOL_RECYCLE}s"
+    )
+
+
+TAMANOS_POOL = dimensionar_pools()
+comprobar_presupuesto(TAMANOS_POOL)
+
+# Opciones del pool compartidas por el motor síncrono y el asíncrono
+if ES_SQLITE:
+    # SQLite solo se usa para desarrollo y pruebas locales
+    OPCIONES_MOTOR = {"connect_args": {"check_same_thread": False}}
+    OPCIONES_MOTOR_LECTURA = OPCIONES_MOTOR
+elif MODO_PGBOUNCER:
+    OPCIONES_MOTOR = {"poolclass": NullPool}
+    OPCIONES_MOTOR_LECTURA = OPCIONES_MOTOR
+else:
     # Usar PostgreSQL con opciones de conexión optimizadas
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
-        pool_size=10,
-        max_overflow=20,
-        pool_pre_ping=True,
-        pool_recycle=300,
+    OPCIONES_MOTOR = {
+        "pool_size": TAMANOS_POOL["escritura"][0],
+        "max_overflow": TAMANOS_POOL["escritura"][1],
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_pre_ping": True,
+        "pool_recycle": POOL_RECYCLE,
+    }
+    # El motor de lectura tiene su propio pool, más pequeño: las estadísticas pueden
+    # agotarlo sin quitarle conexiones a los envíos de respuestas
+    OPCIONES_MOTOR_LECTURA = {
+        **OPCIONES_MOTOR,
+        "pool_size": TAMANOS_POOL["lectura"][0],
+        "max_overflow": TAMANOS_POOL["lectura"][1],
+    }
+
+# asyncpg: sin caché de sentencias preparadas y con nombres únicos, para que una
+# sentencia preparada en un backend no choque con la de otra conexión del proxy
+ARGUMENTOS_ASYNCPG = {
+    "statement_cache_size": 0,
+    "prepared_statement_cache_size": 0,
+    "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+} if MODO_PGBOUNCER else {}
+
+try:
+    # Motor síncrono: scripts de mantenimiento (create_db.py, init_db.py, ...)
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **OPCIONES_MOTOR)
+    # Motor asíncrono: atiende las peticiones de la API sin ocupar el threadpool.
+    # Su pool mide la espera por conexión y sus consultas se atribuyen a cada petición (/metrics)
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL, **OPCIONES_MOTOR,
+        **({"connect_args": ARGUMENTOS_ASYNCPG} if MODO_PGBOUNCER else {} if ES_SQLITE else {"poolclass": PoolMedido}),
     )
-    logger.info("Motor de base de datos PostgreSQL inicializado correctamente.")
+    instrumentar_motor(async_engine.sync_engine)
+    if ES_SQLITE:
+        # En desarrollo no hace falta un segundo pool sobre el mismo archivo
+        async_engine_lectura = async_engine
+    else:
+        # Las sesiones de lectura no pueden escribir aunque apunten a la base principal.
+        # PgBouncer rechaza server_settings: ahí cada transacción se abre READ ONLY
+        if MODO_PGBOUNCER:
+            solo_lectura = {"connect_args": ARGUMENTOS_ASYNCPG, "execution_options": {"postgresql_readonly": True}}
+        else:
+            solo_lectura = {
+                "poolclass": PoolMedido,
+                "connect_args": {"server_settings": {"default_transaction_read_only": "on"}},
+            }
+        async_engine_lectura = create_async_engine(ASYNC_DATABASE_READ_URL, **OPCIONES_MOTOR_LECTURA, **solo_lectura)
+        instrumentar_motor(async_engine_lectura.sync_engine)
+    logger.info("Motores de base de datos inicializados correctamente.")
 except Exception as e:
-    logger.error(f"Error al configurar el motor de base de datos PostgreSQL: {e}")
+    logger.error(f"Error al configurar el motor de base de datos: {e}")
     raise
 
 # Crear una sesión local
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Sesión asíncrona; expire_on_commit=False evita recargas implícitas tras el commit
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncSessionLectura = async_sessionmaker(async_engine_lectura, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Base para modelos
 Base = declarative_base()
 
-# Función para obtener DB session
-def get_db():
-    db = SessionLocal()
-    try:
+# Dependencia de FastAPI para obtener la sesión asíncrona de cada petición
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+# Dependencia para handlers que solo leen (estadísticas, listados): réplica o pool propio
+async def get_db_lectura():
+    async with AsyncSessionLectura() as db:
+        yield db
+
+# INSERT con soporte de ON CONFLICT según el motor de la sesión (PostgreSQL o SQLite)
+def insert_dialecto(db):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
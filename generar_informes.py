@@ -0,0 +1,47 @@
+# generar_informes.py
+# Regenera los informes materializados (tabla estadisticas) de los tests con respuestas.
+# Pensado para ejecutarse periódicamente (cron) y dejar los informes listos para los lectores.
+# Uso: python generar_informes.py [--test-id <uuid>]
+import argparse
+import asyncio
+import logging
+from uuid import UUID
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+# Todos los modelos deben estar registrados para resolver las relaciones
+import migraciones  # noqa: F401
+from models.Test import Test
+from utils.informes import generar_informe
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def _generar(test_id):
+    async with AsyncSessionLocal() as db:
+        if test_id is not None:
+            test_ids = [test_id]
+        else:
+            # Los tests sin respuestas se saltan (generar_informe devuelve None)
+            test_ids = (await db.scalars(select(Test.id))).all()
+        for t in test_ids:
+            try:
+                informe = await generar_informe(db, t)
+                if informe is not None:
+                    logger.info(f"✅ Informe del test {t}: {informe.resumen}")
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"❌ Error al generar el informe del test {t}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenera los informes materializados de estadísticas.")
+    parser.add_argument("--test-id", type=UUID, default=None, help="Generar solo el informe de este test")
+    args = parser.parse_args()
+    asyncio.run(_generar(args.test_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 from fastapi import FastAPI, Depends
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 import logging
 import sys
+import time
 
-from database import Base, engine, get_db
+# Inicio del arranque del worker (importaciones incluidas) para medir el tiempo de boot
+INICIO_ARRANQUE = time.perf_counter()
+
+from database import async_engine, async_engine_lectura, describir_pools, get_db
+from migraciones import version_aplicada, VERSION_ACTUAL
+from utils.metricas import MiddlewareMetricas, exponer
+from utils.compresion import MiddlewareCompresion
+from utils import trabajos
 from routers import (
     Usuario, Administrador, Test, Respuestas,
     Estadisticas, TestEstadistica, Segmentacion, Auth
@@ -36,20 +46,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paginación de GET /Respuestas/
+    expose_headers=["X-Siguiente-Cursor", "Link"],
 )
 
+# gzip/brotli para respuestas grandes, según Accept-Encoding
+app.add_middleware(MiddlewareCompresion)
+
+# Latencia, estado y SQL por ruta; al añadirse después de CORS queda por fuera y lo mide también
+app.add_middleware(MiddlewareMetricas)
+
 
-# Crear tablas al iniciar
+# El esquema lo crea migrate.py una vez por despliegue; el worker solo comprueba la versión
 @app.on_event("startup")
 async def startup_event():
     try:
-        logger.info("Creando tablas de la base de datos...")
-        Base.metadata.create_all(bind=engine)
-        logger.info("Tablas creadas exitosamente.")
+        async with async_engine.connect() as conn:
+            version = await version_aplicada(conn)
+        if version != VERSION_ACTUAL:
+            logger.warning(f"Esquema en la versión {version}, se esperaba {VERSION_ACTUAL}: ejecuta python migrate.py")
     except Exception as e:
-        logger.error(f"Error al crear las tablas: {e}")
+        logger.error(f"Error al comprobar la versión del esquema: {e}")
         # No salir en caso de error, Railway podría reintentar
         # sys.exit(1)
+    # Procesamiento en segundo plano de lo derivado de cada respuesta
+    await trabajos.iniciar()
+    logger.info(f"Conexiones a la base de datos: {describir_pools()}")
+    logger.info(f"Worker listo en {(time.perf_counter() - INICIO_ARRANQUE) * 1000:.0f} ms")
+
+# Terminar los trabajos en curso y cerrar las conexiones del pool al apagar el worker
+@app.on_event("shutdown")
+async def shutdown_event():
+    await trabajos.detener()
+    await async_engine.dispose()
+    if async_engine_lectura is not async_engine:
+        await async_engine_lectura.dispose()
 
 # Incluir routers
 try:
@@ -74,15 +105,23 @@ async def root():
 
 # Ruta para healthcheck con validación de la conexión a la base de datos
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_db)):
     try:
-        # Verificar conexión a la base de datos
-        result = db.execute("SELECT 1").first()
+        # Verificar conexión a la base de datos sin bloquear el event loop
+        await db.execute(text("SELECT 1"))
         return {"status": "healthy", "database": "connected"}
     except Exception as e:
         logger.error(f"Error de conexión a base de datos: {e}")
         return {"status": "unhealthy", "error": str(e)}
 
+# Métricas en formato de texto de Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metricas():
+    motores = {"escritura": async_engine.sync_engine}
+    if async_engine_lectura is not async_engine:
+        motores["lectura"] = async_engine_lectura.sync_engine
+    return PlainTextResponse(exponer(motores), media_type="text/plain; version=0.0.4")
+
 # Ruta para depuración
 @app.get("/debug")
 async def debug_info():
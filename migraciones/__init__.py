@@ -0,0 +1,101 @@
+# migraciones/__init__.py
+# Ejecuta las migraciones pendientes una sola vez por despliegue (migrate.py),
+# antes de arrancar los workers. En PostgreSQL un advisory lock impide que dos
+# procesos migren a la vez; la versión aplicada se guarda en version_esquema.
+
+import inspect as _inspect
+import logging
+import time
+
+from sqlalchemy import func, inspect, insert, select, text
+
+from database import Base, async_engine
+# Todos los modelos deben estar registrados en Base.metadata
+from models import (  # noqa: F401
+    Administrador, AgregadoDimension, AgregadoTendencia, Estadisticas, Respuestas,
+    Test, TestEstadistica, TrabajoPendiente, Usuario,
+)
+from models.VersionEsquema import VersionEsquema
+from migraciones.versiones import MIGRACIONES, VERSION_ACTUAL
+
+logger = logging.getLogger(__name__)
+
+# Clave arbitraria del advisory lock de migraciones
+CLAVE_BLOQUEO = 72_401_614
+
+_TABLA_VERSION = VersionEsquema.__table__
+
+
+def _esquema_vacio(conn) -> bool:
+    return not inspect(conn).has_table("tests")
+
+
+async def version_aplicada(conn) -> int | None:
+    """Versión del esquema en la base de datos, o None si nunca se migró."""
+    if not await conn.run_sync(lambda c: inspect(c).has_table(_TABLA_VERSION.name)):
+        return None
+    return await conn.scalar(select(func.max(_TABLA_VERSION.c.version))) or 0
+
+
+async def _marcar(conn, migraciones):
+    if migraciones:
+        await conn.execute(insert(_TABLA_VERSION), [
+            {"version": m.version, "descripcion": m.descripcion} for m in migraciones
+        ])
+
+
+async def _aplicar(conn, migracion):
+    if _inspect.iscoroutinefunction(migracion.aplicar):
+        await migracion.aplicar(conn)
+    else:
+        await conn.run_sync(migracion.aplicar)
+
+
+async def migrar() -> int:
+    """Lleva la base de datos a VERSION_ACTUAL. Devuelve la versión final."""
+    inicio = time.perf_counter()
+    postgres = async_engine.dialect.name == "postgresql"
+
+    async with async_engine.connect() as conn:
+        if postgres:
+            await conn.execute(text("SELECT pg_advisory_lock(:clave)"), {"clave": CLAVE_BLOQUEO})
+            await conn.commit()
+        try:
+            version = await version_aplicada(conn)
+            if version == VERSION_ACTUAL:
+                logger.info(f"Esquema al día en la versión {VERSION_ACTUAL}")
+                return VERSION_ACTUAL
+
+            if not postgres or await conn.run_sync(_esquema_vacio):
+                # Base nueva o SQLite: el esquema sale completo de los modelos
+                await conn.run_sync(Base.metadata.create_all)
+                version = version or 0
+                await _marcar(conn, [m for m in MIGRACIONES if m.version > version])
+                await conn.commit()
+                logger.info(f"✅ Esquema creado desde los modelos en la versión {VERSION_ACTUAL}")
+                return VERSION_ACTUAL
+
+            version = version or 0
+            for migracion in MIGRACIONES:
+                if migracion.version <= version:
+                    continue
+                inicio_paso = time.perf_counter()
+                if migracion.transaccional:
+                    await _aplicar(conn, migracion)
+                else:
+                    async with async_engine.connect() as directa:
+                        directa = await directa.execution_options(isolation_level="AUTOCOMMIT")
+                        await _aplicar(directa, migracion)
+                await _marcar(conn, [migracion])
+                await conn.commit()
+                logger.info(
+                    f"✅ Migración {migracion.version} ({migracion.descripcion}) "
+                    f"aplicada en {(time.perf_counter() - inicio_paso) * 1000:.0f} ms"
+                )
+            return VERSION_ACTUAL
+        finally:
+            if postgres:
+                await conn.rollback()
+                await conn.execute(text("SELECT pg_advisory_unlock(:clave)"), {"clave": CLAVE_BLOQUEO})
+                await conn.commit()
+            logger.info(f"Migraciones terminadas en {(time.perf_counter() - inicio) * 1000:.0f} ms")
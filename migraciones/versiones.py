@@ -0,0 +1,255 @@
+# migraciones/versiones.py
+# Pasos de migración en orden. Cada paso lleva una base de datos creada con el
+# esquema original hasta el esquema actual de los modelos y es idempotente, de
+# modo que puede reintentarse si un despliegue se corta a medias.
+# Los pasos solo se ejecutan en PostgreSQL; una base nueva (o SQLite) se crea
+# directamente con create_all y se marca en la última versión.
+#
+# Un paso publicado no se modifica: su DDL está escrito aquí tal como era en su
+# versión (no sale de los modelos actuales) y cualquier cambio posterior del
+# esquema va en una migración nueva.
+
+from typing import Callable, NamedTuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.agregados import reconstruir_agregados, reconstruir_tendencias
+
+
+class Migracion(NamedTuple):
+    version: int
+    descripcion: str
+    # Síncrona: recibe una Connection; asíncrona: recibe la AsyncConnection
+    aplicar: Callable
+    # False para DDL que no puede ir en una transacción (CREATE INDEX CONCURRENTLY)
+    transaccional: bool = True
+
+
+# Tablas nuevas de la versión 1 (las del esquema original ya existen)
+_TABLAS_V1 = (
+    """
+    CREATE TABLE IF NOT EXISTS version_esquema (
+        version INTEGER NOT NULL PRIMARY KEY,
+        descripcion VARCHAR NOT NULL,
+        aplicada_en TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agregados_dimension (
+        test_id UUID NOT NULL REFERENCES tests (id) ON DELETE CASCADE,
+        dimension VARCHAR NOT NULL,
+        suma BIGINT NOT NULL,
+        conteo BIGINT NOT NULL,
+        frecuencia_1 BIGINT NOT NULL,
+        frecuencia_2 BIGINT NOT NULL,
+        frecuencia_3 BIGINT NOT NULL,
+        frecuencia_4 BIGINT NOT NULL,
+        frecuencia_5 BIGINT NOT NULL,
+        PRIMARY KEY (test_id, dimension)
+    )
+    """,
+)
+
+_TABLAS_V7 = (
+    """
+    CREATE TABLE IF NOT EXISTS trabajos_pendientes (
+        id BIGSERIAL NOT NULL PRIMARY KEY,
+        respuesta_id UUID NOT NULL,
+        test_id UUID NOT NULL,
+        intentos INTEGER NOT NULL,
+        disponible_en TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        creado_en TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        ultimo_error TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_trabajos_pendientes_disponible_en ON trabajos_pendientes (disponible_en)",
+)
+
+_TABLAS_V8 = (
+    """
+    CREATE TABLE IF NOT EXISTS agregados_tendencia (
+        test_id UUID NOT NULL REFERENCES tests (id) ON DELETE CASCADE,
+        granularidad VARCHAR NOT NULL,
+        periodo DATE NOT NULL,
+        dimension VARCHAR NOT NULL,
+        suma BIGINT NOT NULL,
+        conteo BIGINT NOT NULL,
+        frecuencia_1 BIGINT NOT NULL,
+        frecuencia_2 BIGINT NOT NULL,
+        frecuencia_3 BIGINT NOT NULL,
+        frecuencia_4 BIGINT NOT NULL,
+        frecuencia_5 BIGINT NOT NULL,
+        PRIMARY KEY (test_id, granularidad, periodo, dimension)
+    )
+    """,
+)
+
+# Claves de caracterizacion_datos promovidas a columnas en la versión 4
+_CAMPOS_PROMOVIDOS_V4 = ("tipo_participante", "edad", "pronombre", "comuna")
+
+# Índices de respuestas de la versión 5: (nombre, definición)
+_INDICES_RESPUESTAS_V5 = (
+    ("uq_respuestas_test_id_fingerprint", "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {} ON respuestas (test_id, fingerprint)"),
+    ("ix_respuestas_fecha_id", "CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON respuestas (fecha, id)"),
+    ("ix_respuestas_test_id_fecha_id", "CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON respuestas (test_id, fecha, id)"),
+    ("ix_respuestas_test_id_creado_en", "CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON respuestas (test_id, creado_en)"),
+    ("ix_respuestas_test_id_tipo_participante", "CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON respuestas (test_id, tipo_participante)"),
+    ("ix_respuestas_test_id_edad", "CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON respuestas (test_id, edad)"),
+    ("ix_respuestas_test_id_pronombre", "CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON respuestas (test_id, pronombre)"),
+    ("ix_respuestas_test_id_comuna", "CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON respuestas (test_id, comuna)"),
+    ("ix_respuestas_caracterizacion_gin", "CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON respuestas USING gin (caracterizacion_datos)"),
+)
+
+_INDICES_V10 = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_estadisticas_test_id ON estadisticas (test_id)",
+    'CREATE UNIQUE INDEX IF NOT EXISTS uq_test_estadistica_estadistica_respuesta '
+    'ON test_estadistica ("estadisticaId", "respuestaId")',
+)
+
+
+def _ejecutar_todo(conn, sentencias):
+    for sql in sentencias:
+        conn.execute(text(sql))
+
+
+def _tablas_nuevas(conn):
+    _ejecutar_todo(conn, _TABLAS_V1)
+
+
+def _columnas_nuevas(conn):
+    columnas_tests = {c["name"] for c in inspect(conn).get_columns("tests")}
+    if "umbrales" not in columnas_tests:
+        conn.execute(text("ALTER TABLE tests ADD COLUMN umbrales JSON"))
+
+    columnas_respuestas = {c["name"] for c in inspect(conn).get_columns("respuestas")}
+    if "creado_en" not in columnas_respuestas:
+        # Las respuestas antiguas toman su fecha como marca de guardado
+        conn.execute(text("ALTER TABLE respuestas ADD COLUMN creado_en TIMESTAMP"))
+        conn.execute(text("UPDATE respuestas SET creado_en = fecha"))
+        conn.execute(text(
+            "ALTER TABLE respuestas ALTER COLUMN creado_en SET DEFAULT now(), "
+            "ALTER COLUMN creado_en SET NOT NULL"
+        ))
+
+
+def _depurar_duplicados(conn):
+    # Deja la respuesta más antigua de cada (test_id, fingerprint) antes del índice único
+    conn.execute(text(
+        "DELETE FROM respuestas a USING respuestas b "
+        "WHERE a.test_id = b.test_id AND a.fingerprint = b.fingerprint "
+        "AND (a.creado_en, a.id) > (b.creado_en, b.id)"
+    ))
+
+
+def _jsonb_y_columnas_generadas(conn):
+    columnas = {c["name"]: c for c in inspect(conn).get_columns("respuestas")}
+    for nombre in ("respuestas", "caracterizacion_datos"):
+        if not isinstance(columnas[nombre]["type"], JSONB):
+            conn.execute(text(f"ALTER TABLE respuestas ALTER COLUMN {nombre} TYPE JSONB USING {nombre}::jsonb"))
+
+    # Las columnas generadas se calculan para las filas existentes al añadirlas
+    for campo in _CAMPOS_PROMOVIDOS_V4:
+        if campo not in columnas:
+            conn.execute(text(
+                f"ALTER TABLE respuestas ADD COLUMN {campo} VARCHAR "
+                f"GENERATED ALWAYS AS ((caracterizacion_datos ->> '{campo}')) STORED"
+            ))
+
+
+def _indices_respuestas(conn):
+    # CONCURRENTLY no bloquea las escrituras mientras se construye el índice
+    for nombre, definicion in _INDICES_RESPUESTAS_V5:
+        invalido = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :nombre AND NOT i.indisvalid"
+        ), {"nombre": nombre}).first()
+        if invalido:
+            # Restos de un CREATE INDEX CONCURRENTLY interrumpido
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}"))
+        conn.execute(text(definicion.format(nombre)))
+
+
+def _columna_suma_cuadrados(conn):
+    for tabla in ("agregados_dimension", "agregados_tendencia"):
+        if inspect(conn).has_table(tabla):
+            conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS suma_cuadrados BIGINT NOT NULL DEFAULT 0"))
+
+
+async def _agregados(conn):
+    async with AsyncSession(bind=conn) as db:
+        await reconstruir_agregados(db)
+
+
+def _tabla_trabajos(conn):
+    _ejecutar_todo(conn, _TABLAS_V7)
+
+
+async def _tendencias(conn):
+    await conn.run_sync(_ejecutar_todo, _TABLAS_V8)
+    async with AsyncSession(bind=conn) as db:
+        await reconstruir_tendencias(db)
+
+
+async def _suma_cuadrados(conn):
+    await conn.run_sync(_columna_suma_cuadrados)
+    async with AsyncSession(bind=conn) as db:
+        await reconstruir_agregados(db)
+        await reconstruir_tendencias(db)
+
+
+def _informes(conn):
+    columnas = {c["name"] for c in inspect(conn).get_columns("estadisticas")}
+    if "test_id" not in columnas:
+        conn.execute(text("ALTER TABLE estadisticas ADD COLUMN test_id UUID REFERENCES tests(id) ON DELETE CASCADE"))
+    if "datos" not in columnas:
+        conn.execute(text("ALTER TABLE estadisticas ADD COLUMN datos JSONB"))
+    if "marca_agua" not in columnas:
+        conn.execute(text("ALTER TABLE estadisticas ADD COLUMN marca_agua TIMESTAMP"))
+    # Vínculos repetidos creados a mano antes del índice único
+    conn.execute(text(
+        'DELETE FROM test_estadistica a USING test_estadistica b '
+        'WHERE a."estadisticaId" = b."estadisticaId" AND a."respuestaId" = b."respuestaId" AND a.id > b.id'
+    ))
+    _ejecutar_todo(conn, _INDICES_V10)
+
+
+# (tabla, columna, tabla referenciada) de las claves foráneas que pasan a ON DELETE CASCADE
+_CLAVES_EN_CASCADA = (
+    ("respuestas", "test_id", "tests"),
+    ("test_estadistica", "estadisticaId", "estadisticas"),
+)
+
+
+def _borrado_en_cascada(conn):
+    # Al eliminar un test la base de datos borra sus respuestas, su informe y los
+    # vínculos del informe (Test.respuesta usa passive_deletes)
+    for tabla, columna, referenciada in _CLAVES_EN_CASCADA:
+        for fk in inspect(conn).get_foreign_keys(tabla):
+            if fk["constrained_columns"] != [columna]:
+                continue
+            if (fk.get("options") or {}).get("ondelete", "").upper() == "CASCADE":
+                break
+            conn.execute(text(f'ALTER TABLE {tabla} DROP CONSTRAINT "{fk["name"]}"'))
+            conn.execute(text(
+                f'ALTER TABLE {tabla} ADD CONSTRAINT "{fk["name"]}" FOREIGN KEY ("{columna}") '
+                f"REFERENCES {referenciada} (id) ON DELETE CASCADE"
+            ))
+
+
+MIGRACIONES = [
+    Migracion(1, "tablas nuevas", _tablas_nuevas),
+    Migracion(2, "tests.umbrales y respuestas.creado_en", _columnas_nuevas),
+    Migracion(3, "depurar respuestas duplicadas por fingerprint", _depurar_duplicados),
+    Migracion(4, "JSONB y columnas generadas de caracterización", _jsonb_y_columnas_generadas),
+    Migracion(5, "índices de respuestas", _indices_respuestas, transaccional=False),
+    Migracion(6, "reconstruir agregados por dimensión", _agregados),
+    Migracion(7, "tabla trabajos_pendientes", _tabla_trabajos),
+    Migracion(8, "tendencias por día y semana", _tendencias),
+    Migracion(9, "suma de cuadrados en los agregados", _suma_cuadrados),
+    Migracion(10, "informes materializados en estadisticas", _informes),
+    Migracion(11, "borrado en cascada de respuestas e informes", _borrado_en_cascada),
+]
+
+VERSION_ACTUAL = MIGRACIONES[-1].version
@@ -0,0 +1,50 @@
+# migrate.py
+# Aplica las migraciones pendientes. Debe ejecutarse una vez por despliegue,
+# antes de arrancar uvicorn (ver Procfile y Dockerfile).
+# Uso: python migrate.py [--estado]
+#
+# Con DB_PGBOUNCER la app se conecta a través del proxy, pero el advisory lock de
+# sesión y CREATE INDEX CONCURRENTLY necesitan una conexión directa: si existe
+# DATABASE_DIRECT_URL las migraciones se ejecutan contra ella.
+import argparse
+import asyncio
+import logging
+import os
+
+if os.getenv("DATABASE_DIRECT_URL"):
+    # Antes de importar database, que crea los motores al importarse
+    os.environ["DATABASE_URL"] = os.environ["DATABASE_DIRECT_URL"]
+    os.environ["DB_PGBOUNCER"] = "0"
+
+from database import async_engine
+from migraciones import migrar, version_aplicada, VERSION_ACTUAL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def _estado():
+    async with async_engine.connect() as conn:
+        version = await version_aplicada(conn)
+    logger.info(f"Versión del esquema: {version if version is not None else 'sin migrar'} (actual: {VERSION_ACTUAL})")
+
+
+async def _ejecutar(solo_estado: bool):
+    try:
+        if solo_estado:
+            await _estado()
+        else:
+            await migrar()
+    finally:
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica las migraciones pendientes del esquema.")
+    parser.add_argument("--estado", action="store_true", help="Solo mostrar la versión aplicada")
+    args = parser.parse_args()
+    asyncio.run(_ejecutar(args.estado))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, ForeignKey, String, BigInteger
+from sqlalchemy.dialects.postgresql import UUID
+from database import Base
+
+# Escala de respuestas (1 a 5) que se acumula en el histograma
+VALORES_ESCALA = (1, 2, 3, 4, 5)
+
+
+class AgregadoDimension(Base):
+    """
+    Acumulado por (test, dimensión) que se mantiene al recibir cada respuesta,
+    para que las estadísticas no tengan que recorrer toda la tabla respuestas.
+    """
+    __tablename__ = "agregados_dimension"
+
+    test_id = Column(UUID(as_uuid=True), ForeignKey("tests.id", ondelete="CASCADE"), primary_key=True)
+    dimension = Column(String, primary_key=True)
+    suma = Column(BigInteger, nullable=False, default=0)
+    conteo = Column(BigInteger, nullable=False, default=0)
+    # Para la varianza sin recorrer las respuestas (ver utils/estadistica_descriptiva.py)
+    suma_cuadrados = Column(BigInteger, nullable=False, default=0)
+
+    # Histograma: cuántas veces se eligió cada opción de la escala
+    frecuencia_1 = Column(BigInteger, nullable=False, default=0)
+    frecuencia_2 = Column(BigInteger, nullable=False, default=0)
+    frecuencia_3 = Column(BigInteger, nullable=False, default=0)
+    frecuencia_4 = Column(BigInteger, nullable=False, default=0)
+    frecuencia_5 = Column(BigInteger, nullable=False, default=0)
+
+    @property
+    def histograma(self) -> dict:
+        return {str(v): getattr(self, f"frecuencia_{v}") for v in VALORES_ESCALA}
+
+    def __repr__(self):
+        return f"<AgregadoDimension test_id={self.test_id} dimension={self.dimension} conteo={self.conteo}>"
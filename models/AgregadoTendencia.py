@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Date, ForeignKey, String, BigInteger
+from sqlalchemy.dialects.postgresql import UUID
+from database import Base
+from models.AgregadoDimension import VALORES_ESCALA
+
+# Periodos en los que se agrupan las respuestas por su fecha
+GRANULARIDADES = ("dia", "semana")
+
+
+class AgregadoTendencia(Base):
+    """
+    Acumulado por (test, granularidad, periodo, dimensión) sobre Respuesta.fecha.
+    Con granularidad "semana" el periodo es el lunes de la semana ISO.
+    """
+    __tablename__ = "agregados_tendencia"
+
+    test_id = Column(UUID(as_uuid=True), ForeignKey("tests.id", ondelete="CASCADE"), primary_key=True)
+    granularidad = Column(String, primary_key=True)
+    periodo = Column(Date, primary_key=True)
+    dimension = Column(String, primary_key=True)
+    suma = Column(BigInteger, nullable=False, default=0)
+    conteo = Column(BigInteger, nullable=False, default=0)
+    # Para la varianza sin recorrer las respuestas (ver utils/estadistica_descriptiva.py)
+    suma_cuadrados = Column(BigInteger, nullable=False, default=0)
+
+    # Histograma de la escala (1 a 5), como en AgregadoDimension
+    frecuencia_1 = Column(BigInteger, nullable=False, default=0)
+    frecuencia_2 = Column(BigInteger, nullable=False, default=0)
+    frecuencia_3 = Column(BigInteger, nullable=False, default=0)
+    frecuencia_4 = Column(BigInteger, nullable=False, default=0)
+    frecuencia_5 = Column(BigInteger, nullable=False, default=0)
+
+    @property
+    def histograma(self) -> dict:
+        return {str(v): getattr(self, f"frecuencia_{v}") for v in VALORES_ESCALA}
+
+    def __repr__(self):
+        return f"<AgregadoTendencia test_id={self.test_id} {self.granularidad}={self.periodo} dimension={self.dimension}>"
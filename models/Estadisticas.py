@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, ForeignKey, DateTime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, ForeignKey, DateTime, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 import uuid
 from datetime import datetime
@@ -13,5 +13,16 @@ class Estadisticas(Base):
     resumen = Column(String, nullable=False)
     fecha_generacion = Column(DateTime, default=datetime.utcnow)
 
-    # Relación con TestEstadistica (uno a muchos)
-    test_estadisticas = relationship("TestEstadistica", back_populates="estadistica")
+    # Informe materializado de un test (utils/informes.py); nulos en los resúmenes escritos a mano
+    test_id = Column(UUID(as_uuid=True), ForeignKey("tests.id", ondelete="CASCADE"), nullable=True)
+    datos = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
+    # creado_en de la última respuesta incluida en el informe
+    marca_agua = Column(DateTime, nullable=True)
+
+    # Relación con TestEstadistica (uno a muchos); la base de datos borra los vínculos en cascada
+    test_estadisticas = relationship("TestEstadistica", back_populates="estadistica", passive_deletes=True)
+
+    __table_args__ = (
+        # Un informe por test
+        Index("uq_estadisticas_test_id", "test_id", unique=True),
+    )
@@ -1,24 +1,79 @@
-from sqlalchemy import Column, ForeignKey, String, Date
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Computed, ForeignKey, String, Date, DateTime, Index, func
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.mutable import MutableList
+from sqlalchemy.sql.expression import ColumnElement
 from sqlalchemy.types import JSON
 from sqlalchemy.orm import relationship
 import uuid
+from datetime import datetime
 from database import Base
 
+# JSONB en PostgreSQL (indexable con GIN); JSON en el resto de motores
+JSON_DOCUMENTO = JSON().with_variant(JSONB(), "postgresql")
+
+# Claves de caracterizacion_datos promovidas a columnas generadas con índice
+CAMPOS_PROMOVIDOS = ("tipo_participante", "edad", "pronombre", "comuna")
+
+
+class _CampoCaracterizacion(ColumnElement):
+    """Expresión de una clave de caracterizacion_datos para una columna generada."""
+    inherit_cache = False
+    type = String()
+
+    def __init__(self, clave: str):
+        self.clave = clave
+
+
+@compiles(_CampoCaracterizacion)
+def _campo_caracterizacion(elemento, compiler, **kw):
+    return f"json_extract(caracterizacion_datos, '$.{elemento.clave}')"
+
+
+@compiles(_CampoCaracterizacion, "postgresql")
+def _campo_caracterizacion_pg(elemento, compiler, **kw):
+    return f"(caracterizacion_datos ->> '{elemento.clave}')"
+
+
+def _columna_promovida(clave: str):
+    return Column(String, Computed(_CampoCaracterizacion(clave), persisted=True), nullable=True)
+
 
 class Respuesta(Base):
     __tablename__ = "respuestas"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    test_id = Column(UUID(as_uuid=True), ForeignKey("tests.id"), nullable=False)
-    respuestas = Column(MutableList.as_mutable(JSON), nullable=False)  # Lista de respuestas
-    caracterizacion_datos = Column(JSON, nullable=False)  # Nuevo: campos dinámicos según el template
+    test_id = Column(UUID(as_uuid=True), ForeignKey("tests.id", ondelete="CASCADE"), nullable=False)
+    respuestas = Column(MutableList.as_mutable(JSON_DOCUMENTO), nullable=False)  # Lista de respuestas
+    caracterizacion_datos = Column(JSON_DOCUMENTO, nullable=False)  # Nuevo: campos dinámicos según el template
     fecha = Column(Date, nullable=False)
     fingerprint = Column(String, nullable=False)
+    # Momento en que se guardó (fecha la envía el cliente); marca de agua para procesos incrementales
+    creado_en = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
+
+    # Columnas generadas por la base de datos a partir de caracterizacion_datos
+    tipo_participante = _columna_promovida("tipo_participante")
+    edad = _columna_promovida("edad")
+    pronombre = _columna_promovida("pronombre")
+    comuna = _columna_promovida("comuna")
 
     # Relaciones
-    test = relationship("Test", back_populates="respuesta", lazy="joined")
+    test = relationship("Test", back_populates="respuesta")
+
+    __table_args__ = (
+        # Un mismo navegador (fingerprint) solo puede responder una vez cada test;
+        # la base de datos lo garantiza incluso con envíos concurrentes
+        Index("uq_respuestas_test_id_fingerprint", "test_id", "fingerprint", unique=True),
+        # Índices para la paginación por cursor ordenada por (fecha, id)
+        Index("ix_respuestas_fecha_id", "fecha", "id"),
+        Index("ix_respuestas_test_id_fecha_id", "test_id", "fecha", "id"),
+        Index("ix_respuestas_test_id_creado_en", "test_id", "creado_en"),
+        # Filtros y agrupaciones demográficas dentro de un test
+        *(Index(f"ix_respuestas_test_id_{campo}", "test_id", campo) for campo in CAMPOS_PROMOVIDOS),
+        # Búsqueda por cualquier otra clave (caracterizacion_datos @> '{"clave": "valor"}')
+        Index("ix_respuestas_caracterizacion_gin", "caracterizacion_datos", postgresql_using="gin")
+            .ddl_if(dialect="postgresql"),
+    )
 
     def __repr__(self):
         return f"<Respuesta id={self.id} usuario_id={self.usuario_id} test_id={self.test_id}>"
@@ -1,51 +1,82 @@
 # models/Segmentacion.py
 
 # Esta clase implementa la lógica de análisis de respuestas
-# para asignar una categoría basada en los niveles de homofobia
+# para asignar una categoría basada en los niveles de homofobia.
+# El cálculo es vectorizado con NumPy: puntúa una respuesta o un lote
+# completo de respuestas sin bucles por valor ni salida por consola.
+
+import numpy as np
+
+# Significado de cada opción de la escala (referencia para el frontend y reportes)
+TEXTO_RESPUESTAS = {
+    5: "Totalmente en desacuerdo",
+    4: "En desacuerdo",
+    3: "Ni de acuerdo ni en desacuerdo",
+    2: "De acuerdo",
+    1: "Totalmente de acuerdo"
+}
+
+# Umbrales por defecto: la categoría i aplica si porcentaje <= limite_i;
+# por encima del último límite se usa la última categoría
+UMBRALES_POR_DEFECTO = [
+    {"limite": 20, "categoria": "Sin homofobia"},
+    {"limite": 45, "categoria": "Bajo nivel de homofobia"},
+    {"limite": 70, "categoria": "Moderado nivel de homofobia"},
+    {"limite": 100, "categoria": "Alto nivel de homofobia"},
+]
+
 
 class Segmentacion:
     @staticmethod
-    def calcular_categoria(respuestas: list[dict]) -> dict:
+    def calcular_categoria(respuestas: list[dict], umbrales: list[dict] | None = None) -> dict:
         """
         Analiza las respuestas agrupadas por dimensión (cada una con una lista de números del 1 al 5)
         y retorna una categoría basada en puntajes.
-        También imprime los valores textuales asociados.
         """
-        texto_respuestas = {
-            5: "Totalmente en desacuerdo",
-            4: "En desacuerdo",
-            3: "Ni de acuerdo ni en desacuerdo",
-            2: "De acuerdo",
-            1: "Totalmente de acuerdo"
-        }
-
-        total_respuestas = 0
-        total_puntos = 0
-
-        print("Respuestas recibidas y su significado:")
-
-        #Muestra las respuestas y su significado
-        for grupo in respuestas:
-            valores = grupo.get("respuestas", [])
-            for valor in valores:
-                texto = texto_respuestas.get(valor, "Respuesta desconocida")
-                puntos = max(0, min(4, valor - 1))
-                total_puntos += puntos
-                total_respuestas += 1
-                print(f"Respuesta: {valor} → {texto} | Puntaje asignado: {puntos}")
-
-        porcentaje = (total_puntos / (total_respuestas * 4)) * 100 if total_respuestas > 0 else 0
-
-        if porcentaje <= 20:
-            categoria = "Sin homofobia"
-        elif porcentaje <= 45:
-            categoria = "Bajo nivel de homofobia"
-        elif porcentaje <= 70:
-            categoria = "Moderado nivel de homofobia"
-        else:
-            categoria = "Alto nivel de homofobia"
-
-        return {
-            "porcentaje": round(porcentaje, 2),
-            "categoria": categoria
-        }
+        return Segmentacion.calcular_categorias([respuestas], umbrales)[0]
+
+    @staticmethod
+    def calcular_categorias(lote: list[list[dict]], umbrales: list[dict] | None = None) -> list[dict]:
+        """Puntúa un lote de respuestas (cada una agrupada por dimensión) de una sola vez."""
+        valores, filas = Segmentacion.aplanar(lote)
+        porcentajes = Segmentacion.porcentajes(valores, filas, len(lote))
+        categorias = Segmentacion.categorizar(porcentajes, umbrales)
+        return [
+            {"porcentaje": round(float(p), 2), "categoria": c}
+            for p, c in zip(porcentajes, categorias)
+        ]
+
+    @staticmethod
+    def porcentajes(valores: np.ndarray, filas: np.ndarray, total_filas: int) -> np.ndarray:
+        """
+        Porcentaje de cada respuesta a partir de sus valores aplanados:
+        `valores[i]` pertenece a la respuesta `filas[i]`. Cada valor aporta
+        entre 0 y 4 puntos (valor - 1) y el porcentaje es puntos / (n * 4).
+        """
+        puntos = np.clip(valores.astype(np.float64) - 1, 0, 4)
+        total_puntos = np.bincount(filas, weights=puntos, minlength=total_filas)
+        total_respuestas = np.bincount(filas, minlength=total_filas)
+        porcentajes = np.zeros(total_filas, dtype=np.float64)
+        np.divide(total_puntos, total_respuestas * 4, out=porcentajes, where=total_respuestas > 0)
+        return porcentajes * 100
+
+    @staticmethod
+    def categorizar(porcentajes: np.ndarray, umbrales: list[dict] | None = None) -> list[str]:
+        """Asigna a cada porcentaje la primera categoría cuyo límite no supera."""
+        umbrales = sorted(umbrales or UMBRALES_POR_DEFECTO, key=lambda u: u["limite"])
+        limites = np.array([u["limite"] for u in umbrales], dtype=np.float64)
+        nombres = np.array([u["categoria"] for u in umbrales], dtype=object)
+        indices = np.minimum(np.searchsorted(limites, porcentajes, side="left"), len(umbrales) - 1)
+        return nombres[indices].tolist()
+
+    @staticmethod
+    def aplanar(lote: list[list[dict]]) -> tuple[np.ndarray, np.ndarray]:
+        """Convierte un lote de respuestas en (valores, fila de cada valor) para `porcentajes`."""
+        valores = []
+        filas = []
+        for fila, respuestas in enumerate(lote):
+            for grupo in respuestas:
+                v = grupo.get("respuestas", [])
+                valores.extend(v)
+                filas.extend([fila] * len(v))
+        return np.array(valores, dtype=np.float64), np.array(filas, dtype=np.intp)
@@ -13,7 +13,11 @@ class Test(Base):
     dimensiones = Column(JSON, nullable=False)  # Estructura de dimensiones y preguntas en formato JSON
     caracterizacion_template = Column(JSON, nullable=False)  # Nuevo campo para datos de caracterización
     categoria = Column(JSON, nullable=True)  # Estructura de categoría dada por la segmentación
+    umbrales = Column(JSON, nullable=True)  # Límites de porcentaje por categoría; None usa los de Segmentacion
+
+    # Sin carga ansiosa: cada consulta elige su estrategia (joinedload/selectinload).
+    # passive_deletes evita cargar todas las respuestas al eliminar un test.
+    respuesta = relationship("Respuesta", back_populates="test", passive_deletes=True)
 
-    respuesta = relationship("Respuesta", back_populates="test", lazy="joined")
     def __repr__(self):
         return f"<Test id={self.id} titulo={self.titulo}>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Date
+from sqlalchemy import Column, ForeignKey, Date, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -13,8 +13,13 @@ class TestEstadistica(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     
     respuestaId = Column(UUID(as_uuid=True), nullable=False)
-    estadisticaId = Column(UUID(as_uuid=True), ForeignKey("estadisticas.id"), nullable=False)
+    estadisticaId = Column(UUID(as_uuid=True), ForeignKey("estadisticas.id", ondelete="CASCADE"), nullable=False)
     fechaGeneracion = Column(Date, nullable=False)
 
     # Relación con el modelo Estadisticas (permite acceso desde la entidad relacionada)
     estadistica = relationship("Estadisticas", back_populates="test_estadisticas")
+
+    __table_args__ = (
+        # Cada respuesta se vincula una sola vez a cada informe
+        Index("uq_test_estadistica_estadistica_respuesta", "estadisticaId", "respuestaId", unique=True),
+    )
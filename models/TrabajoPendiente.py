@@ -0,0 +1,33 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+from database import Base
+
+# Intentos tras los que un trabajo ya no se procesa (queda en la tabla con su error)
+MAX_INTENTOS = 5
+
+
+class TrabajoPendiente(Base):
+    """
+    Trabajo derivado de una respuesta (puntuación, agregados, categoría del test...)
+    que se procesa después de responder al cliente. La fila se guarda junto con la
+    respuesta y se borra al procesarla, así ningún trabajo se pierde si el worker cae.
+    """
+    __tablename__ = "trabajos_pendientes"
+
+    # BIGINT en PostgreSQL; INTEGER en SQLite para que sea autoincremental
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    respuesta_id = Column(UUID(as_uuid=True), nullable=False)
+    test_id = Column(UUID(as_uuid=True), nullable=False)
+    intentos = Column(Integer, nullable=False, default=0)
+    # Ningún worker lo toma antes de esta fecha (espera antes de reintentar)
+    disponible_en = Column(DateTime, nullable=False, default=datetime.utcnow)
+    creado_en = Column(DateTime, nullable=False, default=datetime.utcnow)
+    ultimo_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_trabajos_pendientes_disponible_en", "disponible_en"),
+    )
+
+    def __repr__(self):
+        return f"<TrabajoPendiente id={self.id} respuesta_id={self.respuesta_id} intentos={self.intentos}>"
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, DateTime, func
+from datetime import datetime
+from database import Base
+
+
+class VersionEsquema(Base):
+    """Migraciones aplicadas a la base de datos; la versión vigente es la mayor."""
+    __tablename__ = "version_esquema"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    descripcion = Column(String, nullable=False)
+    aplicada_en = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
+
+    def __repr__(self):
+        return f"<VersionEsquema version={self.version} descripcion={self.descripcion}>"
@@ -0,0 +1,45 @@
+# reconstruir_agregados.py
+# Recalcula las tablas agregados_dimension y agregados_tendencia a partir de las respuestas guardadas.
+# Uso: python reconstruir_agregados.py [--test-id <uuid>]
+import argparse
+import asyncio
+import logging
+from uuid import UUID
+
+from database import Base, engine, AsyncSessionLocal
+# Test debe estar registrado para resolver las relaciones y la clave foránea
+from models.Test import Test  # noqa: F401
+from models.AgregadoDimension import AgregadoDimension
+from models.AgregadoTendencia import AgregadoTendencia
+from utils.agregados import reconstruir_agregados, reconstruir_tendencias
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def _reconstruir(test_id):
+    async with AsyncSessionLocal() as db:
+        try:
+            filas = await reconstruir_agregados(db, test_id=test_id)
+            logger.info(f"✅ Agregados reconstruidos: {filas} filas (test, dimensión)")
+            filas = await reconstruir_tendencias(db, test_id=test_id)
+            logger.info(f"✅ Tendencias reconstruidas: {filas} filas (test, periodo, dimensión)")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"❌ Error al reconstruir los agregados: {e}")
+            raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye los agregados por dimensión y las tendencias desde la tabla respuestas.")
+    parser.add_argument("--test-id", type=UUID, default=None, help="Reconstruir solo este test")
+    args = parser.parse_args()
+
+    # Asegura que las tablas de agregados existan antes de reconstruirlas
+    Base.metadata.create_all(bind=engine, tables=[AgregadoDimension.__table__, AgregadoTendencia.__table__])
+
+    asyncio.run(_reconstruir(args.test_id))
+
+
+if __name__ == "__main__":
+    main()
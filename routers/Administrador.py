@@ -1,26 +1,20 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db
 from models.Administrador import Administrador
 from schemas.Administrador import AdministradorCreate, AdministradorOut
 
 router = APIRouter(prefix="/Administradores", tags=["Administradores"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=AdministradorOut)
-def crear_administrador(admin: AdministradorCreate, db: Session = Depends(get_db)):
+async def crear_administrador(admin: AdministradorCreate, db: AsyncSession = Depends(get_db)):
     nuevo_admin = Administrador(**admin.dict())
     db.add(nuevo_admin)
-    db.commit()
-    db.refresh(nuevo_admin)
+    await db.commit()
+    await db.refresh(nuevo_admin)
     return nuevo_admin
 
 @router.get("/", response_model=list[AdministradorOut])
-def listar_administradores(db: Session = Depends(get_db)):
-    return db.query(Administrador).all()
+async def listar_administradores(db: AsyncSession = Depends(get_db)):
+    return (await db.scalars(select(Administrador))).all()
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi.security import OAuth2PasswordBearer
-from utils.auth_utils import verify_google_token, create_jwt_token
+from starlette.concurrency import run_in_threadpool
+from utils.auth_utils import verify_google_token, create_jwt_token, obtener_usuario_actual
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -8,8 +8,8 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 async def login_with_google(token: str):
     """Ruta que recibe el token de Google desde el frontend"""
     try:
-        # 1. Verificar token con Google
-        user_data = verify_google_token(token)
+        # 1. Verificar token con Google (puede descargar certificados: fuera del event loop)
+        user_data = await run_in_threadpool(verify_google_token, token)
 
         # 2. Crear JWT propio (sesión en tu sistema)
         access_token = create_jwt_token(user_data["email"])
@@ -22,4 +22,9 @@ async def login_with_google(token: str):
     except HTTPException as e:
         raise e
     except Exception as e:
-        raise HTTPException(500, "Error interno")
\ No newline at end of file
+        raise HTTPException(500, "Error interno")
+
+@router.get("/me")
+async def usuario_actual(email: str = Depends(obtener_usuario_actual)):
+    """Devuelve el usuario del JWT enviado en la cabecera Authorization: Bearer"""
+    return {"email": email}
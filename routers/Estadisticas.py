@@ -1,157 +1,233 @@
-from collections import defaultdict
+from datetime import date, timedelta
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
-from database import SessionLocal
+from database import get_db, get_db_lectura
 from models.Estadisticas import Estadisticas as EstadisticasModel
 from schemas.Estadisticas import EstadisticasCreate , EstadisticasOut
 
-from models.Respuestas import Respuesta
+from models.AgregadoDimension import AgregadoDimension, VALORES_ESCALA
+from models.AgregadoTendencia import AgregadoTendencia, GRANULARIDADES
+from utils.tabla_cruzada import tabla_cruzada, resumen_por_facetas, FACETAS, METRICAS, MAX_CAMPOS
+from utils.estadistica_descriptiva import Acumulador, CONFIANZA
+from utils.informes import generar_informe, obtener_informe
+from utils.respuesta_json import RespuestaJSON
+from utils.snapshot import abrir_snapshot, actualizar_snapshot, analizar_snapshot
 
 router = APIRouter(prefix="/estadisticas", tags=["Estadísticas"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=EstadisticasOut)
-def crear_estadistica(
+async def crear_estadistica(
     estadistica: EstadisticasCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    nueva = EstadisticasModel.Estadisticas(resumen=estadistica.resumen)
+    nueva = EstadisticasModel(resumen=estadistica.resumen)
     db.add(nueva)
-    db.commit()
-    db.refresh(nueva)
+    await db.commit()
+    await db.refresh(nueva)
     return nueva
 
-@router.get("/{test_id}/dimensiones/promedios", description="Obtener el promedio de cada dimensión (de 1 a 5) con base en todas las respuestas de un test_id")
-def promedios_por_dimension(test_id: UUID, db: Session = Depends(get_db)):
-    respuestas = db.query(Respuesta).filter(Respuesta.test_id == test_id).all()
+@router.get("/{test_id}/informe", response_model=EstadisticasOut, description="Informe materializado del test (todas las facetas del tablero). Con max_age (segundos) se regenera si es más antiguo y hay respuestas nuevas.")
+async def obtener_informe_test(
+    test_id: UUID,
+    max_age: Optional[int] = Query(None, ge=0, description="Antigüedad máxima aceptada, en segundos"),
+    db: AsyncSession = Depends(get_db)
+):
+    informe = await obtener_informe(db, test_id, timedelta(seconds=max_age) if max_age is not None else None)
+    if informe is None:
+        raise HTTPException(status_code=404, detail="No se encontraron respuestas para este test.")
+    return informe
 
-    if not respuestas:
+@router.post("/{test_id}/informe", response_model=EstadisticasOut, description="Regenera ahora el informe materializado del test.")
+async def generar_informe_test(test_id: UUID, db: AsyncSession = Depends(get_db)):
+    informe = await generar_informe(db, test_id)
+    if informe is None:
         raise HTTPException(status_code=404, detail="No se encontraron respuestas para este test.")
+    return informe
 
-    suma_por_dimension = defaultdict(int)
-    conteo_por_dimension = defaultdict(int)
+@router.get("/{test_id}/dimensiones/promedios", description="Obtener el promedio de cada dimensión (de 1 a 5) con base en todas las respuestas de un test_id")
+async def promedios_por_dimension(test_id: UUID, db: AsyncSession = Depends(get_db_lectura)):
+    # Se lee el acumulado por dimensión en lugar de recorrer todas las respuestas
+    agregados = (await db.scalars(select(AgregadoDimension).where(AgregadoDimension.test_id == test_id))).all()
 
-    for r in respuestas:
-        for d in r.respuestas:
-            nombre_dimension = d["dimension"]
-            valores = d["respuestas"]
-            suma_por_dimension[nombre_dimension] += sum(valores)
-            conteo_por_dimension[nombre_dimension] += len(valores)
+    if not agregados:
+        raise HTTPException(status_code=404, detail="No se encontraron respuestas para este test.")
 
     promedios = {
-        dimension: round(suma_por_dimension[dimension] / conteo_por_dimension[dimension], 2)
-        for dimension in suma_por_dimension
+        a.dimension: round(a.suma / a.conteo, 2)
+        for a in agregados if a.conteo
     }
 
-    return promedios
+    return RespuestaJSON(promedios)
 
 @router.get("/{test_id}/dimensiones/distribucion", description="Mostrar cuántas veces fue elegida cada opción (1 a 5) en cada dimensión.")
-def distribucion_por_dimension(test_id: UUID, db: Session = Depends(get_db)):
-    respuestas = db.query(Respuesta).filter(Respuesta.test_id == test_id).all()
+async def distribucion_por_dimension(test_id: UUID, db: AsyncSession = Depends(get_db_lectura)):
+    agregados = (await db.scalars(select(AgregadoDimension).where(AgregadoDimension.test_id == test_id))).all()
 
-    if not respuestas:
+    if not agregados:
         raise HTTPException(status_code=404, detail="No se encontraron respuestas para este test.")
 
-    distribucion = defaultdict(lambda: defaultdict(int))
+    distribucion = {
+        a.dimension: {valor: n for valor, n in a.histograma.items() if n}
+        for a in agregados
+    }
+
+    return RespuestaJSON(distribucion)
+
+@router.get("/{test_id}/dimensiones/descriptivas", description="Conteo, promedio, varianza, desviación, percentiles (25, 50, 75) e intervalo de confianza del promedio por dimensión.")
+async def descriptivas_por_dimension(
+    test_id: UUID,
+    confianza: float = Query(CONFIANZA, gt=0, lt=1, description="Nivel del intervalo de confianza"),
+    db: AsyncSession = Depends(get_db_lectura)
+):
+    # Conteo, suma, suma de cuadrados e histograma del acumulado bastan para todo
+    agregados = (await db.scalars(select(AgregadoDimension).where(AgregadoDimension.test_id == test_id))).all()
 
-    for r in respuestas:
-        for d in r.respuestas:
-            dimension = d["dimension"]
-            for valor in d["respuestas"]:
-                distribucion[dimension][str(valor)] += 1
+    if not agregados:
+        raise HTTPException(status_code=404, detail="No se encontraron respuestas para este test.")
 
-    return distribucion
+    return RespuestaJSON({
+        a.dimension: Acumulador.desde_agregado(a).describir(confianza)
+        for a in agregados if a.conteo
+    })
 
 @router.get("/comparacion/tipo_participante", description="Ver cómo varía el promedio por dimensión entre grupos: 'universitario', 'habitante', etc.")
-def comparacion_global_por_tipo_participante(db: Session = Depends(get_db)):
-    respuestas = db.query(Respuesta).all()
+async def comparacion_global_por_tipo_participante(test_id: Optional[UUID] = None, db: AsyncSession = Depends(get_db_lectura)):
+    # Sin test_id compara sobre todas las respuestas, como hasta ahora
+    promedios = await tabla_cruzada(db, test_id, ["tipo_participante"])
 
-    if not respuestas:
+    if not promedios:
         raise HTTPException(status_code=404, detail="No se encontraron respuestas.")
 
-    suma = defaultdict(lambda: defaultdict(float))
-    conteo = defaultdict(lambda: defaultdict(int))
-
-    for r in respuestas:
-        tipo = r.caracterizacion_datos.get("tipo_participante", "otro")
-        for d in r.respuestas:
-            dimension = d["dimension"]
-            valores = d["respuestas"]
-            suma[tipo][dimension] += sum(valores)
-            conteo[tipo][dimension] += len(valores)
-
-    resultado = {}
-    for tipo in ("universitario", "habitante"):
-        if tipo in suma:
-            resultado[tipo] = {
-                dimension: round(suma[tipo][dimension] / conteo[tipo][dimension], 2)
-                for dimension in suma[tipo]
-            }
-        else:
-            resultado[tipo] = {}
-
-    return resultado
+    return RespuestaJSON({tipo: promedios.get(tipo, {}) for tipo in ("universitario", "habitante")})
 
 @router.get("/{test_id}/por-edad",description="Muestra cómo se comportan los promedios por dimensión según los rangos de edad.")
-def promedio_por_edad(test_id: UUID, db: Session = Depends(get_db)):
-    respuestas = db.query(Respuesta).filter(Respuesta.test_id == test_id).all()
-
-    agrupados = defaultdict(lambda: defaultdict(list))
-
-    for r in respuestas:
-        edad = r.caracterizacion_datos.get("edad", "No especificado")
-        for d in r.respuestas:
-            dimension = d["dimension"]
-            agrupados[edad][dimension].extend(d["respuestas"])
-
-    resultado = {}
-    for edad in agrupados:
-        resultado[edad] = {
-            dim: round(sum(valores) / len(valores), 2)
-            for dim, valores in agrupados[edad].items() if valores
-        }
-
-    return resultado
+async def promedio_por_edad(test_id: UUID, db: AsyncSession = Depends(get_db_lectura)):
+    return RespuestaJSON(await tabla_cruzada(db, test_id, ["edad"]))
 
 @router.get("/{test_id}/por-pronombre", description="Ayuda a ver si hay diferencias perceptibles según el pronombre que usan los participantes.")
-def promedio_por_pronombre(test_id: UUID, db: Session = Depends(get_db)):
-    respuestas = db.query(Respuesta).filter(Respuesta.test_id == test_id).all()
-
-    agrupados = defaultdict(lambda: defaultdict(list))
-
-    for r in respuestas:
-        pronombre = r.caracterizacion_datos.get("pronombre", "No especificado")
-        for d in r.respuestas:
-            dimension = d["dimension"]
-            agrupados[pronombre][dimension].extend(d["respuestas"])
-
-    resultado = {}
-    for pronombre in agrupados:
-        resultado[pronombre] = {
-            dim: round(sum(valores) / len(valores), 2)
-            for dim, valores in agrupados[pronombre].items() if valores
+async def promedio_por_pronombre(test_id: UUID, db: AsyncSession = Depends(get_db_lectura)):
+    return RespuestaJSON(await tabla_cruzada(db, test_id, ["pronombre"]))
+
+@router.get("/{test_id}/habitantes/comuna", description="Muestra cuántas respuestas hay por comuna.")
+async def conteo_por_comuna(test_id: UUID, db: AsyncSession = Depends(get_db_lectura)):
+    return RespuestaJSON(await tabla_cruzada(db, test_id, ["comuna"], {"tipo_participante": "habitante"}, metrica="conteo"))
+
+@router.get("/{test_id}/cruce", description="Tabla cruzada por cualquier combinación de campos de caracterizacion_datos, con filtros campo:valor y métrica promedio, conteo, distribucion o descriptivas.")
+async def cruce_por_caracterizacion(
+    test_id: UUID,
+    campos: List[str] = Query([], max_length=MAX_CAMPOS),
+    filtro: List[str] = Query([]),
+    metrica: str = Query("promedio", pattern="^(" + "|".join(METRICAS) + ")$"),
+    confianza: float = Query(CONFIANZA, gt=0, lt=1, description="Nivel del intervalo de confianza (métrica descriptivas)"),
+    db: AsyncSession = Depends(get_db_lectura)
+):
+    return RespuestaJSON(await tabla_cruzada(db, test_id, campos, _parsear_filtros(filtro), metrica, confianza))
+
+@router.get("/{test_id}/tendencia", description="Promedio, conteo y distribución por dimensión en cada día o semana ISO (según Respuesta.fecha).")
+async def tendencia_por_periodo(
+    test_id: UUID,
+    granularidad: str = Query("dia", pattern="^(" + "|".join(GRANULARIDADES) + ")$"),
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    db: AsyncSession = Depends(get_db_lectura)
+):
+    # Se lee el acumulado por periodo: el costo depende de los periodos, no de las respuestas.
+    # Solo columnas (sin instanciar objetos ORM), porque una campaña larga tiene muchas filas
+    frecuencias = [getattr(AgregadoTendencia, f"frecuencia_{v}") for v in VALORES_ESCALA]
+    query = select(
+        AgregadoTendencia.periodo, AgregadoTendencia.dimension,
+        AgregadoTendencia.suma, AgregadoTendencia.conteo, *frecuencias,
+    ).where(
+        AgregadoTendencia.test_id == test_id,
+        AgregadoTendencia.granularidad == granularidad,
+    )
+    if desde:
+        query = query.where(AgregadoTendencia.periodo >= desde)
+    if hasta:
+        query = query.where(AgregadoTendencia.periodo <= hasta)
+    filas = (await db.execute(query.order_by(AgregadoTendencia.periodo, AgregadoTendencia.dimension))).all()
+
+    if not filas:
+        raise HTTPException(status_code=404, detail="No se encontraron respuestas para este test.")
+
+    periodos = {}
+    for periodo, dimension, suma, conteo, *histograma in filas:
+        periodos.setdefault(periodo, {})[dimension] = {
+            "promedio": round(suma / conteo, 2) if conteo else None,
+            "conteo": conteo,
+            "distribucion": {str(v): n for v, n in zip(VALORES_ESCALA, histograma) if n},
         }
 
-    return resultado
+    return RespuestaJSON({
+        "granularidad": granularidad,
+        "periodos": [{"periodo": p, "dimensiones": d} for p, d in periodos.items()],
+    })
 
-@router.get("/{test_id}/habitantes/comuna", description="Muestra cuántas respuestas hay por comuna.")
-def conteo_por_comuna(test_id: UUID, db: Session = Depends(get_db)):
-    respuestas = db.query(Respuesta).filter(Respuesta.test_id == test_id).all()
+@router.get("/{test_id}/resumen", description="Devuelve en una sola petición las facetas del tablero: promedios, distribucion, descriptivas, edad, pronombre y comuna.")
+async def resumen_tablero(
+    test_id: UUID,
+    facets: str = Query(",".join(FACETAS), description="Facetas separadas por coma"),
+    db: AsyncSession = Depends(get_db_lectura)
+):
+    facetas = [f.strip() for f in facets.split(",") if f.strip()]
+    desconocidas = [f for f in facetas if f not in FACETAS]
+    if not facetas or desconocidas:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Facetas no válidas: {', '.join(desconocidas) or facets}. Opciones: {', '.join(FACETAS)}"
+        )
+
+    resumen = await resumen_por_facetas(db, test_id, facetas)
+    if not resumen:
+        raise HTTPException(status_code=404, detail="No se encontraron respuestas para este test.")
+
+    return RespuestaJSON(resumen)
+
+def _resumen_snapshot(manifest: dict) -> dict:
+    return {
+        "filas": manifest["filas"],
+        "dimensiones": manifest["dimensiones"],
+        "campos": manifest["campos"],
+        "marca_agua": manifest["marca_agua"],
+        "actualizado_en": manifest["actualizado_en"],
+    }
+
+def _parsear_filtros(filtro: list[str]) -> dict:
+    filtros = {}
+    for f in filtro:
+        campo, separador, valor = f.partition(":")
+        if not separador or not campo:
+            raise HTTPException(status_code=400, detail=f"Filtro no válido: {f}. Use campo:valor")
+        filtros[campo] = valor
+    return filtros
+
+@router.post("/{test_id}/snapshot", description="Crea o actualiza de forma incremental el snapshot columnar del test.")
+async def actualizar_snapshot_test(test_id: UUID, db: AsyncSession = Depends(get_db_lectura)):
+    manifest = await actualizar_snapshot(db, test_id)
+    return _resumen_snapshot(manifest)
+
+@router.get("/{test_id}/snapshot", description="Promedio, conteo y distribución por dimensión leídos del snapshot columnar, con agrupación y filtros opcionales (campo:valor).")
+async def analizar_snapshot_test(
+    test_id: UUID,
+    agrupar_por: Optional[str] = None,
+    filtro: List[str] = Query([]),
+    actualizar: bool = Query(False, description="Agregar antes las respuestas nuevas"),
+    db: AsyncSession = Depends(get_db_lectura)
+):
+    filtros = _parsear_filtros(filtro)
+    if actualizar:
+        await actualizar_snapshot(db, test_id)
 
-    conteo = defaultdict(int)
-    for r in respuestas:
-        tipo = r.caracterizacion_datos.get("tipo_participante", "")
-        if tipo == "habitante":
-            comuna = r.caracterizacion_datos.get("comuna", "No especificado")
-            conteo[comuna] += 1
+    snapshot = abrir_snapshot(test_id)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="No existe un snapshot para este test.")
 
-    return dict(conteo)
+    # El cálculo es CPU sobre archivos mapeados: se ejecuta fuera del event loop
+    resultado = await run_in_threadpool(analizar_snapshot, snapshot, agrupar_por, filtros)
+    return RespuestaJSON({"snapshot": _resumen_snapshot(snapshot.manifest), "resultado": resultado})
@@ -1,61 +1,179 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import base64
+import uuid
+from typing import Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from sqlalchemy import and_, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 from datetime import datetime, date
 
-from database import SessionLocal
+from database import get_db, get_db_lectura, insert_dialecto
 from models.Respuestas import Respuesta
 from models.Test import Test
-from models.Segmentacion import Segmentacion
-from schemas.Respuestas import RespuestaCreate, RespuestaOut
+from utils.trabajos import insertar_con_trabajo, registrar_trabajos, encolar
+from utils.respuesta_json import RespuestaJSON
+from utils.limites import cupo_envio, limitar_fingerprint, limitar_ip
+from schemas.Respuestas import RespuestaCreate, RespuestaOut, RespuestaListado, ResultadoCarga
 
 router = APIRouter(prefix="/Respuestas", tags=["Respuestas"])
 
-# Dependencia para obtener la DB
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Límite de elementos por carga masiva
+MAX_CARGA_MASIVA = 10000
+
+DETALLE_DUPLICADA = "Ya se ha respondido este test desde esta sesión."
+
+# INSERT ... ON CONFLICT DO NOTHING sobre el índice único (test_id, fingerprint)
+def _insert_sin_duplicados(db, *columnas):
+    insert = insert_dialecto(db)
+    return insert(Respuesta).on_conflict_do_nothing(
+        index_elements=[Respuesta.test_id, Respuesta.fingerprint]
+    ).returning(*(columnas or (Respuesta.id,)))
+
+# Admisión de los envíos: límite por IP y cupo de concurrencia (429 con Retry-After)
+LIMITES_ENVIO = [Depends(limitar_ip), Depends(cupo_envio)]
 
 # POST para recibir y guardar respuestas
-@router.post("/", response_model=RespuestaOut)
-def enviar_respuesta(respuesta: RespuestaCreate, db: Session = Depends(get_db)):
-    # Verifica si ya existe una respuesta con ese test_id y fingerprint
-    existente = db.query(Respuesta).filter_by(
-        test_id=respuesta.test_id,
-        fingerprint=respuesta.fingerprint
-    ).first()
-    if existente:
+@router.post("/", response_model=RespuestaOut, dependencies=LIMITES_ENVIO)
+async def enviar_respuesta(respuesta: RespuestaCreate, db: AsyncSession = Depends(get_db)):
+    await limitar_fingerprint(respuesta.fingerprint)
+    datos = {
+        "id": uuid.uuid4(),
+        "test_id": respuesta.test_id,
+        "respuestas": [r.dict() for r in respuesta.respuestas],
+        "caracterizacion_datos": respuesta.caracterizacion_datos,
+        "fecha": respuesta.fecha,
+        "fingerprint": respuesta.fingerprint,
+    }
+
+    # Una sola sentencia: si ya existe (test_id, fingerprint) la base de datos no devuelve id.
+    # Puntuación, acumulados y categoría del test se calculan después (utils/trabajos.py)
+    insert_respuesta = _insert_sin_duplicados(db, Respuesta.id, Respuesta.test_id).values(**datos)
+    try:
+        trabajo_id = await insertar_con_trabajo(db, insert_respuesta)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Test no encontrado")
+    if trabajo_id is None:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ya se ha respondido este test desde esta sesión."
+            detail=DETALLE_DUPLICADA
         )
-    nueva = Respuesta(
-        test_id=respuesta.test_id,
-        respuestas=[r.dict() for r in respuesta.respuestas],
-        caracterizacion_datos=respuesta.caracterizacion_datos,
-        fecha=respuesta.fecha,
-        fingerprint = respuesta.fingerprint
-    )
-
-    db.add(nueva)
-    db.commit()
-    db.refresh(nueva)
-
-    # Calcular categoría basada en las respuestas
-    categoria = Segmentacion.calcular_categoria(nueva.respuestas)
-
-    # Actualizar la categoría del usuario
-    test = db.query(Test).filter_by(id=respuesta.test_id).first()
-    if test:
-        test.categoria = categoria
-        db.commit()
-
-    return nueva
-
-# GET general para ver todas las respuestas
-@router.get("/", response_model=list[RespuestaOut])
-def listar_respuestas(db: Session = Depends(get_db)):
-    return db.query(Respuesta).all()
+    await db.commit()
+    encolar([trabajo_id])
+
+    return datos
+
+# POST para cargas masivas (respuestas recogidas en papel o sin conexión)
+@router.post("/bulk", response_model=ResultadoCarga, response_model_exclude_none=True, dependencies=LIMITES_ENVIO)
+async def enviar_respuestas_masivo(
+    respuestas: list[RespuestaCreate] = Body(..., max_length=MAX_CARGA_MASIVA),
+    db: AsyncSession = Depends(get_db)
+):
+    items = [{"indice": i, "estado": "aceptada"} for i in range(len(respuestas))]
+
+    # Tests existentes, en una sola consulta
+    test_ids = {r.test_id for r in respuestas}
+    existentes = set((await db.scalars(select(Test.id).where(Test.id.in_(test_ids)))).all())
+
+    filas = []
+    vistas = set()
+    for item, r in zip(items, respuestas):
+        clave = (r.test_id, r.fingerprint)
+        if r.test_id not in existentes:
+            item.update(estado="error", detalle="Test no encontrado")
+        elif clave in vistas:
+            item.update(estado="duplicada", detalle=DETALLE_DUPLICADA)
+        else:
+            vistas.add(clave)
+            item["id"] = uuid.uuid4()
+            filas.append({
+                "id": item["id"],
+                "test_id": r.test_id,
+                "respuestas": [d.dict() for d in r.respuestas],
+                "caracterizacion_datos": r.caracterizacion_datos,
+                "fecha": r.fecha,
+                "fingerprint": r.fingerprint,
+            })
+
+    if filas:
+        # Inserción por lotes; las filas que chocan con el índice único
+        # (ya guardadas o enviadas en paralelo) no devuelven id
+        insertadas = set((await db.execute(_insert_sin_duplicados(db), filas)).scalars().all())
+        for item in items:
+            if item.get("id") and item["id"] not in insertadas:
+                item.update(estado="duplicada", id=None, detalle=DETALLE_DUPLICADA)
+        filas = [f for f in filas if f["id"] in insertadas]
+
+    # Lo derivado (acumulados, categoría) se procesa en segundo plano
+    trabajos = await registrar_trabajos(db, [(f["id"], f["test_id"]) for f in filas])
+    await db.commit()
+    encolar(trabajos)
+
+    estados = [item["estado"] for item in items]
+    return {
+        "aceptadas": estados.count("aceptada"),
+        "duplicadas": estados.count("duplicada"),
+        "errores": estados.count("error"),
+        "items": items,
+    }
+
+# Cursor opaco con la última (fecha, id) entregada
+def _codificar_cursor(fecha: date, id: UUID) -> str:
+    return base64.urlsafe_b64encode(f"{fecha.isoformat()}|{id}".encode()).decode()
+
+def _decodificar_cursor(cursor: str) -> tuple[date, UUID]:
+    try:
+        fecha, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(fecha), UUID(id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor no válido.")
+
+# GET paginado por cursor (fecha, id), con filtros y sin los campos JSON si no se piden.
+# El cuerpo sigue siendo la lista de respuestas; el cursor de la página siguiente va
+# en la cabecera X-Siguiente-Cursor (y en Link con rel="next")
+@router.get("/", response_model=list[RespuestaListado], response_model_exclude_none=True)
+async def listar_respuestas(
+    request: Request,
+    limite: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    test_id: Optional[UUID] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    incluir_datos: bool = Query(True, description="Incluir los campos JSON respuestas y caracterizacion_datos"),
+    db: AsyncSession = Depends(get_db_lectura)
+):
+    # Solo se seleccionan columnas, así no se carga el Test asociado a cada fila
+    columnas = [Respuesta.id, Respuesta.test_id, Respuesta.fecha, Respuesta.fingerprint]
+    if incluir_datos:
+        columnas += [Respuesta.respuestas, Respuesta.caracterizacion_datos]
+    query = select(*columnas)
+
+    if test_id:
+        query = query.where(Respuesta.test_id == test_id)
+    if desde:
+        query = query.where(Respuesta.fecha >= desde)
+    if hasta:
+        query = query.where(Respuesta.fecha <= hasta)
+    if cursor:
+        fecha, id = _decodificar_cursor(cursor)
+        query = query.where(or_(
+            Respuesta.fecha > fecha,
+            and_(Respuesta.fecha == fecha, Respuesta.id > id)
+        ))
+
+    filas = (await db.execute(query.order_by(Respuesta.fecha, Respuesta.id).limit(limite + 1))).all()
+
+    cabeceras = {}
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = _codificar_cursor(filas[-1].fecha, filas[-1].id)
+        cabeceras["X-Siguiente-Cursor"] = siguiente
+        # Referencia relativa: detrás del proxy el esquema y el host que ve la app no son los del cliente
+        url = request.url.include_query_params(cursor=siguiente)
+        cabeceras["Link"] = f'<{url.path}?{url.query}>; rel="next"'
+
+    # Las filas ya tienen la forma de RespuestaListado: se serializan sin validarlas de nuevo
+    return RespuestaJSON([f._asdict() for f in filas], headers=cabeceras)
@@ -1,23 +1,75 @@
 # routers/Segmentacion.py
 
-from fastapi import APIRouter
+from collections import Counter
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db, get_db_lectura
 from models.Segmentacion import Segmentacion
-from schemas.Segmentacion import ResultadoSegmentacion, EntradasSegmentacion
-from database import SessionLocal  # Import SessionLocal from your database module
+from models.Respuestas import Respuesta
+from models.Test import Test
+from schemas.Segmentacion import (
+    ResultadoSegmentacion, EntradasSegmentacion,
+    EntradaSegmentacionLote, ResultadoSegmentacionLote
+)
 
 router = APIRouter(prefix="/segmentacion", tags=["Segmentación"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Respuestas que se leen y puntúan en cada bloque al segmentar un test completo
+LOTE_SEGMENTACION = 5000
 
 @router.post("/", response_model=ResultadoSegmentacion)
 def analizar_respuestas(datos: EntradasSegmentacion):
     """
     Recibe una lista de respuestas y calcula el porcentaje y categoría.
     """
-    resultado = Segmentacion.calcular_categoria(datos.respuestas)
+    umbrales = [u.dict() for u in datos.umbrales] if datos.umbrales else None
+    resultado = Segmentacion.calcular_categoria([r.dict() for r in datos.respuestas], umbrales)
+    return resultado
+
+@router.post("/batch", response_model=ResultadoSegmentacionLote, response_model_exclude_none=True)
+async def segmentar_test(datos: EntradaSegmentacionLote, db: AsyncSession = Depends(get_db_lectura)):
+    """
+    Vuelve a puntuar todas las respuestas de un test con sus umbrales actuales.
+    Las respuestas se leen por bloques y cada bloque se puntúa de forma vectorizada.
+    """
+    test = (await db.execute(select(Test.umbrales).where(Test.id == datos.test_id))).first()
+    if not test:
+        raise HTTPException(status_code=404, detail="Test no encontrado")
+
+    ids = []
+    porcentajes = []
+    consulta = (
+        select(Respuesta.id, Respuesta.respuestas)
+        .where(Respuesta.test_id == datos.test_id)
+        .execution_options(yield_per=LOTE_SEGMENTACION)
+    )
+    async for bloque in (await db.stream(consulta)).partitions():
+        bloque_ids, lote = zip(*bloque)
+        valores, filas = Segmentacion.aplanar(lote)
+        porcentajes.append(Segmentacion.porcentajes(valores, filas, len(lote)))
+        ids.extend(bloque_ids)
+
+    if not ids:
+        raise HTTPException(status_code=404, detail="No se encontraron respuestas para este test.")
+
+    porcentajes = np.concatenate(porcentajes)
+    categorias = Segmentacion.categorizar(porcentajes, test.umbrales)
+    promedio = float(porcentajes.mean())
+
+    resultado = {
+        "test_id": datos.test_id,
+        "total": len(ids),
+        "porcentaje_promedio": round(promedio, 2),
+        "categoria_promedio": Segmentacion.categorizar(np.array([promedio]), test.umbrales)[0],
+        "por_categoria": dict(Counter(categorias)),
+    }
+    if datos.incluir_detalle:
+        resultado["resultados"] = [
+            {"respuesta_id": i, "porcentaje": round(float(p), 2), "categoria": c}
+            for i, p, c in zip(ids, porcentajes, categorias)
+        ]
     return resultado
@@ -1,64 +1,134 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import hashlib
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
-from database import SessionLocal
+from database import get_db, get_db_lectura
 from models.Test import Test
-from schemas.Test import TestCreate, TestOut
+from models.Respuestas import Respuesta
+from schemas.Test import Categoria, TestCreate, TestDefinicion, TestOut, TestResumen
+from utils.cache import cache_cuestionarios, invalidar_cuestionario, CLAVE_LISTA_CUESTIONARIOS
+from utils.respuesta_json import RespuestaJSON
 
 router = APIRouter(prefix="/cuestionarios", tags=["Tests"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Los navegadores pueden reutilizar la definición este tiempo antes de revalidarla con If-None-Match
+CACHE_CONTROL = f"public, max-age={int(os.getenv('CUESTIONARIOS_MAX_AGE', '60'))}"
+
+_DEFINICION = TypeAdapter(TestDefinicion)
+_LISTA_DEFINICIONES = TypeAdapter(list[TestDefinicion])
+
+def _entrada_cache(adaptador: TypeAdapter, datos) -> tuple[str, bytes]:
+    """Serializa una vez y calcula el ETag a partir del cuerpo."""
+    cuerpo = adaptador.dump_json(adaptador.validate_python(datos, from_attributes=True))
+    return f'"{hashlib.sha1(cuerpo).hexdigest()}"', cuerpo
+
+def _etag_coincide(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip().removeprefix("W/") for e in if_none_match.split(",")]
+    return "*" in etiquetas or etag in etiquetas
+
+def _respuesta_cacheable(request: Request, etag: str, cuerpo: bytes) -> Response:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cuerpo, media_type="application/json", headers=headers)
 
 @router.post("/", response_model=TestOut)
-def crear_test(test: TestCreate, db: Session = Depends(get_db)):
+async def crear_test(test: TestCreate, db: AsyncSession = Depends(get_db)):
     nuevo_test = Test(
         titulo=test.titulo,
         dimensiones=[dim.dict() for dim in test.dimensiones],
         caracterizacion_template=test.caracterizacion_template.dict(),
-        categoria=test.categoria.dict()
+        categoria=test.categoria.dict(),
+        umbrales=[u.dict() for u in test.umbrales] if test.umbrales else None
     )
     db.add(nuevo_test)
-    db.commit()
-    db.refresh(nuevo_test)
+    await db.commit()
+    await db.refresh(nuevo_test)
+    invalidar_cuestionario()
     return nuevo_test
 
-@router.get("/", response_model=list[TestOut])
-def listar_tests(db: Session = Depends(get_db)):
-    return db.query(Test).all()
+@router.get("/", response_model=list[TestDefinicion])
+async def listar_tests(request: Request, db: AsyncSession = Depends(get_db)):
+    # Con la caché llena no se abre conexión a la base de datos
+    entrada = cache_cuestionarios.obtener(CLAVE_LISTA_CUESTIONARIOS)
+    if entrada is None:
+        tests = (await db.scalars(select(Test))).all()
+        entrada = _entrada_cache(_LISTA_DEFINICIONES, tests)
+        cache_cuestionarios.guardar(CLAVE_LISTA_CUESTIONARIOS, entrada)
+    return _respuesta_cacheable(request, *entrada)
 
-@router.get("/{id}", response_model=TestOut)
-def obtener_test(id: UUID, db: Session = Depends(get_db)):
-    test = db.query(Test).filter(Test.id == id).first()
-    if not test:
+@router.get("/resumen", response_model=list[TestResumen])
+async def listar_tests_resumen(
+    limite: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db_lectura)
+):
+    # Una sola consulta: el total de respuestas sale de una subconsulta correlacionada
+    total_respuestas = (
+        select(func.count(Respuesta.id))
+        .where(Respuesta.test_id == Test.id)
+        .correlate(Test)
+        .scalar_subquery()
+    )
+    filas = (await db.execute(
+        select(Test.id, Test.titulo, Test.categoria, total_respuestas.label("total_respuestas"))
+        .order_by(Test.titulo, Test.id)
+        .offset(offset)
+        .limit(limite)
+    )).all()
+    return RespuestaJSON([f._asdict() for f in filas])
+
+@router.get("/{id}", response_model=TestDefinicion)
+async def obtener_test(id: UUID, request: Request, db: AsyncSession = Depends(get_db)):
+    entrada = cache_cuestionarios.obtener(str(id))
+    if entrada is None:
+        test = await db.get(Test, id)
+        if not test:
+            raise HTTPException(status_code=404, detail="Test no encontrado")
+        entrada = _entrada_cache(_DEFINICION, test)
+        cache_cuestionarios.guardar(str(id), entrada)
+    return _respuesta_cacheable(request, *entrada)
+
+# La categoría cambia con cada respuesta procesada: se lee siempre de la base de datos
+# y queda fuera de la definición cacheada
+@router.get("/{id}/categoria", response_model=Optional[Categoria])
+async def obtener_categoria(id: UUID, db: AsyncSession = Depends(get_db_lectura)):
+    fila = (await db.execute(select(Test.categoria).where(Test.id == id))).first()
+    if fila is None:
         raise HTTPException(status_code=404, detail="Test no encontrado")
-    return test
+    return RespuestaJSON(fila.categoria, headers={"Cache-Control": "no-cache"})
 
 @router.put("/{id}", response_model=TestOut)
-def actualizar_test(id: UUID, test_actualizado: TestCreate, db: Session = Depends(get_db)):
-    test = db.query(Test).filter(Test.id == id).first()
+async def actualizar_test(id: UUID, test_actualizado: TestCreate, db: AsyncSession = Depends(get_db)):
+    test = await db.get(Test, id)
     if not test:
         raise HTTPException(status_code=404, detail="Test no encontrado")
     
     test.titulo = test_actualizado.titulo
     test.dimensiones = [dim.dict() for dim in test_actualizado.dimensiones]
     test.caracterizacion_template = test_actualizado.caracterizacion_template.dict()
+    test.umbrales = [u.dict() for u in test_actualizado.umbrales] if test_actualizado.umbrales else None
 
-    db.commit()
-    db.refresh(test)
+    await db.commit()
+    await db.refresh(test)
+    invalidar_cuestionario(id)
     return test
 
 @router.delete("/{id}")
-def eliminar_test(id: UUID, db: Session = Depends(get_db)):
-    test = db.query(Test).filter(Test.id == id).first()
+async def eliminar_test(id: UUID, db: AsyncSession = Depends(get_db)):
+    test = await db.get(Test, id)
     if not test:
         raise HTTPException(status_code=404, detail="Test no encontrado")
     
-    db.delete(test)
-    db.commit()
+    await db.delete(test)
+    await db.commit()
+    invalidar_cuestionario(id)
     return {"mensaje": "Test eliminado correctamente"}
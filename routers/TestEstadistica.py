@@ -1,40 +1,33 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
 # Importaciones internas del proyecto
-from database import SessionLocal
-from models.TestEstadistica import TestEstadistica 
+from database import get_db
+from models.TestEstadistica import TestEstadistica as TestEstadisticaModel
 from schemas.TestEstadistica import TestEstadisticaCreate, TestEstadistica
 
 # Enrutador para el recurso test-estadistica
 router = APIRouter(prefix="/test-estadistica", tags=["TestEstadistica"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Endpoint para crear una nueva relación entre respuesta y estadística
 @router.post("/", response_model=TestEstadistica)
-def crear_test_estadistica(
+async def crear_test_estadistica(
     relacion: TestEstadisticaCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Crear instancia a partir del schema recibido
-    nueva = TestEstadistica.TestEstadistica(**relacion.dict())
+    nueva = TestEstadisticaModel(**relacion.dict())
     db.add(nueva)  
-    db.commit()    
-    db.refresh(nueva)  
+    await db.commit()    
+    await db.refresh(nueva)  
     return nueva  
 
 # Endpoint para obtener una relación específica por ID
 @router.get("/{test_estadistica_id}", response_model=TestEstadistica)
-def obtener_test_estadistica(test_estadistica_id: UUID, db: Session = Depends(get_db)):
+async def obtener_test_estadistica(test_estadistica_id: UUID, db: AsyncSession = Depends(get_db)):
     # Buscar en la base de datos la relación por ID
-    est = db.query(TestEstadistica.TestEstadistica).filter_by(id=test_estadistica_id).first()
+    est = await db.get(TestEstadisticaModel, test_estadistica_id)
     if not est:
         # Si no se encuentra, lanzar excepción HTTP 404
         raise HTTPException(status_code=404, detail="Relación TestEstadistica no encontrada")
@@ -1,26 +1,19 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db
 from models.Usuario import Usuario
 from schemas.Usuario import UsuarioCreate, UsuarioOut
 router = APIRouter(prefix="/Usuarios", tags=["Usuarios"])
 
-# Dependency para obtener sesión de BD
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=UsuarioOut)
-def crear_usuario(usuario: UsuarioCreate, db: Session = Depends(get_db)):
+async def crear_usuario(usuario: UsuarioCreate, db: AsyncSession = Depends(get_db)):
     nuevo_usuario = Usuario(**usuario.dict())
     db.add(nuevo_usuario)
-    db.commit()
-    db.refresh(nuevo_usuario)
+    await db.commit()
+    await db.refresh(nuevo_usuario)
     return nuevo_usuario
 
 @router.get("/", response_model=list[UsuarioOut])
-def listar_usuarios(db: Session = Depends(get_db)):
-    return db.query(Usuario).all()
+async def listar_usuarios(db: AsyncSession = Depends(get_db)):
+    return (await db.scalars(select(Usuario))).all()
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from uuid import UUID
 from datetime import datetime
+from typing import Optional
 
 class EstadisticasBase(BaseModel):
     resumen: str
@@ -11,6 +12,10 @@ class EstadisticasCreate(EstadisticasBase):
 class EstadisticasOut(EstadisticasBase):
     id: UUID
     fecha_generacion: datetime
+    # Solo en los informes materializados de un test
+    test_id: Optional[UUID] = None
+    datos: Optional[dict] = None
+    marca_agua: Optional[datetime] = None
     
     class Config:
         orm_mode = True
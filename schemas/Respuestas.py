@@ -1,12 +1,13 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Dict, Any, Literal, Optional
 from datetime import date
 from uuid import UUID
 
 # Subschema para agrupar respuestas por dimensión
 class RespuestaDimension(BaseModel):
     dimension: str
-    respuestas: List[int]
+    # Escala Likert 1-5: los agregados solo guardan frecuencias en ese rango
+    respuestas: List[Annotated[int, Field(ge=1, le=5)]]
 
 # Esquema para crear una respuesta
 class RespuestaCreate(BaseModel):
@@ -22,3 +23,29 @@ class RespuestaOut(RespuestaCreate):
 
     class Config:
         from_attributes = True
+
+# Elemento del listado paginado; los campos JSON se omiten si no se piden
+class RespuestaListado(BaseModel):
+    id: UUID
+    test_id: UUID
+    fecha: date
+    fingerprint: str
+    respuestas: Optional[List[RespuestaDimension]] = None
+    caracterizacion_datos: Optional[Dict[str, Any]] = None
+
+    class Config:
+        from_attributes = True
+
+# Resultado de cada elemento de una carga masiva
+class ResultadoCargaItem(BaseModel):
+    indice: int
+    estado: Literal["aceptada", "duplicada", "error"]
+    id: Optional[UUID] = None
+    detalle: Optional[str] = None
+
+# Reporte de una carga masiva de respuestas
+class ResultadoCarga(BaseModel):
+    aceptadas: int
+    duplicadas: int
+    errores: int
+    items: List[ResultadoCargaItem]
@@ -1,12 +1,36 @@
 # schemas/Segmentacion.py
 
 from pydantic import BaseModel
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from schemas.Respuestas import RespuestaDimension
+from schemas.Test import Umbral
 
 # Representa la respuesta de la segmentación
 class ResultadoSegmentacion(BaseModel):
     porcentaje: float
     categoria: str
 
-# Recibe las respuestas que serán analizadas
+# Recibe las respuestas (agrupadas por dimensión) que serán analizadas
 class EntradasSegmentacion(BaseModel):
-    respuestas: list[str]
+    respuestas: List[RespuestaDimension]
+    umbrales: Optional[List[Umbral]] = None
+
+# Solicitud para volver a puntuar todas las respuestas de un test
+class EntradaSegmentacionLote(BaseModel):
+    test_id: UUID
+    incluir_detalle: bool = False  # Devolver también el resultado de cada respuesta
+
+# Resultado de una respuesta dentro del lote
+class ResultadoSegmentacionRespuesta(ResultadoSegmentacion):
+    respuesta_id: UUID
+
+# Resumen del lote: porcentaje promedio y cuántas respuestas caen en cada categoría
+class ResultadoSegmentacionLote(BaseModel):
+    test_id: UUID
+    total: int
+    porcentaje_promedio: float
+    categoria_promedio: str
+    por_categoria: Dict[str, int]
+    resultados: Optional[List[ResultadoSegmentacionRespuesta]] = None
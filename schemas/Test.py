@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List
 from uuid import UUID
 from typing import Optional
@@ -15,18 +15,37 @@ class Categoria(BaseModel):
     porcentaje: float
     categoria: str
 
+# Límite superior de porcentaje (0 a 100) para asignar una categoría
+class Umbral(BaseModel):
+    limite: float = Field(..., ge=0, le=100)
+    categoria: str
+
 class TestCreate(BaseModel):
     titulo: str
     dimensiones: List[Dimension]
     caracterizacion_template: CaracterizacionTemplate  # nuevo campo
     categoria : Categoria
+    umbrales: Optional[List[Umbral]] = None  # None usa los umbrales por defecto
     
-class TestOut(BaseModel):
+# Definición del cuestionario, la que se guarda en caché: sin la categoría, que
+# cambia con cada respuesta procesada (ver GET /cuestionarios/{id}/categoria)
+class TestDefinicion(BaseModel):
     id: UUID
     titulo: str
     dimensiones: List[Dimension]
     caracterizacion_template: CaracterizacionTemplate  # nuevo campo
+    umbrales: Optional[List[Umbral]] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class TestOut(TestDefinicion):
     categoria : Categoria
 
-    class Config:
-        orm_mode = True
+# Representación liviana para listados: sin dimensiones y con el total de respuestas
+class TestResumen(BaseModel):
+    id: UUID
+    titulo: str
+    categoria: Optional[Categoria] = None
+    total_respuestas: int
+
+    model_config = ConfigDict(from_attributes=True)
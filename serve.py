@@ -0,0 +1,36 @@
+# serve.py
+# Arranque de producción con varios workers de uvicorn. WEB_CONCURRENCY fija el
+# número de workers (por defecto uno por núcleo, hasta 4) y cada worker reparte
+# entre ellos el presupuesto de conexiones DB_CONEXIONES_MAX (ver database.py).
+# Las migraciones van antes, una sola vez (ver Procfile y Dockerfile).
+# Uso: python serve.py
+import logging
+import os
+
+import uvicorn
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS_POR_DEFECTO = 4
+
+
+def main():
+    workers = int(os.getenv("WEB_CONCURRENCY") or min(MAX_WORKERS_POR_DEFECTO, os.cpu_count() or 1))
+    # Los workers heredan el entorno: así cada uno calcula su parte del presupuesto
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    from database import describir_pools
+    logger.info(f"Conexiones a la base de datos: {describir_pools()}")
+
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        timeout_graceful_shutdown=int(os.getenv("APAGADO_GRACIOSO", "30")),
+    )
+
+
+if __name__ == "__main__":
+    main()
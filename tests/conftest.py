@@ -0,0 +1,41 @@
+# tests/conftest.py
+# database.py crea sus motores al importarse: las pruebas usan una base SQLite
+# en un directorio temporal (y ahí también los snapshots), sin PostgreSQL.
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+_DIRECTORIO = tempfile.mkdtemp(prefix="gesex-pruebas-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DIRECTORIO, 'pruebas.db')}")
+os.environ.setdefault("SNAPSHOT_DIR", os.path.join(_DIRECTORIO, "snapshots"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def ejecutar(corutina):
+    """asyncio.run que suelta las conexiones del pool, atadas al event loop que termina."""
+    from database import async_engine
+
+    async def envolver():
+        try:
+            return await corutina
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(envolver())
+
+
+@pytest.fixture
+def base_de_datos():
+    """Esquema vacío recién migrado para cada prueba."""
+    from database import Base, async_engine
+    from migraciones import migrar
+
+    async def crear():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await migrar()
+
+    ejecutar(crear())
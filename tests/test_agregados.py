@@ -0,0 +1,83 @@
+# tests/test_agregados.py
+import uuid
+from datetime import date
+
+from sqlalchemy import func, insert, select, update
+
+from conftest import ejecutar
+from database import AsyncSessionLocal
+from models.AgregadoDimension import AgregadoDimension
+from models.AgregadoTendencia import AgregadoTendencia
+from models.Respuestas import Respuesta
+from models.Test import Test as Cuestionario
+from models.TrabajoPendiente import MAX_INTENTOS, TrabajoPendiente
+from utils.agregados import reconstruir_agregados, reconstruir_tendencias
+from utils.trabajos import procesar, registrar_trabajos
+
+
+async def _enviar(db, test_id, valores: list[int]):
+    """Como POST /Respuestas/: la respuesta y su trabajo pendiente, sin procesarlo."""
+    filas = [
+        {
+            "id": uuid.uuid4(), "test_id": test_id,
+            "respuestas": [{"dimension": "A", "respuestas": [valor]}],
+            "caracterizacion_datos": {}, "fecha": date(2024, 1, 1 + i % 3), "fingerprint": str(uuid.uuid4()),
+        }
+        for i, valor in enumerate(valores)
+    ]
+    await db.execute(insert(Respuesta), filas)
+    ids = await registrar_trabajos(db, [(f["id"], test_id) for f in filas])
+    await db.commit()
+    return ids
+
+
+async def _totales(db, test_id):
+    dimension = (await db.execute(
+        select(AgregadoDimension.conteo, AgregadoDimension.suma).where(AgregadoDimension.test_id == test_id)
+    )).one()
+    tendencia = (await db.execute(
+        select(func.sum(AgregadoTendencia.conteo), func.sum(AgregadoTendencia.suma))
+        .where(AgregadoTendencia.test_id == test_id, AgregadoTendencia.granularidad == "dia")
+    )).one()
+    return tuple(dimension), tuple(tendencia)
+
+
+def test_reconstruir_antes_de_procesar_no_duplica(base_de_datos):
+    async def escenario():
+        async with AsyncSessionLocal() as db:
+            test = Cuestionario(titulo="t", dimensiones=[], caracterizacion_template=[])
+            db.add(test)
+            await db.commit()
+            # Unas procesadas y otras todavía en la cola cuando se reconstruye
+            await _enviar(db, test.id, [1, 2, 3, 4])
+            await procesar()
+            await _enviar(db, test.id, [5, 5, 1])
+            await reconstruir_agregados(db, test.id)
+            await reconstruir_tendencias(db, test.id)
+            antes = await _totales(db, test.id)
+        await procesar()
+        async with AsyncSessionLocal() as db:
+            return antes, await _totales(db, test.id)
+
+    antes, despues = ejecutar(escenario())
+    assert antes == ((4, 10), (4, 10))
+    assert despues == ((7, 21), (7, 21))
+
+
+def test_reconstruir_incluye_trabajos_agotados(base_de_datos):
+    async def escenario():
+        async with AsyncSessionLocal() as db:
+            test = Cuestionario(titulo="t", dimensiones=[], caracterizacion_template=[])
+            db.add(test)
+            await db.commit()
+            ids = await _enviar(db, test.id, [2, 4])
+            # Ningún worker volverá a tomarlos: la reconstrucción es la que los cuenta
+            await db.execute(update(TrabajoPendiente).where(TrabajoPendiente.id.in_(ids)).values(intentos=MAX_INTENTOS))
+            await db.commit()
+            await reconstruir_agregados(db, test.id)
+            await reconstruir_tendencias(db, test.id)
+        await procesar()
+        async with AsyncSessionLocal() as db:
+            return await _totales(db, test.id)
+
+    assert ejecutar(escenario()) == ((2, 6), (2, 6))
@@ -0,0 +1,111 @@
+# tests/test_estadistica_descriptiva.py
+import math
+import random
+import statistics
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+
+from schemas.Respuestas import RespuestaDimension
+from utils.estadistica_descriptiva import Acumulador, valor_critico_t
+
+# Cuantiles de la t de Student de tablas (bilateral): (gl, confianza, t)
+T_CONOCIDOS = [
+    (1, 0.95, 12.7062),
+    (2, 0.95, 4.3027),
+    (5, 0.95, 2.5706),
+    (10, 0.95, 2.2281),
+    (30, 0.95, 2.0423),
+    (100, 0.95, 1.9840),
+    (120, 0.95, 1.9799),
+    (1000, 0.95, 1.9623),
+    (10, 0.99, 3.1693),
+    (10, 0.90, 1.8125),
+]
+
+
+@pytest.mark.parametrize("gl, confianza, esperado", T_CONOCIDOS)
+def test_valor_critico_t(gl, confianza, esperado):
+    assert valor_critico_t(gl, confianza) == pytest.approx(esperado, abs=5e-4)
+
+
+def test_valor_critico_t_confianza_invalida():
+    with pytest.raises(ValueError):
+        valor_critico_t(10, 1.0)
+
+
+def _acumular(valores):
+    acumulador = Acumulador()
+    for valor in valores:
+        acumulador.agregar(valor)
+    return acumulador
+
+
+@pytest.mark.parametrize("semilla", range(5))
+def test_varianza_igual_a_statistics(semilla):
+    valores = [random.Random(semilla).randint(1, 5) for _ in range(200 + semilla)]
+    acumulador = _acumular(valores)
+    assert acumulador.promedio == pytest.approx(statistics.fmean(valores))
+    assert acumulador.varianza == pytest.approx(statistics.variance(valores))
+    n = len(valores)
+    assert acumulador.varianza * (n - 1) / n == pytest.approx(statistics.pvariance(valores))
+
+
+def test_varianza_con_un_solo_valor():
+    assert _acumular([3]).varianza is None
+
+
+def test_combinar_equivale_a_acumular_todo():
+    valores = [random.Random(7).randint(1, 5) for _ in range(101)]
+    parcial = _acumular(valores[:40])
+    parcial.combinar(_acumular(valores[40:]))
+    total = _acumular(valores)
+    assert (parcial.conteo, parcial.suma, parcial.suma_cuadrados, parcial.histograma) == (
+        total.conteo, total.suma, total.suma_cuadrados, total.histograma
+    )
+
+
+@pytest.mark.parametrize("p", [1, 25, 50, 75, 99, 100])
+def test_percentil_rango_mas_cercano(p):
+    valores = sorted(random.Random(p).randint(1, 5) for _ in range(97))
+    esperado = valores[max(0, math.ceil(p / 100 * len(valores)) - 1)]
+    assert _acumular(valores).percentil(p) == esperado
+
+
+def test_intervalo_de_confianza():
+    valores = [1, 2, 3, 4, 5, 3, 2, 4]
+    descripcion = _acumular(valores).describir()
+    margen = 2.3646 * statistics.stdev(valores) / math.sqrt(len(valores))
+    assert descripcion["intervalo_confianza"]["inferior"] == pytest.approx(3 - margen, abs=1e-3)
+    assert descripcion["intervalo_confianza"]["superior"] == pytest.approx(3 + margen, abs=1e-3)
+
+
+def _agregado(valores):
+    """Fila de agregados como la que deja el rollup: conteo y sumas de todo, frecuencias 1-5."""
+    fila = SimpleNamespace(
+        conteo=len(valores),
+        suma=sum(valores),
+        suma_cuadrados=sum(v * v for v in valores),
+    )
+    for v in range(1, 6):
+        setattr(fila, f"frecuencia_{v}", valores.count(v))
+    return fila
+
+
+def test_desde_agregado_equivale_a_acumular():
+    valores = [1, 2, 2, 3, 5, 5, 4]
+    agregado = Acumulador.desde_agregado(_agregado(valores))
+    assert agregado.describir() == _acumular(valores).describir()
+
+
+def test_desde_agregado_descarta_valores_fuera_de_escala():
+    en_escala = [1, 2, 2, 3, 5]
+    descripcion = Acumulador.desde_agregado(_agregado(en_escala + [0, 9, 9])).describir()
+    assert descripcion == _acumular(en_escala).describir()
+
+
+@pytest.mark.parametrize("valor", [0, 6, -1])
+def test_respuestas_fuera_de_escala_se_rechazan(valor):
+    with pytest.raises(ValidationError):
+        RespuestaDimension(dimension="d", respuestas=[1, valor])
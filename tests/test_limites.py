@@ -0,0 +1,85 @@
+# tests/test_limites.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from utils import limites
+from utils.limites import AlmacenMemoria
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(limites.time, "monotonic", reloj)
+    return reloj
+
+
+def _consumir(almacen, clave="ip", capacidad=3, recarga=1.0, costo=1):
+    return asyncio.run(almacen.consumir(clave, capacidad, recarga, costo))
+
+
+def test_rafaga_hasta_la_capacidad(reloj):
+    almacen = AlmacenMemoria()
+    assert [_consumir(almacen) for _ in range(3)] == [0, 0, 0]
+    # Sin tokens: espera lo que tarda en recargarse uno
+    assert _consumir(almacen) == pytest.approx(1.0)
+
+
+def test_recarga_a_ritmo_constante(reloj):
+    almacen = AlmacenMemoria()
+    for _ in range(3):
+        _consumir(almacen, recarga=2.0)
+    reloj.ahora += 0.25
+    # Medio token recargado: falta el otro medio (0,25 s a 2 tokens/s)
+    assert _consumir(almacen, recarga=2.0) == pytest.approx(0.25)
+    reloj.ahora += 0.25
+    assert _consumir(almacen, recarga=2.0) == 0
+
+
+def test_recarga_no_supera_la_capacidad(reloj):
+    almacen = AlmacenMemoria()
+    _consumir(almacen)
+    reloj.ahora += 3600
+    assert [_consumir(almacen) for _ in range(3)] == [0, 0, 0]
+    assert _consumir(almacen) > 0
+
+
+def test_claves_independientes_y_acotadas(reloj):
+    almacen = AlmacenMemoria(max_claves=2)
+    for _ in range(3):
+        _consumir(almacen, clave="a")
+    assert _consumir(almacen, clave="b") == 0
+    assert _consumir(almacen, clave="a") > 0
+    _consumir(almacen, clave="c")
+    # "b" fue la menos usada y se descartó: vuelve con el bucket lleno
+    assert len(almacen._buckets) == 2
+    assert "b" not in almacen._buckets
+
+
+def test_sin_recarga_no_admite_nunca(reloj):
+    almacen = AlmacenMemoria()
+    _consumir(almacen, capacidad=1, recarga=0)
+    assert _consumir(almacen, capacidad=1, recarga=0) == float("inf")
+
+
+def test_retry_after_acotado_con_espera_infinita():
+    with pytest.raises(HTTPException) as error:
+        limites._rechazar("ip", float("inf"))
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == str(limites.MAX_REINTENTO)
+
+
+@pytest.mark.parametrize("recarga", ["0", "-1"])
+def test_recarga_no_positiva_es_error_de_configuracion(monkeypatch, recarga):
+    monkeypatch.setenv("LIMITE_IP_RECARGA", recarga)
+    with pytest.raises(RuntimeError, match="LIMITE_IP_RECARGA"):
+        limites._recarga("LIMITE_IP_RECARGA", "2")
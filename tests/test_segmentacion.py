@@ -0,0 +1,71 @@
+# tests/test_segmentacion.py
+import itertools
+
+import pytest
+
+from models.Segmentacion import Segmentacion
+
+
+def _categoria_con_bucle(respuestas: list[dict]) -> dict:
+    """Cálculo original, valor por valor (sin la salida por consola)."""
+    total_respuestas = 0
+    total_puntos = 0
+    for grupo in respuestas:
+        for valor in grupo.get("respuestas", []):
+            total_puntos += max(0, min(4, valor - 1))
+            total_respuestas += 1
+
+    porcentaje = (total_puntos / (total_respuestas * 4)) * 100 if total_respuestas > 0 else 0
+
+    if porcentaje <= 20:
+        categoria = "Sin homofobia"
+    elif porcentaje <= 45:
+        categoria = "Bajo nivel de homofobia"
+    elif porcentaje <= 70:
+        categoria = "Moderado nivel de homofobia"
+    else:
+        categoria = "Alto nivel de homofobia"
+    return {"porcentaje": round(porcentaje, 2), "categoria": categoria}
+
+
+# Con 5 ítems todos los porcentajes son múltiplos de 5: pasan por 20, 45 y 70 exactos
+TODAS_DE_5 = [
+    [{"dimension": "A", "respuestas": list(valores[:2])}, {"dimension": "B", "respuestas": list(valores[2:])}]
+    for valores in itertools.product(range(1, 6), repeat=5)
+]
+
+
+def test_igual_al_bucle_en_todas_las_respuestas_de_5_items():
+    for respuestas in TODAS_DE_5:
+        assert Segmentacion.calcular_categoria(respuestas) == _categoria_con_bucle(respuestas)
+
+
+def test_lote_igual_al_bucle():
+    lote = TODAS_DE_5[::7] + [[], [{"dimension": "A", "respuestas": []}]]
+    assert Segmentacion.calcular_categorias(lote) == [_categoria_con_bucle(r) for r in lote]
+
+
+@pytest.mark.parametrize("puntos, categoria", [
+    (4, "Sin homofobia"),                    # 20 %
+    (5, "Bajo nivel de homofobia"),          # 25 %
+    (9, "Bajo nivel de homofobia"),          # 45 %
+    (10, "Moderado nivel de homofobia"),     # 50 %
+    (14, "Moderado nivel de homofobia"),     # 70 %
+    (15, "Alto nivel de homofobia"),         # 75 %
+])
+def test_limites_incluidos_en_su_categoria(puntos, categoria):
+    # 5 ítems: cada valor v aporta v - 1 puntos sobre 20
+    valores = [5] * (puntos // 4) + ([puntos % 4 + 1] if puntos % 4 else [])
+    valores += [1] * (5 - len(valores))
+    assert Segmentacion.calcular_categoria([{"respuestas": valores}])["categoria"] == categoria
+
+
+def test_valores_fuera_de_escala_se_recortan():
+    respuestas = [{"respuestas": [0, 7, 3]}]
+    assert Segmentacion.calcular_categoria(respuestas) == _categoria_con_bucle(respuestas)
+
+
+def test_umbrales_propios():
+    umbrales = [{"limite": 70, "categoria": "alto"}, {"limite": 30, "categoria": "bajo"}]
+    porcentajes = [0, 30, 30.01, 70, 100]
+    assert Segmentacion.categorizar(porcentajes, umbrales) == ["bajo", "bajo", "alto", "alto", "alto"]
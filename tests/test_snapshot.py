@@ -0,0 +1,58 @@
+# tests/test_snapshot.py
+import asyncio
+import uuid
+from datetime import date
+
+from sqlalchemy import insert
+
+from conftest import ejecutar
+from database import AsyncSessionLocal
+from models.Respuestas import Respuesta
+from models.Test import Test as Cuestionario
+from utils.snapshot import abrir_snapshot, actualizar_snapshot
+
+
+async def _crear_test(respuestas: int) -> uuid.UUID:
+    async with AsyncSessionLocal() as db:
+        test = Cuestionario(titulo="t", dimensiones=[], caracterizacion_template=[])
+        db.add(test)
+        await db.flush()
+        await db.execute(insert(Respuesta), [
+            {
+                "id": uuid.uuid4(), "test_id": test.id,
+                "respuestas": [{"dimension": "A", "respuestas": [i % 5 + 1]}],
+                "caracterizacion_datos": {"edad": "20"}, "fecha": date(2024, 1, 1), "fingerprint": str(i),
+            }
+            for i in range(respuestas)
+        ])
+        await db.commit()
+        return test.id
+
+
+def test_actualizaciones_concurrentes_no_bloquean_el_event_loop(base_de_datos):
+    async def escenario():
+        test_id = await _crear_test(50)
+        latidos = 0
+
+        async def latir():
+            nonlocal latidos
+            while True:
+                latidos += 1
+                await asyncio.sleep(0)
+
+        async def actualizar():
+            async with AsyncSessionLocal() as db:
+                return await actualizar_snapshot(db, test_id)
+
+        latido = asyncio.create_task(latir())
+        try:
+            manifests = await asyncio.wait_for(asyncio.gather(actualizar(), actualizar()), timeout=30)
+        finally:
+            latido.cancel()
+        return test_id, manifests, latidos
+
+    test_id, manifests, latidos = ejecutar(escenario())
+    assert latidos > 0
+    # La segunda actualización espera a la primera y no agrega nada
+    assert [m["filas"] for m in manifests] == [50, 50]
+    assert abrir_snapshot(test_id).valores(0).sum() == sum(i % 5 + 1 for i in range(50))
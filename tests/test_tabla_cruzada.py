@@ -0,0 +1,40 @@
+# tests/test_tabla_cruzada.py
+import uuid
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from conftest import ejecutar
+from database import AsyncSessionLocal
+from models.Respuestas import Respuesta
+from models.Test import Test as Cuestionario
+from utils.tabla_cruzada import tabla_cruzada
+
+
+async def _guardar(db, test_id, edad: str, creado_en: datetime):
+    await db.execute(insert(Respuesta).values(
+        id=uuid.uuid4(), test_id=test_id, respuestas=[{"dimension": "A", "respuestas": [3]}],
+        caracterizacion_datos={"edad": edad}, fecha=date(2024, 1, 1),
+        fingerprint=str(uuid.uuid4()), creado_en=creado_en,
+    ))
+    await db.commit()
+
+
+def test_respuesta_confirmada_tarde_invalida_la_cache(base_de_datos):
+    async def escenario():
+        ahora = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            test = Cuestionario(titulo="t", dimensiones=[], caracterizacion_template=[])
+            db.add(test)
+            await db.commit()
+            await _guardar(db, test.id, "20", ahora)
+            antes = await tabla_cruzada(db, test.id, ["edad"], metrica="conteo")
+            # Transacción iniciada antes que la última respuesta y confirmada después:
+            # no cambia max(creado_en)
+            await _guardar(db, test.id, "30", ahora - timedelta(minutes=1))
+            despues = await tabla_cruzada(db, test.id, ["edad"], metrica="conteo")
+            return antes, despues
+
+    antes, despues = ejecutar(escenario())
+    assert antes == {"20": 1}
+    assert despues == {"20": 1, "30": 1}
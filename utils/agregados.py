@@ -0,0 +1,189 @@
+# utils/agregados.py
+
+# Mantenimiento del acumulado por (test, dimensión) usado por las estadísticas y
+# de su versión por día y semana ISO (tendencias). Cada lote de respuestas nuevas
+# suma sus valores con un upsert, y reconstruir_agregados() / reconstruir_tendencias()
+# permiten recalcularlos desde la tabla respuestas.
+#
+# Una reconstrucción no cuenta las respuestas con trabajo pendiente: el worker las
+# suma al procesarlo. Para que ningún lote quede a medias entre ambas, los workers
+# toman bloquear_acumulados() compartido y la reconstrucción exclusivo.
+
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import column, delete, inspect, table, text
+
+from database import insert_dialecto
+from models.AgregadoDimension import AgregadoDimension, VALORES_ESCALA
+from models.AgregadoTendencia import AgregadoTendencia, GRANULARIDADES
+from models.TrabajoPendiente import TrabajoPendiente
+from utils.estadisticas_sql import contar_valores
+
+COLUMNAS_ACUMULADAS = ["suma", "conteo", "suma_cuadrados"] + [f"frecuencia_{v}" for v in VALORES_ESCALA]
+
+# Clave arbitraria del advisory lock entre reconstrucciones y workers de trabajos
+CLAVE_BLOQUEO_ACUMULADOS = 72_401_615
+
+
+def _fila_vacia() -> dict:
+    return {columna: 0 for columna in COLUMNAS_ACUMULADAS}
+
+
+def _sumar(acumulado: dict, respuestas: list[dict]):
+    """Suma en `acumulado[dimension]` los valores de una respuesta agrupada por dimensión."""
+    for d in respuestas:
+        fila = acumulado[d["dimension"]]
+        valores = d["respuestas"]
+        fila["suma"] += sum(valores)
+        fila["conteo"] += len(valores)
+        fila["suma_cuadrados"] += sum(v * v for v in valores)
+        for valor in valores:
+            if valor in VALORES_ESCALA:
+                fila[f"frecuencia_{valor}"] += 1
+
+
+def _sumar_conteo(fila: dict, valor, n: int):
+    fila["suma"] += valor * n
+    fila["conteo"] += n
+    fila["suma_cuadrados"] += valor * valor * n
+    if valor in VALORES_ESCALA:
+        fila[f"frecuencia_{valor}"] += n
+
+
+def periodo(fecha: date, granularidad: str) -> date:
+    """Inicio del periodo que contiene `fecha`: el mismo día o el lunes de su semana ISO."""
+    if granularidad == "semana":
+        return fecha - timedelta(days=fecha.weekday())
+    return fecha
+
+
+async def _upsert(db, filas: list[dict], modelo=AgregadoDimension, columnas: list[str] = COLUMNAS_ACUMULADAS):
+    """Incrementa (o crea) las filas del acumulado con un único INSERT ... ON CONFLICT."""
+    if not filas:
+        return
+    tabla = modelo.__table__
+    claves = [c.name for c in tabla.primary_key.columns]
+    if len(columnas) < len(COLUMNAS_ACUMULADAS):
+        # Solo estas columnas: el INSERT no debe incluir los default de las que faltan
+        tabla = table(tabla.name, *(column(c, tabla.c[c].type) for c in claves + columnas))
+    insert = insert_dialecto(db)
+    stmt = insert(tabla).values(filas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=claves,
+        set_={c: tabla.c[c] + stmt.excluded[c] for c in columnas},
+    )
+    await db.execute(stmt)
+
+
+async def bloquear_acumulados(db, exclusivo: bool = False):
+    """
+    Advisory lock de PostgreSQL hasta el fin de la transacción. En SQLite no hace
+    falta: la reconstrucción borra antes de contar y desde ahí nadie más escribe.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    funcion = "pg_advisory_xact_lock" if exclusivo else "pg_advisory_xact_lock_shared"
+    await db.execute(text(f"SELECT {funcion}(:clave)"), {"clave": CLAVE_BLOQUEO_ACUMULADOS})
+
+
+async def _hay_pendientes(db) -> bool:
+    # Las reconstrucciones de migraciones anteriores a la 7 no tienen la tabla
+    return await db.run_sync(lambda s: inspect(s.connection()).has_table(TrabajoPendiente.__tablename__))
+
+
+async def _columnas_existentes(db, modelo) -> list[str]:
+    """
+    Columnas acumuladas que tiene la tabla en la base de datos. Las reconstrucciones
+    de migraciones anteriores a una columna (p. ej. suma_cuadrados, migración 9)
+    escriben solo las que existían en su versión del esquema.
+    """
+    nombres = await db.run_sync(
+        lambda s: {c["name"] for c in inspect(s.connection()).get_columns(modelo.__tablename__)}
+    )
+    return [c for c in COLUMNAS_ACUMULADAS if c in nombres]
+
+
+def _filas(claves: list[str], acumulado: dict, columnas: list[str]) -> list[dict]:
+    return [
+        {**dict(zip(claves, clave)), **{c: fila[c] for c in columnas}}
+        for clave, fila in acumulado.items()
+    ]
+
+
+async def acumular_respuestas(db, lote: list[tuple]):
+    """Suma un lote de (test_id, respuestas) al acumulado con un único upsert."""
+    acumulado = defaultdict(lambda: defaultdict(_fila_vacia))
+    for test_id, respuestas in lote:
+        _sumar(acumulado[test_id], respuestas)
+    await _upsert(db, [
+        {"test_id": t, "dimension": dimension, **fila}
+        for t, dimensiones in acumulado.items()
+        for dimension, fila in dimensiones.items()
+    ])
+
+
+async def reconstruir_agregados(db, test_id=None) -> int:
+    """
+    Recalcula el acumulado desde la tabla respuestas (de un test o de todos).
+    La agrupación por dimensión y valor se hace en la base de datos, así que
+    solo se leen los conteos. Devuelve las filas del acumulado escritas.
+    """
+    borrar = delete(AgregadoDimension)
+    if test_id is not None:
+        borrar = borrar.where(AgregadoDimension.test_id == test_id)
+
+    await bloquear_acumulados(db, exclusivo=True)
+    columnas = await _columnas_existentes(db, AgregadoDimension)
+    pendientes = await _hay_pendientes(db)
+    await db.execute(borrar)
+
+    acumulado = defaultdict(_fila_vacia)
+    for r_test_id, dimension, valor, n in await contar_valores(db, test_id, por_test=True, sin_pendientes=pendientes):
+        _sumar_conteo(acumulado[(r_test_id, dimension)], valor, n)
+
+    await _upsert(db, _filas(["test_id", "dimension"], acumulado, columnas), columnas=columnas)
+    await db.commit()
+    return len(acumulado)
+
+
+async def acumular_tendencias(db, lote: list[tuple]):
+    """Suma un lote de (test_id, fecha, respuestas) a los periodos de cada granularidad."""
+    acumulado = defaultdict(lambda: defaultdict(_fila_vacia))
+    for test_id, fecha, respuestas in lote:
+        for granularidad in GRANULARIDADES:
+            _sumar(acumulado[(test_id, granularidad, periodo(fecha, granularidad))], respuestas)
+    await _upsert(db, [
+        {"test_id": t, "granularidad": g, "periodo": p, "dimension": dimension, **fila}
+        for (t, g, p), dimensiones in acumulado.items()
+        for dimension, fila in dimensiones.items()
+    ], AgregadoTendencia)
+
+
+async def reconstruir_tendencias(db, test_id=None) -> int:
+    """
+    Recalcula las tendencias desde la tabla respuestas (de un test o de todos).
+    La base de datos agrupa por día; las semanas se suman a partir de los días.
+    Devuelve las filas escritas.
+    """
+    borrar = delete(AgregadoTendencia)
+    if test_id is not None:
+        borrar = borrar.where(AgregadoTendencia.test_id == test_id)
+
+    await bloquear_acumulados(db, exclusivo=True)
+    columnas = await _columnas_existentes(db, AgregadoTendencia)
+    pendientes = await _hay_pendientes(db)
+    await db.execute(borrar)
+
+    acumulado = defaultdict(_fila_vacia)
+    consulta = contar_valores(db, test_id, por_test=True, por_fecha=True, sin_pendientes=pendientes)
+    for r_test_id, fecha, dimension, valor, n in await consulta:
+        for granularidad in GRANULARIDADES:
+            _sumar_conteo(acumulado[(r_test_id, granularidad, periodo(fecha, granularidad), dimension)], valor, n)
+
+    filas = _filas(["test_id", "granularidad", "periodo", "dimension"], acumulado, columnas)
+    # Por lotes: una campaña larga puede tener muchos periodos por dimensión
+    for i in range(0, len(filas), 1000):
+        await _upsert(db, filas[i:i + 1000], AgregadoTendencia, columnas)
+    await db.commit()
+    return len(filas)
@@ -1,11 +1,19 @@
 import os
-from google.oauth2 import id_token
-from google.auth.transport import requests
-from fastapi import HTTPException
-from jose import jwt
+import re
+import threading
+import time
+from typing import Protocol
+
+import requests
+from google.auth import jwt as google_jwt
+from fastapi import HTTPException, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from utils.cache import CacheLRU
+
 # Cargar las variables de entorno desde el archivo .env
 load_dotenv()
 
@@ -14,14 +22,89 @@ GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")  # Obtener desde el .env
 SECRET_KEY = os.getenv("SECRET_KEY")  # Obtener desde el .env
 ALGORITHM = "HS256"
 
+# Certificados (PEM por kid) con los que Google firma los ID tokens
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+# Si Google no envía max-age, cuánto tiempo reutilizar los certificados
+CERTS_TTL_POR_DEFECTO = 3600
+
+
+class ProveedorCertificados(Protocol):
+    def obtener(self) -> dict:
+        """Devuelve {kid: certificado PEM}."""
+
+
+class CertificadosLocales:
+    """Certificados fijos, para verificar tokens firmados localmente (pruebas sin red)."""
+
+    def __init__(self, certificados: dict):
+        self.certificados = certificados
+
+    def obtener(self) -> dict:
+        return self.certificados
+
+
+class CertificadosGoogle:
+    """
+    Descarga los certificados de Google con una sesión HTTP reutilizada y los
+    guarda el tiempo que indica Cache-Control (max-age menos Age). Si la descarga
+    falla y hay certificados anteriores, se siguen usando.
+    """
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, timeout: float = 5):
+        self.url = url
+        self.timeout = timeout
+        self.sesion = requests.Session()
+        self._certificados = None
+        self._expira = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _vigencia(cabeceras) -> int:
+        max_age = re.search(r"max-age=(\d+)", cabeceras.get("Cache-Control", ""))
+        if not max_age:
+            return CERTS_TTL_POR_DEFECTO
+        return max(int(max_age.group(1)) - int(cabeceras.get("Age", 0) or 0), 0)
+
+    def obtener(self) -> dict:
+        if self._certificados is not None and time.monotonic() < self._expira:
+            return self._certificados
+        with self._lock:
+            # Otro hilo pudo renovarlos mientras se esperaba el lock
+            if self._certificados is not None and time.monotonic() < self._expira:
+                return self._certificados
+            try:
+                respuesta = self.sesion.get(self.url, timeout=self.timeout)
+                respuesta.raise_for_status()
+            except requests.RequestException:
+                if self._certificados is not None:
+                    return self._certificados
+                raise
+            self._certificados = respuesta.json()
+            self._expira = time.monotonic() + self._vigencia(respuesta.headers)
+            return self._certificados
+
+
+proveedor_certificados: ProveedorCertificados = CertificadosGoogle()
+
+
+def configurar_proveedor_certificados(proveedor: ProveedorCertificados):
+    """Reemplaza el origen de los certificados (p. ej. CertificadosLocales en pruebas)."""
+    global proveedor_certificados
+    proveedor_certificados = proveedor
+
+
 def verify_google_token(token: str):
     """Verifica el token de Google y devuelve datos del usuario"""
     try:
-        idinfo = id_token.verify_oauth2_token(
-            token,
-            requests.Request(),
-            GOOGLE_CLIENT_ID
-        )
+        try:
+            certificados = proveedor_certificados.obtener()
+        except requests.RequestException:
+            raise HTTPException(503, "No se pudieron obtener los certificados de Google")
+
+        idinfo = google_jwt.decode(token, certs=certificados, audience=GOOGLE_CLIENT_ID)
+        if idinfo.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Emisor no válido: {idinfo.get('iss')}")
 
         # Validación adicional (opcional)
         if not idinfo.get("email_verified", False):
@@ -44,3 +127,31 @@ def create_jwt_token(email: str):
         "exp": expires
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+
+# Tokens ya decodificados: evita repetir la verificación HMAC en cada petición
+_tokens_decodificados = CacheLRU(max_entradas=1024, ttl=300)
+_esquema_bearer = HTTPBearer(auto_error=False)
+
+
+def decode_jwt_token(token: str) -> dict:
+    """Valida un JWT propio (firma y expiración) y devuelve su payload"""
+    payload = _tokens_decodificados.obtener(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError as e:
+            raise HTTPException(401, f"Token inválido: {str(e)}")
+        _tokens_decodificados.guardar(token, payload)
+    # La caché no debe alargar la vida de un token vencido
+    if payload.get("exp") is not None and payload["exp"] <= time.time():
+        _tokens_decodificados.invalidar(token)
+        raise HTTPException(401, "Token expirado")
+    return payload
+
+
+async def obtener_usuario_actual(credenciales: HTTPAuthorizationCredentials = Depends(_esquema_bearer)) -> str:
+    """Dependencia de FastAPI: email del usuario autenticado con nuestro JWT"""
+    if credenciales is None:
+        raise HTTPException(401, "No autenticado", headers={"WWW-Authenticate": "Bearer"})
+    return decode_jwt_token(credenciales.credentials)["sub"]
@@ -0,0 +1,101 @@
+# utils/cache.py
+
+# Caché en memoria del proceso, acotada en tamaño (LRU) y con expiración.
+# Cada worker tiene la suya: la invalidación es local y el TTL limita cuánto
+# puede quedar desactualizado otro worker.
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+
+class CacheLRU:
+    def __init__(self, max_entradas: int = 256, ttl: float | None = None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        """Devuelve el valor guardado o None si no existe o ya expiró."""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira is not None and expira < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor):
+        expira = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            # Expulsa las entradas menos usadas recientemente
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, *claves):
+        with self._lock:
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class BloqueosPorClave:
+    """
+    Un asyncio.Lock por clave mientras alguien lo usa: las peticiones concurrentes
+    que calculan lo mismo esperan a la primera en lugar de repetir el cálculo.
+    La entrada se descarta cuando nadie lo tiene ni lo espera.
+    """
+
+    def __init__(self):
+        self._bloqueos = {}
+
+    @asynccontextmanager
+    async def bloquear(self, clave):
+        bloqueo, usuarios = self._bloqueos.get(clave, (None, 0))
+        if bloqueo is None:
+            bloqueo = asyncio.Lock()
+        self._bloqueos[clave] = (bloqueo, usuarios + 1)
+        try:
+            async with bloqueo:
+                yield
+        finally:
+            bloqueo, usuarios = self._bloqueos[clave]
+            if usuarios == 1:
+                del self._bloqueos[clave]
+            else:
+                self._bloqueos[clave] = (bloqueo, usuarios - 1)
+
+    def __len__(self):
+        return len(self._bloqueos)
+
+
+# Definiciones de cuestionarios ya serializadas: clave -> (etag, cuerpo JSON)
+cache_cuestionarios = CacheLRU(
+    max_entradas=int(os.getenv("CACHE_CUESTIONARIOS_MAX", "512")),
+    ttl=float(os.getenv("CACHE_CUESTIONARIOS_TTL", "300")),
+)
+
+CLAVE_LISTA_CUESTIONARIOS = "lista"
+
+
+def invalidar_cuestionario(test_id=None):
+    """Invalida el listado y, si se indica, la definición de un cuestionario."""
+    claves = [CLAVE_LISTA_CUESTIONARIOS]
+    if test_id is not None:
+        claves.append(str(test_id))
+    cache_cuestionarios.invalidar(*claves)
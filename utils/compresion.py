@@ -0,0 +1,131 @@
+# utils/compresion.py
+
+# Compresión de respuestas negociada con Accept-Encoding: brotli si el cliente lo
+# acepta y el paquete está instalado, si no gzip. Solo se comprimen cuerpos JSON o
+# de texto a partir de un tamaño mínimo; los pequeños no compensan la CPU.
+# Middleware ASGI puro (como MiddlewareMetricas): las respuestas en streaming pasan
+# sin comprimir para no retenerlas en memoria.
+
+import gzip
+import os
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # Sin brotli solo se ofrece gzip
+    brotli = None
+
+MINIMO_BYTES = int(os.getenv("COMPRESION_MINIMO", "1024"))
+NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+# Calidades bajas de brotli comprimen más que gzip 6 con una CPU parecida
+CALIDAD_BROTLI = int(os.getenv("COMPRESION_CALIDAD_BROTLI", "4"))
+# Cuerpos a partir de este tamaño se comprimen fuera del event loop
+MINIMO_HILO = 256 * 1024
+
+TIPOS_COMPRIMIBLES = ("application/json", "text/")
+
+
+def _comprimir_gzip(cuerpo: bytes) -> bytes:
+    return gzip.compress(cuerpo, compresslevel=NIVEL_GZIP, mtime=0)
+
+
+def _comprimir_brotli(cuerpo: bytes) -> bytes:
+    return brotli.compress(cuerpo, quality=CALIDAD_BROTLI)
+
+
+CODIFICACIONES = {"gzip": _comprimir_gzip}
+if brotli is not None:
+    CODIFICACIONES = {"br": _comprimir_brotli, **CODIFICACIONES}
+
+
+def elegir_codificacion(accept_encoding: str) -> str | None:
+    """Codificación disponible con mayor q en Accept-Encoding (br antes que gzip si empatan)."""
+    aceptadas = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.partition(";")
+        calidad = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        aceptadas[nombre.strip().lower()] = calidad
+
+    mejor, mejor_calidad = None, 0.0
+    for codificacion in CODIFICACIONES:
+        calidad = aceptadas.get(codificacion, aceptadas.get("*", 0.0))
+        if calidad > mejor_calidad:
+            mejor, mejor_calidad = codificacion, calidad
+    return mejor
+
+
+class MiddlewareCompresion:
+    def __init__(self, app, minimo: int = MINIMO_BYTES):
+        self.app = app
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codificacion = elegir_codificacion(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+        partes = []
+        en_streaming = False
+
+        async def enviar(mensaje):
+            nonlocal inicio, en_streaming
+            if mensaje["type"] == "http.response.start":
+                headers = Headers(raw=mensaje["headers"])
+                comprimible = (
+                    "content-encoding" not in headers
+                    and headers.get("content-type", "").startswith(TIPOS_COMPRIMIBLES)
+                )
+                if not comprimible:
+                    en_streaming = True
+                    await send(mensaje)
+                    return
+                inicio = mensaje
+                return
+            if mensaje["type"] != "http.response.body" or en_streaming:
+                await send(mensaje)
+                return
+
+            partes.append(mensaje.get("body", b""))
+            if mensaje.get("more_body", False):
+                if len(partes) == 1:
+                    return
+                # Varias partes: es streaming, se envía tal cual
+                en_streaming = True
+                await send(inicio)
+                for parte in partes[:-1]:
+                    await send({"type": "http.response.body", "body": parte, "more_body": True})
+                await send(mensaje)
+                return
+
+            cuerpo = b"".join(partes)
+            headers = MutableHeaders(raw=inicio["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(cuerpo) >= self.minimo:
+                comprimir = CODIFICACIONES[codificacion]
+                if len(cuerpo) >= MINIMO_HILO:
+                    cuerpo = await run_in_threadpool(comprimir, cuerpo)
+                else:
+                    cuerpo = comprimir(cuerpo)
+                headers["Content-Encoding"] = codificacion
+                headers["Content-Length"] = str(len(cuerpo))
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # El cuerpo comprimido ya no es idéntico byte a byte al del ETag fuerte
+                    headers["ETag"] = "W/" + etag
+            await send(inicio)
+            await send({"type": "http.response.body", "body": cuerpo})
+
+        await self.app(scope, receive, enviar)
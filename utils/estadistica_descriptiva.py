@@ -0,0 +1,159 @@
+# utils/estadistica_descriptiva.py
+
+# Estadística descriptiva por dimensión en una sola pasada y con memoria acotada.
+# El Acumulador guarda conteo, suma, suma de cuadrados e histograma de valores:
+# se alimenta con (valor, n) sin guardar las respuestas y dos acumuladores se
+# combinan sumando. Como las respuestas son enteros y Python no desborda, la
+# varianza sale exacta de estos momentos (sin la cancelación que obliga a usar
+# Welford con flotantes). Los percentiles se leen del histograma y el intervalo
+# de confianza del promedio usa la t de Student.
+
+from functools import lru_cache
+from math import atan, cos, pi, sin, sqrt
+from statistics import NormalDist
+
+from models.AgregadoDimension import VALORES_ESCALA
+
+PERCENTILES = (25, 50, 75)
+CONFIANZA = 0.95
+
+# Grados de libertad hasta los que se invierte la t de Student exacta;
+# por encima se usa la expansión de Cornish-Fisher
+_MAX_GL_EXACTO = 100
+
+
+class Acumulador:
+    __slots__ = ("conteo", "suma", "suma_cuadrados", "histograma")
+
+    def __init__(self):
+        self.conteo = 0
+        self.suma = 0
+        self.suma_cuadrados = 0
+        self.histograma = {}
+
+    @classmethod
+    def desde_agregado(cls, agregado) -> "Acumulador":
+        """Acumulador a partir de una fila de agregados (AgregadoDimension o AgregadoTendencia)."""
+        acumulador = cls()
+        acumulador.conteo = agregado.conteo
+        acumulador.suma = agregado.suma
+        acumulador.suma_cuadrados = agregado.suma_cuadrados
+        acumulador.histograma = {
+            v: getattr(agregado, f"frecuencia_{v}") for v in VALORES_ESCALA
+            if getattr(agregado, f"frecuencia_{v}")
+        }
+        if sum(acumulador.histograma.values()) != acumulador.conteo:
+            # Datos antiguos con valores fuera de escala: conteo y sumas los incluyen
+            # pero el histograma no; se recalculan para que n, media e IC cuadren
+            # con los percentiles.
+            acumulador.conteo = sum(acumulador.histograma.values())
+            acumulador.suma = sum(v * n for v, n in acumulador.histograma.items())
+            acumulador.suma_cuadrados = sum(v * v * n for v, n in acumulador.histograma.items())
+        return acumulador
+
+    def agregar(self, valor: int, n: int = 1):
+        self.conteo += n
+        self.suma += valor * n
+        self.suma_cuadrados += valor * valor * n
+        self.histograma[valor] = self.histograma.get(valor, 0) + n
+
+    def combinar(self, otro: "Acumulador"):
+        self.conteo += otro.conteo
+        self.suma += otro.suma
+        self.suma_cuadrados += otro.suma_cuadrados
+        for valor, n in otro.histograma.items():
+            self.histograma[valor] = self.histograma.get(valor, 0) + n
+
+    @property
+    def promedio(self) -> float | None:
+        return self.suma / self.conteo if self.conteo else None
+
+    @property
+    def varianza(self) -> float | None:
+        """Varianza muestral (n - 1)."""
+        if self.conteo < 2:
+            return None
+        # n·Σx² − (Σx)² es entero y exacto
+        return (self.conteo * self.suma_cuadrados - self.suma ** 2) / (self.conteo * (self.conteo - 1))
+
+    def percentil(self, p: float):
+        """Menor valor cuyo acumulado alcanza el p% de las respuestas (rango más cercano)."""
+        if not self.histograma:
+            return None
+        objetivo = p / 100 * sum(self.histograma.values())
+        acumulado = 0
+        for valor in sorted(self.histograma):
+            acumulado += self.histograma[valor]
+            if acumulado >= objetivo:
+                return valor
+        return valor
+
+    def describir(self, confianza: float = CONFIANZA) -> dict:
+        varianza = self.varianza
+        resultado = {
+            "conteo": self.conteo,
+            "promedio": _redondear(self.promedio),
+            "varianza": _redondear(varianza),
+            "desviacion": None,
+            "error_estandar": None,
+            "intervalo_confianza": None,
+            "minimo": min(self.histograma, default=None),
+            "maximo": max(self.histograma, default=None),
+            "percentiles": {f"p{p}": self.percentil(p) for p in PERCENTILES},
+        }
+        if varianza is not None:
+            error = sqrt(varianza / self.conteo)
+            margen = valor_critico_t(self.conteo - 1, confianza) * error
+            resultado.update(
+                desviacion=_redondear(sqrt(varianza)),
+                error_estandar=_redondear(error),
+                intervalo_confianza={
+                    "nivel": confianza,
+                    "inferior": _redondear(self.promedio - margen),
+                    "superior": _redondear(self.promedio + margen),
+                },
+            )
+        return resultado
+
+
+def _redondear(valor):
+    return round(valor, 4) if valor is not None else None
+
+
+def _probabilidad_central_t(t: float, gl: int) -> float:
+    """P(|T| < t) para la t de Student con gl entero (Abramowitz y Stegun 26.7.3-4)."""
+    theta = atan(t / sqrt(gl))
+    c = cos(theta)
+    serie = 0.0
+    if gl % 2:
+        termino = c
+        for j in range(1, (gl - 1) // 2 + 1):
+            serie += termino
+            termino *= c * c * (2 * j) / (2 * j + 1)
+        return 2 / pi * (theta + sin(theta) * serie)
+    termino = 1.0
+    for j in range(1, gl // 2 + 1):
+        serie += termino
+        termino *= c * c * (2 * j - 1) / (2 * j)
+    return sin(theta) * serie
+
+
+@lru_cache(maxsize=1024)
+def valor_critico_t(gl: int, confianza: float = CONFIANZA) -> float:
+    """Valor t tal que P(|T| < t) = confianza con gl grados de libertad."""
+    if not 0 < confianza < 1:
+        raise ValueError(f"Nivel de confianza no válido: {confianza}")
+    z = NormalDist().inv_cdf((1 + confianza) / 2)
+    if gl > _MAX_GL_EXACTO:
+        return z + (z ** 3 + z) / (4 * gl) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * gl ** 2)
+
+    bajo, alto = 0.0, z
+    while _probabilidad_central_t(alto, gl) < confianza:
+        bajo, alto = alto, alto * 2
+    for _ in range(60):
+        medio = (bajo + alto) / 2
+        if _probabilidad_central_t(medio, gl) < confianza:
+            bajo = medio
+        else:
+            alto = medio
+    return (bajo + alto) / 2
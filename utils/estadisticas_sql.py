@@ -0,0 +1,185 @@
+# utils/estadisticas_sql.py
+
+# Capa de consultas para las estadísticas: desanida el JSON de `respuestas`
+# y agrupa por dimensión y valor dentro de la base de datos, de modo que solo
+# viajan los conteos finales en lugar de cada documento JSON.
+# En PostgreSQL usa jsonb_array_elements; en SQLite (pruebas locales) json_each.
+# Los campos demográficos promovidos se leen de sus columnas generadas e indexadas.
+
+import json
+from datetime import timedelta
+
+from sqlalchemy import bindparam, column, func, select, text
+
+from models.Respuestas import Respuesta, CAMPOS_PROMOVIDOS
+from models.TrabajoPendiente import MAX_INTENTOS
+
+NO_ESPECIFICADO = "No especificado"
+
+# Ventana antes de la respuesta más reciente en la que todavía puede confirmarse
+# una transacción iniciada antes (el mismo margen de informes y snapshots)
+MARGEN_CONFIRMACION = timedelta(minutes=5)
+
+# Fragmentos SQL por dialecto para recorrer respuestas -> dimensiones -> valores
+_FUENTES = {
+    "postgresql": {
+        "desanidar": (
+            "CROSS JOIN LATERAL jsonb_array_elements(r.respuestas) AS d(elem) "
+            "CROSS JOIN LATERAL jsonb_array_elements_text(d.elem -> 'respuestas') AS v(valor)"
+        ),
+        "dimension": "d.elem ->> 'dimension'",
+        "valor": "CAST(v.valor AS INTEGER)",
+        "campo": "r.caracterizacion_datos ->> :{param}",
+        # Contención: usa el índice GIN de caracterizacion_datos
+        "filtro": "r.caracterizacion_datos @> CAST(:{param} AS jsonb)",
+    },
+    "sqlite": {
+        "desanidar": (
+            ", json_each(r.respuestas) AS d"
+            ", json_each(d.value, '$.respuestas') AS v"
+        ),
+        "dimension": "json_extract(d.value, '$.dimension')",
+        "valor": "CAST(v.value AS INTEGER)",
+        "campo": "json_extract(r.caracterizacion_datos, :{param})",
+        "filtro": "json_extract(r.caracterizacion_datos, :{param}) = :{param}_valor",
+    },
+}
+
+
+def _fuente(db) -> dict:
+    dialecto = db.get_bind().dialect.name
+    if dialecto not in _FUENTES:
+        raise NotImplementedError(f"Dialecto no soportado para estadísticas: {dialecto}")
+    return _FUENTES[dialecto]
+
+
+def _valor_campo(db, campo: str) -> str:
+    """Parámetro con el que cada dialecto busca una clave de caracterizacion_datos."""
+    if db.get_bind().dialect.name == "sqlite":
+        return '$."' + campo.replace('"', '') + '"'
+    return campo
+
+
+def _columna(db, fuente: dict, campo: str, param: str, params: dict) -> str:
+    """Expresión SQL de un campo: su columna generada si está promovida, o el JSON."""
+    if campo in CAMPOS_PROMOVIDOS:
+        return f"r.{campo}"
+    params[param] = _valor_campo(db, campo)
+    return fuente["campo"].format(param=param)
+
+
+def _condiciones(db, fuente: dict, test_id, filtros: dict | None, params: dict) -> str:
+    condiciones = []
+    if test_id is not None:
+        condiciones.append("r.test_id = :test_id")
+        params["test_id"] = test_id
+    for i, (campo, valor) in enumerate((filtros or {}).items()):
+        param = f"filtro_{i}"
+        if campo in CAMPOS_PROMOVIDOS:
+            condiciones.append(f"r.{campo} = :{param}")
+            params[param] = valor
+        elif db.get_bind().dialect.name == "postgresql":
+            condiciones.append(fuente["filtro"].format(param=param))
+            params[param] = json.dumps({campo: valor})
+        else:
+            condiciones.append(fuente["filtro"].format(param=param))
+            params[param] = _valor_campo(db, campo)
+            params[f"{param}_valor"] = valor
+    return ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+
+
+async def _ejecutar(db, sql: str, params: dict, por_test: bool = False, por_fecha: bool = False):
+    tipo_test_id = Respuesta.__table__.c.test_id.type
+    stmt = text(sql)
+    if "test_id" in params:
+        stmt = stmt.bindparams(bindparam("test_id", type_=tipo_test_id))
+    tipadas = []
+    if por_test:
+        # Convierte la columna test_id del resultado a UUID en cualquier dialecto
+        tipadas.append(column("test_id", tipo_test_id))
+    if por_fecha:
+        # En SQLite la fecha llega como texto
+        tipadas.append(column("fecha", Respuesta.__table__.c.fecha.type))
+    if tipadas:
+        stmt = stmt.columns(*tipadas)
+    return (await db.execute(stmt, params)).all()
+
+
+async def contar_valores(
+    db, test_id=None, campos: tuple = (), filtros: dict | None = None,
+    por_test: bool = False, por_fecha: bool = False, sin_pendientes: bool = False,
+):
+    """
+    Cuenta cuántas veces aparece cada valor por dimensión, agrupando además por
+    los campos de caracterizacion_datos indicados (y por test y fecha si se pide).
+    Con sin_pendientes omite las respuestas cuyo trabajo (utils/trabajos.py) aún
+    no se aplicó a los acumulados. Devuelve filas (test_id?, fecha?, *campos, dimension, valor, n).
+    """
+    fuente = _fuente(db)
+    params = {"defecto": NO_ESPECIFICADO}
+    columnas = ["r.test_id AS test_id"] if por_test else []
+    if por_fecha:
+        columnas.append("r.fecha AS fecha")
+    for i, campo in enumerate(campos):
+        columnas.append(f"COALESCE({_columna(db, fuente, campo, f'campo_{i}', params)}, :defecto)")
+    columnas += [fuente["dimension"], fuente["valor"]]
+
+    where = _condiciones(db, fuente, test_id, filtros, params)
+    if sin_pendientes:
+        where += (" AND " if where else "WHERE ") + (
+            "NOT EXISTS (SELECT 1 FROM trabajos_pendientes t "
+            "WHERE t.respuesta_id = r.id AND t.intentos < :max_intentos)"
+        )
+        params["max_intentos"] = MAX_INTENTOS
+    grupos = ", ".join(str(i) for i in range(1, len(columnas) + 1))
+    sql = (
+        f"SELECT {', '.join(columnas)}, COUNT(*) "
+        f"FROM respuestas r {fuente['desanidar']} {where} "
+        f"GROUP BY {grupos}"
+    )
+    return await _ejecutar(db, sql, params, por_test, por_fecha)
+
+
+async def contar_respuestas(db, test_id, campos: tuple, filtros: dict | None = None):
+    """
+    Número de respuestas por combinación de valores de los campos de
+    caracterizacion_datos indicados. Devuelve filas (*campos, n).
+    """
+    fuente = _fuente(db)
+    params = {"defecto": NO_ESPECIFICADO}
+    columnas = []
+    for i, campo in enumerate(campos):
+        columnas.append(f"COALESCE({_columna(db, fuente, campo, f'campo_{i}', params)}, :defecto)")
+    where = _condiciones(db, fuente, test_id, filtros, params)
+    grupos = ", ".join(str(i) for i in range(1, len(columnas) + 1))
+    sql = (
+        f"SELECT {''.join(c + ', ' for c in columnas)}COUNT(*) "
+        f"FROM respuestas r {where}" + (f" GROUP BY {grupos}" if columnas else "")
+    )
+    return await _ejecutar(db, sql, params)
+
+
+async def ultima_respuesta(db, test_id=None):
+    """Fecha de guardado de la respuesta más reciente (usa el índice (test_id, creado_en))."""
+    consulta = select(func.max(Respuesta.creado_en))
+    if test_id is not None:
+        consulta = consulta.where(Respuesta.test_id == test_id)
+    return await db.scalar(consulta)
+
+
+async def version_respuestas(db, test_id=None) -> tuple:
+    """
+    Versión de las respuestas para invalidar cachés: la fecha de la más reciente y
+    cuántas se guardaron en los MARGEN_CONFIRMACION anteriores. Una respuesta que se
+    confirma tarde con un creado_en anterior no cambia el máximo, pero cae en esa
+    ventana y cambia el conteo. Ambas consultas recorren el índice (test_id, creado_en).
+    """
+    ultima = await ultima_respuesta(db, test_id)
+    if ultima is None:
+        return (None, 0)
+    consulta = select(func.count()).select_from(Respuesta).where(
+        Respuesta.creado_en >= ultima - MARGEN_CONFIRMACION
+    )
+    if test_id is not None:
+        consulta = consulta.where(Respuesta.test_id == test_id)
+    return (ultima, await db.scalar(consulta))
@@ -0,0 +1,130 @@
+# utils/informes.py
+
+# Informes materializados por test en la tabla estadisticas: el resumen completo
+# del tablero (todas las facetas, con descriptivas) se guarda como JSON junto con
+# la marca de agua (creado_en de la última respuesta incluida), y las respuestas
+# que lo componen quedan vinculadas en test_estadistica. Cada regeneración solo
+# vincula las respuestas posteriores a la marca anterior.
+# Los lectores reciben el informe guardado; con max_age se regenera únicamente si
+# es más antiguo que eso y además llegaron respuestas nuevas.
+
+import uuid
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, or_, select
+
+from database import insert_dialecto
+from models.Estadisticas import Estadisticas
+from models.Respuestas import Respuesta
+from models.TestEstadistica import TestEstadistica
+from utils.cache import BloqueosPorClave
+from utils.estadisticas_sql import ultima_respuesta
+from utils.tabla_cruzada import FACETAS, resumen_por_facetas
+
+# Igual que en los snapshots: se vuelve a revisar esta ventana antes de la marca
+# por si una transacción iniciada antes se confirmó después (los vínculos repetidos se ignoran)
+MARGEN_VINCULOS = timedelta(minutes=5)
+LOTE_VINCULOS = 5000
+
+# Una regeneración a la vez por test dentro del worker; el bloqueo de cada
+# test se descarta al terminar, así no queda uno por cada test consultado
+_regeneraciones = BloqueosPorClave()
+
+
+def _texto_resumen(datos: dict) -> str:
+    return f"{datos['total_respuestas']} respuestas, {len(datos['promedios'])} dimensiones"
+
+
+async def _vincular(db, informe_id, test_id, desde: datetime | None, hasta: datetime) -> int:
+    """Vincula al informe las respuestas del test con creado_en en (desde, hasta], por lotes."""
+    insert = insert_dialecto(db)
+    stmt = insert(TestEstadistica).on_conflict_do_nothing(
+        index_elements=[TestEstadistica.estadisticaId, TestEstadistica.respuestaId]
+    )
+    hoy = date.today()
+    vinculadas = 0
+    ultima = None
+    while True:
+        # Paginación por (creado_en, id) sobre el índice (test_id, creado_en)
+        query = select(Respuesta.creado_en, Respuesta.id).where(
+            Respuesta.test_id == test_id, Respuesta.creado_en <= hasta
+        )
+        if desde is not None:
+            query = query.where(Respuesta.creado_en > desde)
+        if ultima is not None:
+            query = query.where(or_(
+                Respuesta.creado_en > ultima[0],
+                and_(Respuesta.creado_en == ultima[0], Respuesta.id > ultima[1]),
+            ))
+        filas = (await db.execute(
+            query.order_by(Respuesta.creado_en, Respuesta.id).limit(LOTE_VINCULOS)
+        )).all()
+        if not filas:
+            return vinculadas
+        await db.execute(stmt, [
+            {"id": uuid.uuid4(), "respuestaId": f.id, "estadisticaId": informe_id, "fechaGeneracion": hoy}
+            for f in filas
+        ])
+        vinculadas += len(filas)
+        ultima = filas[-1]
+
+
+async def generar_informe(db, test_id) -> Estadisticas | None:
+    """
+    Calcula el informe del test, lo guarda (uno por test) y vincula las respuestas
+    nuevas. Devuelve None si el test no tiene respuestas. Hace commit.
+    """
+    # La marca se lee antes de calcular: el informe incluye al menos todo lo anterior a ella
+    marca = await ultima_respuesta(db, test_id)
+    if marca is None:
+        return None
+    datos = await resumen_por_facetas(db, test_id, list(FACETAS), desde_acumulado=False)
+    anterior = await db.scalar(select(Estadisticas.marca_agua).where(Estadisticas.test_id == test_id))
+
+    insert = insert_dialecto(db)
+    stmt = insert(Estadisticas).values(
+        id=uuid.uuid4(), test_id=test_id, resumen=_texto_resumen(datos), datos=datos,
+        fecha_generacion=datetime.utcnow(), marca_agua=marca,
+    )
+    tabla = Estadisticas.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabla.c.test_id],
+        set_={c: stmt.excluded[c] for c in ("resumen", "datos", "fecha_generacion", "marca_agua")},
+        # Una generación más lenta con una marca anterior no pisa a la más reciente
+        where=or_(tabla.c.marca_agua.is_(None), tabla.c.marca_agua <= stmt.excluded.marca_agua),
+    )
+    await db.execute(stmt)
+    informe_id = await db.scalar(select(Estadisticas.id).where(Estadisticas.test_id == test_id))
+
+    desde = anterior - MARGEN_VINCULOS if anterior is not None else None
+    await _vincular(db, informe_id, test_id, desde, marca)
+    await db.commit()
+    return await _leer(db, test_id)
+
+
+async def _leer(db, test_id) -> Estadisticas | None:
+    return await db.scalar(
+        select(Estadisticas).where(Estadisticas.test_id == test_id)
+        .execution_options(populate_existing=True)
+    )
+
+
+async def _vencido(db, informe: Estadisticas, max_age: timedelta | None) -> bool:
+    if max_age is None or datetime.utcnow() - informe.fecha_generacion <= max_age:
+        return False
+    # Más antiguo que max_age, pero solo se regenera si hay respuestas posteriores
+    ultima = await ultima_respuesta(db, informe.test_id)
+    return ultima is not None and (informe.marca_agua is None or ultima > informe.marca_agua)
+
+
+async def obtener_informe(db, test_id, max_age: timedelta | None = None) -> Estadisticas | None:
+    """Informe guardado del test; lo genera si no existe o si está vencido según max_age."""
+    informe = await _leer(db, test_id)
+    if informe is not None and not await _vencido(db, informe, max_age):
+        return informe
+    async with _regeneraciones.bloquear(test_id):
+        # Otra petición pudo regenerarlo mientras se esperaba el bloqueo
+        informe = await _leer(db, test_id)
+        if informe is not None and not await _vencido(db, informe, max_age):
+            return informe
+        return await generar_informe(db, test_id)
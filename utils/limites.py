@@ -0,0 +1,210 @@
+# utils/limites.py
+
+# Control de admisión del envío de respuestas:
+#   - token bucket por IP del cliente y por fingerprint: cada clave tiene una
+#     capacidad (ráfaga) que se recarga a ritmo constante
+#   - límite global de envíos concurrentes por worker, por debajo del tamaño del
+#     pool, para que un pico de envíos no deje sin conexiones al tablero
+# Lo que excede se rechaza de inmediato con 429 y Retry-After en lugar de hacer
+# cola: bajo sobrecarga la API sigue respondiendo rápido.
+#
+# Los buckets se guardan en memoria del worker (cada worker limita por separado).
+# Para compartirlos entre workers o réplicas se configura otro almacén, p. ej.
+# AlmacenRedis con LIMITES_REDIS_URL.
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from fastapi import HTTPException, Request, status
+
+from database import ES_SQLITE, MODO_PGBOUNCER, TAMANOS_POOL
+from utils.metricas import rechazos_limite
+
+logger = logging.getLogger(__name__)
+
+
+def _recarga(variable: str, defecto: str) -> float:
+    # Sin recarga un bucket vacío no se recupera nunca (y la espera sería infinita)
+    recarga = float(os.getenv(variable, defecto))
+    if recarga <= 0:
+        raise RuntimeError(f"{variable} debe ser mayor que 0 (tokens por segundo), no {recarga}")
+    return recarga
+
+
+# Ráfaga y recarga (tokens por segundo); por IP es holgado porque un campus o
+# una oficina comparten la misma IP pública
+CAPACIDAD_IP = float(os.getenv("LIMITE_IP_CAPACIDAD", "60"))
+RECARGA_IP = _recarga("LIMITE_IP_RECARGA", "2")
+CAPACIDAD_FINGERPRINT = float(os.getenv("LIMITE_FINGERPRINT_CAPACIDAD", "5"))
+RECARGA_FINGERPRINT = _recarga("LIMITE_FINGERPRINT_RECARGA", "0.1")
+
+# Envíos simultáneos por worker y cuánto se espera un cupo antes de rechazar.
+# Por defecto dos tercios del pool de escritura del worker (el resto queda para
+# los trabajos en segundo plano); con PgBouncer la cola la hace el proxy
+def _cupo_por_defecto() -> int:
+    if MODO_PGBOUNCER or ES_SQLITE:
+        return 20
+    fijo, desborde = TAMANOS_POOL["escritura"]
+    return max(1, (fijo + desborde) * 2 // 3)
+
+
+ENVIOS_CONCURRENTES = int(os.getenv("ENVIOS_CONCURRENTES_MAX") or _cupo_por_defecto())
+ESPERA_CUPO = float(os.getenv("ENVIOS_ESPERA_CUPO", "0.1"))
+
+# Proxies de confianza delante de la API (Railway: 1); la IP del cliente es la
+# que agregó el último de ellos en X-Forwarded-For
+PROXIES_CONFIABLES = int(os.getenv("PROXIES_CONFIABLES", "0"))
+
+MAX_CLAVES_MEMORIA = 100_000
+# Tope del Retry-After (segundos) aunque la espera calculada sea mayor o infinita
+MAX_REINTENTO = 3600
+
+
+class AlmacenLimites(Protocol):
+    async def consumir(self, clave: str, capacidad: float, recarga: float, costo: float = 1) -> float:
+        """Descuenta `costo` tokens del bucket. Devuelve 0 si se admitió o los segundos a esperar."""
+
+
+class AlmacenMemoria:
+    """Buckets en memoria del worker, acotados: se descartan los menos usados."""
+
+    def __init__(self, max_claves: int = MAX_CLAVES_MEMORIA):
+        self.max_claves = max_claves
+        self._buckets = OrderedDict()
+
+    async def consumir(self, clave: str, capacidad: float, recarga: float, costo: float = 1) -> float:
+        # Sin await en medio: es atómico dentro del event loop
+        ahora = time.monotonic()
+        tokens, actualizado = self._buckets.pop(clave, (capacidad, ahora))
+        tokens = min(capacidad, tokens + (ahora - actualizado) * recarga)
+        espera = 0.0
+        if tokens >= costo:
+            tokens -= costo
+        else:
+            espera = (costo - tokens) / recarga if recarga > 0 else math.inf
+        self._buckets[clave] = (tokens, ahora)
+        while len(self._buckets) > self.max_claves:
+            self._buckets.popitem(last=False)
+        return espera
+
+
+class AlmacenRedis:
+    """
+    Buckets compartidos en Redis (requiere el paquete redis). El cálculo se hace
+    en un script Lua para que leer y descontar sea atómico entre workers.
+    """
+
+    _SCRIPT = """
+    local capacidad = tonumber(ARGV[1])
+    local recarga = tonumber(ARGV[2])
+    local costo = tonumber(ARGV[3])
+    local t = redis.call('TIME')
+    local ahora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'actualizado')
+    local tokens = tonumber(bucket[1]) or capacidad
+    local actualizado = tonumber(bucket[2]) or ahora
+    tokens = math.min(capacidad, tokens + (ahora - actualizado) * recarga)
+    local espera = 0
+    if tokens >= costo then
+        tokens = tokens - costo
+    else
+        espera = (costo - tokens) / recarga
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'actualizado', ahora)
+    if recarga > 0 then
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacidad / recarga) + 1)
+    end
+    return tostring(espera)
+    """
+
+    def __init__(self, url: str, prefijo: str = "gesex:limite:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError(
+                "LIMITES_REDIS_URL está configurada pero el paquete redis no está instalado "
+                "(pip install redis, ver requirements.txt); sin ella los límites se guardan en memoria"
+            ) from None
+        self.prefijo = prefijo
+        self._cliente = redis.from_url(url)
+        self._script = self._cliente.register_script(self._SCRIPT)
+
+    async def consumir(self, clave: str, capacidad: float, recarga: float, costo: float = 1) -> float:
+        return float(await self._script(keys=[self.prefijo + clave], args=[capacidad, recarga, costo]))
+
+
+almacen: AlmacenLimites = (
+    AlmacenRedis(os.environ["LIMITES_REDIS_URL"]) if os.getenv("LIMITES_REDIS_URL") else AlmacenMemoria()
+)
+
+
+def configurar_almacen(nuevo: AlmacenLimites):
+    """Reemplaza el almacén de los buckets (compartido entre workers, o uno nuevo en pruebas)."""
+    global almacen
+    almacen = nuevo
+
+
+def _rechazar(motivo: str, espera: float):
+    rechazos_limite.incrementar(motivo)
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Demasiadas solicitudes, intenta nuevamente en unos segundos.",
+        headers={"Retry-After": str(max(1, math.ceil(min(espera, MAX_REINTENTO))))},
+    )
+
+
+def ip_cliente(request: Request) -> str:
+    if PROXIES_CONFIABLES:
+        reenviadas = [ip.strip() for ip in request.headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+        if len(reenviadas) >= PROXIES_CONFIABLES:
+            return reenviadas[-PROXIES_CONFIABLES]
+    return request.client.host if request.client else "desconocida"
+
+
+async def _consumir(clave: str, capacidad: float, recarga: float, costo: float = 1) -> float:
+    try:
+        return await almacen.consumir(clave, capacidad, recarga, costo)
+    except Exception:
+        # Si el almacén compartido falla se admite la petición: el límite de concurrencia sigue activo
+        logger.exception("Error en el almacén de límites")
+        return 0.0
+
+
+async def limitar_ip(request: Request):
+    """Dependencia: token bucket por IP del cliente."""
+    espera = await _consumir(f"ip:{ip_cliente(request)}", CAPACIDAD_IP, RECARGA_IP)
+    if espera:
+        _rechazar("ip", espera)
+
+
+async def limitar_fingerprint(fingerprint: str):
+    """Token bucket por fingerprint; se llama con el cuerpo ya validado."""
+    espera = await _consumir(f"fingerprint:{fingerprint}", CAPACIDAD_FINGERPRINT, RECARGA_FINGERPRINT)
+    if espera:
+        _rechazar("fingerprint", espera)
+
+
+class LimiteConcurrencia:
+    def __init__(self, maximo: int, espera: float):
+        self.maximo = maximo
+        self.espera = espera
+        self._semaforo = asyncio.Semaphore(maximo)
+
+    async def __call__(self):
+        """Dependencia con yield: ocupa un cupo mientras dura la petición."""
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), timeout=self.espera)
+        except asyncio.TimeoutError:
+            _rechazar("concurrencia", 1)
+        try:
+            yield
+        finally:
+            self._semaforo.release()
+
+
+cupo_envio = LimiteConcurrencia(ENVIOS_CONCURRENTES, ESPERA_CUPO)
@@ -0,0 +1,216 @@
+# utils/metricas.py
+
+# Métricas de la API en formato de texto de Prometheus (GET /metrics):
+#   - latencia y códigos de estado por ruta (middleware ASGI)
+#   - consultas SQL, tiempo en base de datos y filas devueltas atribuidas a cada
+#     petición (eventos del motor + contextvar)
+#   - espera para obtener una conexión del pool y ocupación del pool
+#   - peticiones rechazadas por los límites de admisión (utils/limites.py)
+#   - trabajos posteriores al envío que agotaron sus intentos (utils/trabajos.py)
+# Sin dependencias externas: contadores, indicadores e histogramas acumulados en memoria del worker.
+
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONTEO = (0, 1, 2, 5, 10, 20, 50, 100, 1000, 10000, 100000)
+
+
+def _etiquetas(nombres: tuple, valores: tuple) -> str:
+    if not nombres:
+        return ""
+    pares = []
+    for nombre, valor in zip(nombres, valores):
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self._valores = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores, cantidad: float = 1):
+        with self._lock:
+            self._valores[valores] += cantidad
+
+    def exponer(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            for valores, total in self._valores.items():
+                lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {total}")
+        return lineas
+
+
+class Indicador:
+    """Valor que sube y baja (gauge), fijado desde fuera en cada medición."""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def fijar(self, valor: float, *valores):
+        with self._lock:
+            self._valores[valores] = valor
+
+    def exponer(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} gauge"]
+        with self._lock:
+            for valores, valor in self._valores.items():
+                lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {valor}")
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), buckets: tuple = BUCKETS_SEGUNDOS):
+        self.nombre, self.ayuda, self.etiquetas, self.buckets = nombre, ayuda, etiquetas, buckets
+        # valores de etiquetas -> [conteos por bucket..., +Inf, suma]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *valores):
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [0] * (len(self.buckets) + 2)
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+            serie[-2] += 1
+            serie[-1] += valor
+
+    def exponer(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        nombres_bucket = self.etiquetas + ("le",)
+        with self._lock:
+            for valores, serie in self._series.items():
+                for limite, conteo in zip(self.buckets, serie):
+                    lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres_bucket, valores + (limite,))} {conteo}")
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres_bucket, valores + ('+Inf',))} {serie[-2]}")
+                lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {serie[-1]}")
+                lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {serie[-2]}")
+        return lineas
+
+
+peticiones_total = Contador("gesex_http_peticiones_total", "Peticiones HTTP por ruta y código de estado", ("metodo", "ruta", "estado"))
+duracion_peticion = Histograma("gesex_http_duracion_segundos", "Latencia de las peticiones HTTP por ruta", ("metodo", "ruta"))
+consultas_por_peticion = Histograma("gesex_db_consultas_por_peticion", "Consultas SQL ejecutadas por petición", ("metodo", "ruta"), BUCKETS_CONTEO)
+tiempo_db_por_peticion = Histograma("gesex_db_tiempo_por_peticion_segundos", "Tiempo total en la base de datos por petición", ("metodo", "ruta"))
+filas_por_peticion = Histograma("gesex_db_filas_por_peticion", "Filas devueltas por la base de datos por petición", ("metodo", "ruta"), BUCKETS_CONTEO)
+duracion_consulta = Histograma("gesex_db_consulta_duracion_segundos", "Duración de cada consulta SQL")
+espera_pool = Histograma("gesex_db_pool_espera_segundos", "Espera para obtener una conexión del pool")
+rechazos_limite = Contador("gesex_limites_rechazos_total", "Peticiones rechazadas con 429 por motivo (ip, fingerprint, concurrencia)", ("motivo",))
+trabajos_agotados = Contador("gesex_trabajos_agotados_total", "Trabajos pendientes que agotaron sus intentos en este worker")
+trabajos_muertos = Indicador("gesex_trabajos_muertos", "Trabajos en trabajos_pendientes sin más intentos (medido en cada barrido)")
+
+_METRICAS = [
+    peticiones_total, duracion_peticion, consultas_por_peticion, tiempo_db_por_peticion,
+    filas_por_peticion, duracion_consulta, espera_pool, rechazos_limite,
+    trabajos_agotados, trabajos_muertos,
+]
+
+# Acumulado SQL de la petición en curso; los eventos del motor lo actualizan
+_sql_peticion = contextvars.ContextVar("sql_peticion", default=None)
+
+
+class PoolMedido(AsyncAdaptedQueuePool):
+    """Pool asíncrono que registra cuánto se espera para obtener una conexión."""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            espera_pool.observar(time.perf_counter() - inicio)
+
+
+def instrumentar_motor(engine):
+    """Registra los eventos de consulta en un motor (síncrono o el sync_engine del asíncrono)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, sql, parametros, contexto, executemany):
+        conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, sql, parametros, contexto, executemany):
+        duracion = time.perf_counter() - conn.info["inicio_consulta"].pop()
+        duracion_consulta.observar(duracion)
+        acumulado = _sql_peticion.get()
+        if acumulado is not None:
+            # Los drivers asíncronos guardan en _rows el resultado ya leído
+            filas = getattr(cursor, "_rows", None)
+            acumulado["consultas"] += 1
+            acumulado["segundos"] += duracion
+            acumulado["filas"] += len(filas) if filas is not None else max(cursor.rowcount, 0)
+
+
+def _ocupacion_pool(motores: dict) -> list[str]:
+    nombre = "gesex_db_pool_conexiones"
+    lineas = [f"# HELP {nombre} Conexiones del pool por motor y estado", f"# TYPE {nombre} gauge"]
+    for motor, engine in motores.items():
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        estados = {
+            "en_uso": pool.checkedout(),
+            "libres": pool.checkedin(),
+            "desborde": max(pool.overflow(), 0),
+            "tamano": pool.size(),
+        }
+        for estado, valor in estados.items():
+            lineas.append(f'{nombre}{{motor="{motor}",estado="{estado}"}} {valor}')
+    return lineas
+
+
+def exponer(motores: dict | None = None) -> str:
+    """Texto de /metrics; `motores` es {nombre: engine síncrono} para la ocupación del pool."""
+    lineas = []
+    for metrica in _METRICAS:
+        lineas.extend(metrica.exponer())
+    if motores:
+        lineas.extend(_ocupacion_pool(motores))
+    return "\n".join(lineas) + "\n"
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI: latencia, estado y SQL por ruta (plantilla, no URL concreta)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        estado = 500
+        acumulado = {"consultas": 0, "segundos": 0.0, "filas": 0}
+        token = _sql_peticion.set(acumulado)
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            _sql_peticion.reset(token)
+            # Las rutas sin coincidencia se agrupan para no crear una serie por URL
+            ruta = getattr(scope.get("route"), "path", "sin_ruta")
+            metodo = scope["method"]
+            peticiones_total.incrementar(metodo, ruta, estado)
+            duracion_peticion.observar(duracion, metodo, ruta)
+            consultas_por_peticion.observar(acumulado["consultas"], metodo, ruta)
+            tiempo_db_por_peticion.observar(acumulado["segundos"], metodo, ruta)
+            filas_por_peticion.observar(acumulado["filas"], metodo, ruta)
@@ -0,0 +1,29 @@
+# utils/respuesta_json.py
+
+# Respuesta JSON para datos que ya salen con la forma correcta (filas leídas con
+# columnas explícitas, acumulados calculados aquí): se serializan directamente con
+# orjson, sin el paso por jsonable_encoder ni una segunda validación contra el
+# response_model, que sigue declarado en la ruta para la documentación.
+# orjson es opcional: sin él se usa el serializador en Rust de pydantic-core.
+
+from fastapi import Response
+from pydantic_core import to_json, to_jsonable_python
+
+try:
+    import orjson
+except ImportError:  # Sin orjson: pydantic-core, algo más lento
+    orjson = None
+
+
+def a_json(contenido) -> bytes:
+    if orjson is not None:
+        # Los tipos que orjson no conoce (Decimal, conjuntos...) los convierte pydantic-core
+        return orjson.dumps(contenido, default=to_jsonable_python, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return to_json(contenido)
+
+
+class RespuestaJSON(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return a_json(content)
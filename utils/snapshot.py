@@ -0,0 +1,292 @@
+# utils/snapshot.py
+
+# Snapshot columnar por test para análisis sobre respuestas históricas.
+# Cada test tiene un directorio con archivos binarios que solo crecen:
+#   dim_<i>.valores   int8   valor de cada respuesta en la dimensión i
+#   dim_<i>.filas     int32  fila (respuesta) a la que pertenece cada valor
+#   campo_<j>.codigos int32  código de diccionario del campo j de caracterizacion_datos (-1 = sin dato)
+# y un manifest.json con los nombres, diccionarios, longitudes válidas y la marca de agua.
+# Los análisis leen los archivos con memory-map, sin cargar las respuestas en memoria,
+# y actualizar_snapshot() solo agrega las respuestas nuevas.
+# Las actualizaciones de un test se serializan con un asyncio.Lock dentro del
+# worker y con flock entre procesos; el flock y la escritura de archivos corren
+# en el threadpool para no detener el event loop.
+
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from models.Respuestas import Respuesta
+from utils.cache import BloqueosPorClave
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+DIRECTORIO_SNAPSHOTS = os.getenv("SNAPSHOT_DIR", "snapshots")
+
+# Al actualizar se vuelve a leer esta ventana antes de la marca de agua, por si
+# una transacción iniciada antes se confirmó después (las ya incluidas se saltan por id)
+MARGEN_ACTUALIZACION = timedelta(minutes=5)
+
+LOTE_LECTURA = 5000
+VERSION_FORMATO = 1
+
+TIPO_VALORES = np.int8
+TIPO_FILAS = np.int32
+TIPO_CODIGOS = np.int32
+SIN_DATO = -1
+
+_actualizaciones = BloqueosPorClave()
+
+
+def _directorio(test_id) -> str:
+    return os.path.join(DIRECTORIO_SNAPSHOTS, str(test_id))
+
+
+def _leer_manifest(directorio: str) -> dict | None:
+    try:
+        with open(os.path.join(directorio, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _escribir_manifest(directorio: str, manifest: dict):
+    # Escritura atómica: el manifest define qué parte de cada archivo es válida
+    ruta = os.path.join(directorio, "manifest.json")
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def _leer_columna(ruta: str, tipo, longitud: int) -> np.ndarray:
+    if longitud == 0:
+        return np.empty(0, dtype=tipo)
+    return np.memmap(ruta, dtype=tipo, mode="r", shape=(longitud,))
+
+
+def _agregar(ruta: str, tipo, longitud_valida: int, datos) -> None:
+    """Agrega datos al final del archivo descartando lo escrito por una actualización interrumpida."""
+    with open(ruta, "ab") as f:
+        f.truncate(longitud_valida * np.dtype(tipo).itemsize)
+        f.write(np.asarray(datos, dtype=tipo).tobytes())
+
+
+class Snapshot:
+    """Vista de solo lectura (memory-map) del snapshot de un test."""
+
+    def __init__(self, directorio: str, manifest: dict):
+        self.directorio = directorio
+        self.manifest = manifest
+        self.filas = manifest["filas"]
+        self.dimensiones = manifest["dimensiones"]
+        self.campos = manifest["campos"]
+
+    def valores(self, i: int) -> np.ndarray:
+        return _leer_columna(os.path.join(self.directorio, f"dim_{i}.valores"), TIPO_VALORES, self.manifest["valores_por_dimension"][i])
+
+    def filas_de(self, i: int) -> np.ndarray:
+        return _leer_columna(os.path.join(self.directorio, f"dim_{i}.filas"), TIPO_FILAS, self.manifest["valores_por_dimension"][i])
+
+    def codigos(self, campo: str) -> np.ndarray:
+        if campo not in self.campos:
+            return np.full(self.filas, SIN_DATO, dtype=TIPO_CODIGOS)
+        j = self.campos.index(campo)
+        return _leer_columna(os.path.join(self.directorio, f"campo_{j}.codigos"), TIPO_CODIGOS, self.filas)
+
+    def diccionario(self, campo: str) -> list:
+        return self.manifest["diccionarios"].get(campo, [])
+
+
+def abrir_snapshot(test_id) -> Snapshot | None:
+    directorio = _directorio(test_id)
+    manifest = _leer_manifest(directorio)
+    return Snapshot(directorio, manifest) if manifest else None
+
+
+def _manifest_vacio(test_id) -> dict:
+    return {
+        "version": VERSION_FORMATO,
+        "test_id": str(test_id),
+        "filas": 0,
+        "dimensiones": [],
+        "valores_por_dimension": [],
+        "campos": [],
+        "diccionarios": {},
+        "marca_agua": None,
+        "ids_recientes": [],
+        "actualizado_en": None,
+    }
+
+
+async def actualizar_snapshot(db, test_id) -> dict:
+    """
+    Agrega al snapshot del test las respuestas guardadas desde la última
+    actualización (o lo construye completo la primera vez). Devuelve el manifest.
+    """
+    directorio = _directorio(test_id)
+    # Quien espera el flock es un hilo, nunca el event loop: y como dentro del
+    # worker solo una petición por test llega hasta aquí, no se espera a sí mismo
+    async with _actualizaciones.bloquear(str(test_id)):
+        bloqueo = await run_in_threadpool(_bloquear, directorio)
+        try:
+            return await _actualizar(db, test_id, directorio)
+        finally:
+            # Cerrar el archivo libera el flock
+            bloqueo.close()
+
+
+def _bloquear(directorio: str):
+    os.makedirs(directorio, exist_ok=True)
+    bloqueo = open(os.path.join(directorio, ".lock"), "w")
+    if fcntl:
+        fcntl.flock(bloqueo, fcntl.LOCK_EX)
+    return bloqueo
+
+
+async def _actualizar(db, test_id, directorio: str) -> dict:
+    manifest = await run_in_threadpool(_leer_manifest, directorio) or _manifest_vacio(test_id)
+    filas = manifest["filas"]
+    dimensiones = {nombre: i for i, nombre in enumerate(manifest["dimensiones"])}
+    campos = {nombre: j for j, nombre in enumerate(manifest["campos"])}
+    diccionarios = {c: {v: k for k, v in enumerate(vals)} for c, vals in manifest["diccionarios"].items()}
+    ya_incluidas = {id for _, id in manifest["ids_recientes"]}
+
+    consulta = select(Respuesta.id, Respuesta.creado_en, Respuesta.respuestas, Respuesta.caracterizacion_datos) \
+        .where(Respuesta.test_id == test_id)
+    if manifest["marca_agua"]:
+        desde = datetime.fromisoformat(manifest["marca_agua"]) - MARGEN_ACTUALIZACION
+        consulta = consulta.where(Respuesta.creado_en >= desde)
+    consulta = consulta.order_by(Respuesta.creado_en, Respuesta.id).execution_options(yield_per=LOTE_LECTURA)
+
+    # Buffers de lo nuevo; se escriben al final en un solo append por archivo
+    nuevos_valores = {}
+    nuevas_filas = {}
+    nuevos_codigos = {j: [] for j in campos.values()}
+    recientes = []
+    marca_agua = manifest["marca_agua"] and datetime.fromisoformat(manifest["marca_agua"])
+    fila = filas
+
+    async for id, creado_en, respuestas, caracterizacion in await db.stream(consulta):
+        if str(id) in ya_incluidas:
+            continue
+        for d in respuestas:
+            i = dimensiones.setdefault(d["dimension"], len(dimensiones))
+            valores = np.clip(d["respuestas"], np.iinfo(TIPO_VALORES).min, np.iinfo(TIPO_VALORES).max)
+            nuevos_valores.setdefault(i, []).extend(valores.tolist())
+            nuevas_filas.setdefault(i, []).extend([fila] * len(valores))
+        for campo in (caracterizacion or {}):
+            if campo not in campos:
+                # Campo nuevo: las filas anteriores quedan sin dato
+                campos[campo] = len(campos)
+                nuevos_codigos[campos[campo]] = [SIN_DATO] * (fila - filas)
+                diccionarios[campo] = {}
+        for campo, j in campos.items():
+            valor = (caracterizacion or {}).get(campo)
+            if valor is None:
+                nuevos_codigos[j].append(SIN_DATO)
+            else:
+                valor = valor if isinstance(valor, str) else json.dumps(valor, ensure_ascii=False)
+                nuevos_codigos[j].append(diccionarios[campo].setdefault(valor, len(diccionarios[campo])))
+        fila += 1
+        marca_agua = max(marca_agua, creado_en) if marca_agua else creado_en
+        recientes.append((creado_en, str(id)))
+
+    # Escritura de los archivos y del manifest, fuera del event loop
+    def escribir():
+        nombres_dimensiones = sorted(dimensiones, key=dimensiones.get)
+        valores_por_dimension = manifest["valores_por_dimension"] + [0] * (len(dimensiones) - len(manifest["valores_por_dimension"]))
+        for i in range(len(nombres_dimensiones)):
+            base = os.path.join(directorio, f"dim_{i}")
+            _agregar(base + ".valores", TIPO_VALORES, valores_por_dimension[i], nuevos_valores.get(i, []))
+            _agregar(base + ".filas", TIPO_FILAS, valores_por_dimension[i], nuevas_filas.get(i, []))
+            valores_por_dimension[i] += len(nuevos_valores.get(i, []))
+        for campo, j in campos.items():
+            if j < len(manifest["campos"]):
+                _agregar(os.path.join(directorio, f"campo_{j}.codigos"), TIPO_CODIGOS, filas, nuevos_codigos[j])
+            else:
+                # Campo nuevo: las filas de actualizaciones anteriores quedan sin dato
+                _agregar(os.path.join(directorio, f"campo_{j}.codigos"), TIPO_CODIGOS, 0, [SIN_DATO] * filas + nuevos_codigos[j])
+
+        # Ids dentro del margen de la nueva marca de agua, para no duplicarlos en la próxima actualización
+        ids_recientes = []
+        if marca_agua:
+            limite = marca_agua - MARGEN_ACTUALIZACION
+            anteriores = [(datetime.fromisoformat(c), id) for c, id in manifest["ids_recientes"]]
+            ids_recientes = [[c.isoformat(), id] for c, id in anteriores + recientes if c >= limite]
+
+        manifest.update({
+            "filas": fila,
+            "dimensiones": nombres_dimensiones,
+            "valores_por_dimension": valores_por_dimension,
+            "campos": sorted(campos, key=campos.get),
+            "diccionarios": {c: sorted(d, key=d.get) for c, d in diccionarios.items()},
+            "marca_agua": marca_agua.isoformat() if marca_agua else None,
+            "ids_recientes": ids_recientes,
+            "actualizado_en": datetime.utcnow().isoformat(),
+        })
+        _escribir_manifest(directorio, manifest)
+
+    await run_in_threadpool(escribir)
+    return manifest
+
+
+def analizar_snapshot(snapshot: Snapshot, agrupar_por: str | None = None, filtros: dict | None = None,
+                      bloque: int = 1_000_000) -> dict:
+    """
+    Promedio, conteo y distribución (1 a 5) por dimensión, opcionalmente agrupados
+    por un campo de caracterizacion_datos y filtrados por otros. Recorre los archivos
+    mapeados por bloques, así que la memoria usada no depende del tamaño del snapshot.
+    """
+    from utils.estadisticas_sql import NO_ESPECIFICADO
+
+    mascara = np.ones(snapshot.filas, dtype=bool)
+    for campo, valor in (filtros or {}).items():
+        diccionario = snapshot.diccionario(campo)
+        if valor not in diccionario:
+            mascara[:] = False
+            break
+        mascara &= snapshot.codigos(campo) == diccionario.index(valor)
+
+    if agrupar_por:
+        # Código 0 = sin dato; los valores del diccionario se desplazan en uno
+        grupos = snapshot.codigos(agrupar_por)
+        nombres = [NO_ESPECIFICADO] + snapshot.diccionario(agrupar_por)
+    else:
+        grupos = np.full(snapshot.filas, SIN_DATO, dtype=TIPO_CODIGOS)
+        nombres = [None]
+    n = len(nombres)
+
+    resultado = {nombre: {} for nombre in nombres}
+    for i, dimension in enumerate(snapshot.dimensiones):
+        valores, filas = snapshot.valores(i), snapshot.filas_de(i)
+        conteo = np.zeros(n, dtype=np.int64)
+        suma = np.zeros(n, dtype=np.float64)
+        histograma = np.zeros(n * 5, dtype=np.int64)
+        for inicio in range(0, len(valores), bloque):
+            f = filas[inicio:inicio + bloque]
+            seleccion = mascara[f]
+            v = valores[inicio:inicio + bloque][seleccion].astype(np.int64)
+            g = grupos[f[seleccion]].astype(np.int64) + 1
+            conteo += np.bincount(g, minlength=n)
+            suma += np.bincount(g, weights=v, minlength=n)
+            en_escala = (v >= 1) & (v <= 5)
+            histograma += np.bincount(g[en_escala] * 5 + v[en_escala] - 1, minlength=n * 5)
+        histograma = histograma.reshape(n, 5)
+        for k, nombre in enumerate(nombres):
+            if conteo[k]:
+                resultado[nombre][dimension] = {
+                    "promedio": round(float(suma[k] / conteo[k]), 2),
+                    "conteo": int(conteo[k]),
+                    "distribucion": {str(v + 1): int(h) for v, h in enumerate(histograma[k]) if h},
+                }
+
+    if not agrupar_por:
+        return resultado[None]
+    return {nombre: dims for nombre, dims in resultado.items() if dims}
@@ -0,0 +1,145 @@
+# utils/tabla_cruzada.py
+
+# Motor genérico de tablas cruzadas sobre caracterizacion_datos: agrupa por
+# cualquier lista de campos, con filtros opcionales, y calcula una métrica
+# (promedio, conteo, distribución o estadística descriptiva) en una sola consulta agregada.
+# Los resultados se guardan en caché hasta que llega una respuesta nueva al test
+# (aunque se confirme tarde con una fecha anterior a la última).
+# resumen_por_facetas() arma las facetas del tablero a partir del acumulado por
+# dimensión y de estas tablas cruzadas.
+
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from models.AgregadoDimension import AgregadoDimension
+from utils.cache import BloqueosPorClave, CacheLRU
+from utils.estadistica_descriptiva import Acumulador, CONFIANZA
+from utils.estadisticas_sql import contar_valores, contar_respuestas, version_respuestas
+
+METRICAS = ("promedio", "conteo", "distribucion", "descriptivas")
+MAX_CAMPOS = 4
+
+# (test_id, campos, filtros, métrica, confianza) -> (versión, resultado); el ttl cubre borrados de respuestas
+cache_cruces = CacheLRU(max_entradas=1024, ttl=300)
+# Con la caché fría, un solo cálculo por clave aunque lleguen varias peticiones a la vez
+_calculos = BloqueosPorClave()
+
+
+def _anidar(destino: dict, claves: list, valor):
+    """Coloca `valor` en destino[c1][c2]...[cn] creando los niveles que falten."""
+    for clave in claves[:-1]:
+        destino = destino.setdefault(clave, {})
+    destino[claves[-1]] = valor
+
+
+async def _calcular(db, test_id, campos: tuple, filtros: dict, metrica: str, confianza: float) -> dict:
+    resultado = {}
+    if metrica == "conteo":
+        for *grupo, n in await contar_respuestas(db, test_id, campos, filtros):
+            if grupo:
+                _anidar(resultado, grupo, n)
+            else:
+                resultado["total"] = n
+        return resultado
+
+    acumuladores = defaultdict(Acumulador)
+    for *grupo, dimension, valor, n in await contar_valores(db, test_id, campos, filtros):
+        acumuladores[(*grupo, dimension)].agregar(valor, n)
+
+    for clave, acumulador in acumuladores.items():
+        if metrica == "promedio":
+            _anidar(resultado, list(clave), round(acumulador.promedio, 2))
+        elif metrica == "distribucion":
+            _anidar(resultado, list(clave), {str(v): n for v, n in acumulador.histograma.items()})
+        else:
+            _anidar(resultado, list(clave), acumulador.describir(confianza))
+    return resultado
+
+
+async def tabla_cruzada(
+    db, test_id, campos: list[str], filtros: dict | None = None,
+    metrica: str = "promedio", confianza: float = CONFIANZA,
+) -> dict:
+    """
+    Agrupa las respuestas de un test (o de todos si test_id es None) por los campos
+    indicados. El resultado se anida en el orden de `campos`; salvo para conteo,
+    el último nivel es la dimensión. `confianza` solo se usa en descriptivas.
+    """
+    if metrica not in METRICAS:
+        raise ValueError(f"Métrica no válida: {metrica}")
+    if len(campos) > MAX_CAMPOS:
+        raise ValueError(f"Se admiten como máximo {MAX_CAMPOS} campos")
+
+    filtros = filtros or {}
+    if metrica != "descriptivas":
+        confianza = None
+    clave = (str(test_id), tuple(campos), tuple(sorted(filtros.items())), metrica, confianza)
+    # Versión por índice en lugar de un recorrido: la última respuesta guardada y
+    # las de su ventana de confirmación (ver version_respuestas)
+    version = await version_respuestas(db, test_id)
+
+    guardado = cache_cruces.obtener(clave)
+    if guardado is not None and guardado[0] == version:
+        return guardado[1]
+
+    async with _calculos.bloquear(clave):
+        # Otra petición pudo calcularlo mientras se esperaba
+        guardado = cache_cruces.obtener(clave)
+        if guardado is not None and guardado[0] == version:
+            return guardado[1]
+        resultado = await _calcular(db, test_id, tuple(campos), filtros, metrica, confianza)
+        cache_cruces.guardar(clave, (version, resultado))
+    return resultado
+
+
+# Facetas del tablero; las tres primeras salen del acumulado por dimensión
+FACETAS = ("promedios", "distribucion", "descriptivas", "edad", "pronombre", "comuna")
+FACETAS_ACUMULADO = ("promedios", "distribucion", "descriptivas")
+
+
+async def _acumuladores(db, test_id, desde_acumulado: bool) -> dict:
+    if desde_acumulado:
+        agregados = (await db.scalars(select(AgregadoDimension).where(AgregadoDimension.test_id == test_id))).all()
+        return {a.dimension: Acumulador.desde_agregado(a) for a in agregados if a.conteo}
+    acumuladores = defaultdict(Acumulador)
+    for dimension, histograma in (await tabla_cruzada(db, test_id, [], metrica="distribucion")).items():
+        for valor, n in histograma.items():
+            acumuladores[dimension].agregar(int(valor), n)
+    return acumuladores
+
+
+async def resumen_por_facetas(db, test_id, facetas: list[str], desde_acumulado: bool = True) -> dict:
+    """
+    Facetas del tablero (promedios, distribución, descriptivas, por edad, por
+    pronombre y por comuna) de un test. Las facetas por dimensión salen del
+    acumulado agregados_dimension; las demográficas, de tabla_cruzada y su caché.
+    Con desde_acumulado=False todo se calcula desde las respuestas: el acumulado
+    se actualiza en segundo plano y los informes deben incluir todo lo anterior
+    a su marca de agua. Devuelve {} si el test no tiene respuestas.
+    """
+    total = (await tabla_cruzada(db, test_id, [], metrica="conteo")).get("total", 0)
+    if not total:
+        return {}
+
+    acumuladores = {}
+    if any(f in FACETAS_ACUMULADO for f in facetas):
+        acumuladores = await _acumuladores(db, test_id, desde_acumulado)
+
+    resultado = {"total_respuestas": total}
+    for faceta in facetas:
+        if faceta == "promedios":
+            resultado[faceta] = {d: round(a.promedio, 2) for d, a in acumuladores.items()}
+        elif faceta == "distribucion":
+            resultado[faceta] = {
+                d: {str(v): n for v, n in sorted(a.histograma.items())} for d, a in acumuladores.items()
+            }
+        elif faceta == "descriptivas":
+            resultado[faceta] = {d: a.describir() for d, a in acumuladores.items()}
+        elif faceta in ("edad", "pronombre"):
+            resultado[faceta] = await tabla_cruzada(db, test_id, [faceta])
+        elif faceta == "comuna":
+            resultado[faceta] = await tabla_cruzada(
+                db, test_id, ["comuna"], {"tipo_participante": "habitante"}, metrica="conteo"
+            )
+    return resultado
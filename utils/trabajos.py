@@ -0,0 +1,275 @@
+# utils/trabajos.py
+
+# Trabajo posterior al envío de respuestas: acumulados por dimensión y por
+# periodo (tendencias) y categoría del test. El envío solo inserta la respuesta y su fila
+# en trabajos_pendientes (en PostgreSQL, en una única sentencia); después un pool
+# acotado de workers del proceso los procesa por lotes.
+#
+# La tabla es la fuente de verdad: si la cola en memoria está llena o el proceso
+# se reinicia, el barrido periódico recoge los trabajos que quedaron. Cada worker
+# toma sus trabajos borrándolos (DELETE ... RETURNING sobre filas bloqueadas con
+# FOR UPDATE SKIP LOCKED) en la misma transacción que aplica los cambios derivados:
+# o se confirman las dos cosas o ninguna, y mientras tanto ningún otro proceso ve
+# esas filas, por lento que sea el lote. Un trabajo que agota MAX_INTENTOS queda
+# en la tabla con su ultimo_error (métrica gesex_trabajos_muertos en /metrics).
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, literal, select, update
+
+from database import WORKERS_TRABAJOS, AsyncSessionLocal
+from models.Respuestas import Respuesta
+from models.Segmentacion import Segmentacion
+from models.Test import Test
+from models.TrabajoPendiente import MAX_INTENTOS, TrabajoPendiente
+from utils.agregados import acumular_respuestas, acumular_tendencias, bloquear_acumulados
+from utils.metricas import trabajos_agotados, trabajos_muertos
+
+logger = logging.getLogger(__name__)
+
+# TRABAJOS_WORKERS; database.py los descuenta del presupuesto de conexiones
+WORKERS = WORKERS_TRABAJOS
+COLA_MAXIMA = int(os.getenv("TRABAJOS_COLA_MAX", "10000"))
+# Trabajos que un worker toma de una vez cuando la cola está llena
+LOTE_MAXIMO = int(os.getenv("TRABAJOS_LOTE", "500"))
+INTERVALO_BARRIDO = float(os.getenv("TRABAJOS_INTERVALO_BARRIDO", "15"))
+ESPERA_REINTENTO = timedelta(seconds=30)
+
+# Funciones async (db, filas) que derivan datos de un lote de respuestas nuevas.
+# Cada fila tiene test_id, respuesta_id, respuestas, fecha, creado_en.
+PROCESADORES = []
+
+_cola: asyncio.Queue | None = None
+_tareas: list[asyncio.Task] = []
+
+
+def procesador(funcion):
+    """Registra una función que se ejecuta con cada lote de respuestas procesado."""
+    PROCESADORES.append(funcion)
+    return funcion
+
+
+@procesador
+async def _acumular(db, filas):
+    await acumular_respuestas(db, [(f.test_id, f.respuestas) for f in filas])
+
+
+@procesador
+async def _tendencias(db, filas):
+    await acumular_tendencias(db, [(f.test_id, f.fecha, f.respuestas) for f in filas])
+
+
+@procesador
+async def _categoria(db, filas):
+    # La categoría del test queda con la última respuesta recibida, como antes
+    ultima_por_test = {f.test_id: f.respuestas for f in filas}
+    umbrales_por_test = dict((await db.execute(
+        select(Test.id, Test.umbrales).where(Test.id.in_(ultima_por_test))
+    )).all())
+    for test_id, ultima in ultima_por_test.items():
+        if test_id in umbrales_por_test:
+            categoria = Segmentacion.calcular_categoria(ultima, umbrales_por_test[test_id])
+            await db.execute(update(Test).where(Test.id == test_id).values(categoria=categoria))
+
+
+async def insertar_con_trabajo(db, insert_respuesta) -> int | None:
+    """
+    Ejecuta el INSERT de una respuesta (con RETURNING id, test_id y ON CONFLICT
+    DO NOTHING) y registra su trabajo. Devuelve el id del trabajo, o None si la
+    respuesta no se insertó. No hace commit.
+    """
+    ahora = datetime.utcnow()
+    if db.get_bind().dialect.name == "postgresql":
+        # Una sola sentencia: INSERT en un CTE y el trabajo a partir de lo que devuelve
+        nueva = insert_respuesta.cte("nueva")
+        stmt = (
+            TrabajoPendiente.__table__.insert()
+            .from_select(
+                ["respuesta_id", "test_id", "intentos", "disponible_en", "creado_en"],
+                select(nueva.c.id, nueva.c.test_id, literal(0), literal(ahora), literal(ahora)),
+            )
+            .returning(TrabajoPendiente.id)
+        )
+        return (await db.execute(stmt)).scalar()
+
+    fila = (await db.execute(insert_respuesta)).first()
+    if fila is None:
+        return None
+    return (await registrar_trabajos(db, [(fila.id, fila.test_id)]))[0]
+
+
+async def registrar_trabajos(db, respuestas: list[tuple]) -> list[int]:
+    """Registra un trabajo por cada (respuesta_id, test_id). No hace commit."""
+    if not respuestas:
+        return []
+    ahora = datetime.utcnow()
+    resultado = await db.execute(
+        TrabajoPendiente.__table__.insert().returning(TrabajoPendiente.id),
+        [
+            {"respuesta_id": r, "test_id": t, "intentos": 0, "disponible_en": ahora, "creado_en": ahora}
+            for r, t in respuestas
+        ],
+    )
+    return list(resultado.scalars().all())
+
+
+def encolar(ids: list[int]):
+    """Pasa los trabajos recién confirmados a los workers; sin sitio, los recoge el barrido."""
+    if _cola is None:
+        return
+    for trabajo_id in ids:
+        try:
+            _cola.put_nowait(trabajo_id)
+        except asyncio.QueueFull:
+            logger.warning("Cola de trabajos llena; el resto se procesará en el barrido")
+            return
+
+
+async def _tomar(db, ids: list[int] | None) -> list:
+    """
+    Borra y devuelve (id, respuesta_id) de los trabajos disponibles (de `ids`, o
+    los más antiguos). Sin commit: si la transacción se deshace, vuelven a la tabla.
+    """
+    candidatos = select(TrabajoPendiente.id).where(
+        TrabajoPendiente.disponible_en <= datetime.utcnow(),
+        TrabajoPendiente.intentos < MAX_INTENTOS,
+    )
+    if ids is not None:
+        candidatos = candidatos.where(TrabajoPendiente.id.in_(ids))
+    # SKIP LOCKED: los trabajos que otro worker tiene tomados se saltan sin esperar.
+    # SQLite ignora la cláusula; ahí la propia escritura serializa a los workers
+    candidatos = (
+        candidatos.order_by(TrabajoPendiente.id).limit(LOTE_MAXIMO)
+        .with_for_update(skip_locked=True).scalar_subquery()
+    )
+    resultado = await db.execute(
+        delete(TrabajoPendiente).where(TrabajoPendiente.id.in_(candidatos))
+        .returning(TrabajoPendiente.id, TrabajoPendiente.respuesta_id)
+    )
+    return sorted(resultado.all())
+
+
+async def _filas(db, tomados: list) -> list:
+    # Las respuestas ya borradas no tienen fila: su trabajo simplemente se descarta
+    por_id = {f.respuesta_id: f for f in (await db.execute(
+        select(
+            Respuesta.id.label("respuesta_id"), Respuesta.test_id, Respuesta.respuestas,
+            Respuesta.fecha, Respuesta.creado_en,
+        ).where(Respuesta.id.in_([t.respuesta_id for t in tomados]))
+    )).all()}
+    return [por_id[t.respuesta_id] for t in tomados if t.respuesta_id in por_id]
+
+
+async def _fallo(trabajo_id: int, error: Exception):
+    """Cuenta un intento fallido del trabajo y lo deja esperando el reintento."""
+    async with AsyncSessionLocal() as db:
+        intentos = (await db.execute(
+            update(TrabajoPendiente).where(TrabajoPendiente.id == trabajo_id).values(
+                intentos=TrabajoPendiente.intentos + 1,
+                ultimo_error=str(error)[:1000],
+                disponible_en=datetime.utcnow() + ESPERA_REINTENTO,
+            ).returning(TrabajoPendiente.intentos)
+        )).scalar()
+        await db.commit()
+    if intentos is not None and intentos >= MAX_INTENTOS:
+        trabajos_agotados.incrementar()
+        logger.error(f"El trabajo {trabajo_id} agotó sus {MAX_INTENTOS} intentos y no se volverá a procesar: {error}")
+
+
+async def procesar(ids: list[int] | None = None) -> int:
+    """
+    Procesa los trabajos indicados (o los disponibles más antiguos, si ids es None)
+    en una sola transacción. Devuelve cuántos trabajos se tomaron.
+    """
+    async with AsyncSessionLocal() as db:
+        # Compartido entre workers; espera a una reconstrucción en curso
+        await bloquear_acumulados(db)
+        tomados = await _tomar(db, ids)
+        if not tomados:
+            await db.rollback()
+            return 0
+        try:
+            filas = await _filas(db, tomados)
+            if filas:
+                for funcion in PROCESADORES:
+                    await funcion(db, filas)
+            await db.commit()
+            return len(tomados)
+        except Exception as e:
+            # Los trabajos vuelven a la tabla tal como estaban
+            await db.rollback()
+            error = e
+
+    if len(tomados) > 1:
+        # Un trabajo defectuoso no debe bloquear el lote: se reintentan por separado
+        for trabajo in tomados:
+            await procesar([trabajo.id])
+    else:
+        logger.error(f"Error al procesar el trabajo {tomados[0].id}", exc_info=error)
+        await _fallo(tomados[0].id, error)
+    return len(tomados)
+
+
+async def contar_muertos() -> int:
+    """Trabajos que agotaron sus intentos; quedan en la tabla para revisarlos a mano."""
+    async with AsyncSessionLocal() as db:
+        muertos = await db.scalar(
+            select(func.count()).select_from(TrabajoPendiente).where(TrabajoPendiente.intentos >= MAX_INTENTOS)
+        )
+    trabajos_muertos.fijar(muertos)
+    return muertos
+
+
+async def _worker():
+    while True:
+        ids = [await _cola.get()]
+        # Con la cola profunda se procesa un lote en una sola transacción
+        while len(ids) < LOTE_MAXIMO and not _cola.empty():
+            ids.append(_cola.get_nowait())
+        try:
+            await procesar(ids)
+        except Exception:
+            logger.exception("Error en el worker de trabajos")
+        finally:
+            for _ in ids:
+                _cola.task_done()
+
+
+async def _barrido():
+    while True:
+        try:
+            # Trabajos que no pasaron por la cola: reinicios, cola llena o reintentos
+            while await procesar() == LOTE_MAXIMO:
+                pass
+            await contar_muertos()
+        except Exception:
+            logger.exception("Error en el barrido de trabajos pendientes")
+        await asyncio.sleep(INTERVALO_BARRIDO)
+
+
+async def iniciar():
+    """Arranca los workers y el barrido (evento startup)."""
+    global _cola
+    _cola = asyncio.Queue(maxsize=COLA_MAXIMA)
+    _tareas.extend(asyncio.create_task(_worker()) for _ in range(WORKERS))
+    _tareas.append(asyncio.create_task(_barrido()))
+    logger.info(f"Workers de trabajos iniciados: {WORKERS} (cola máxima {COLA_MAXIMA})")
+
+
+async def detener(espera: float = 10):
+    """Termina la cola pendiente (hasta `espera` segundos) y detiene los workers."""
+    global _cola
+    if _cola is not None:
+        try:
+            await asyncio.wait_for(_cola.join(), timeout=espera)
+        except asyncio.TimeoutError:
+            # Lo que quede sigue en trabajos_pendientes para el próximo arranque
+            logger.warning("Trabajos sin terminar al apagar; se procesarán en el próximo barrido")
+    for tarea in _tareas:
+        tarea.cancel()
+    await asyncio.gather(*_tareas, return_exceptions=True)
+    _tareas.clear()
+    _cola = None